@@ -9,13 +9,17 @@ from src.functions.scheduled_tasks import cleanup_old_news_task
 @scheduler_fn.on_schedule(schedule="every 24 hours", memory=1024, timeout_sec=300)
 def cleanup_old_news(event: scheduler_fn.ScheduledEvent) -> None:
     """Triggers the cleanup_old_news_task."""
+    succeeded = False
     try:
         print("Executing cleanup_old_news task...")
-        cleanup_old_news_task()
-        print("cleanup_old_news task completed.")
+        succeeded = cleanup_old_news_task()
+        print("cleanup_old_news task completed." if succeeded else "cleanup_old_news task completed with errors.")
     except Exception as e:
         print(f"Error in cleanup_old_news function: {str(e)}")
         traceback.print_exc()
+    if not succeeded:
+        # Fail the execution so the scheduler records a partial cleanup as a failure
+        raise RuntimeError("cleanup_old_news did not complete, see the errors above")
 
 # Ensure the function is registered if running locally with functions-framework
 # functions-framework --target cleanup_old_news --source .
\ No newline at end of file
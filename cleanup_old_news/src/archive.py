@@ -0,0 +1,144 @@
+import os
+import io
+import gzip
+import json
+import uuid
+import base64
+import traceback
+from threading import Lock
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from src.firestore_metrics import metrics
+
+MAX_WORKERS = 4  # Archive files written at the same time
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    if hasattr(value, 'tolist'):  # numpy arrays and scalars
+        return value.tolist()
+    return str(value)
+
+def _partition_day(value):
+    return value.strftime('%Y-%m-%d') if isinstance(value, datetime) else 'unknown'
+
+class ArchiveWriter:
+    """
+    Writes the documents removed by the cleanup to gzip-compressed NDJSON files,
+    partitioned by collection and day:
+
+        {destination}/{collection}/dt=YYYY-MM-DD/part-{run_id}-{sequence}.ndjson.gz
+
+    The destination is a local directory or a 'gs://bucket/prefix' URL. Files are
+    written on a small thread pool, so archiving a page overlaps with deleting the
+    previous one. Callers delete a page only after its archive future succeeded.
+
+    Usage:
+        archive = ArchiveWriter("gs://my-bucket/archive")
+        future = archive.submit(db, 'news', 'created_at', page, sidecar_collections)
+        future.result()  # Raises if the page could not be archived
+        archive.close()
+    """
+
+    def __init__(self, destination, max_workers=MAX_WORKERS):
+        self.destination = destination.rstrip('/')
+        self.run_id = datetime.now().strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:6]
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = Lock()
+        self.sequence = 0
+        self.documents = 0
+        self.files = 0
+        self.bytes = 0
+        self.bucket = None
+        if self.destination.startswith('gs://'):
+            from google.cloud import storage
+            bucket_name, _, self.prefix = self.destination[len('gs://'):].partition('/')
+            self.bucket = storage.Client().bucket(bucket_name)
+
+    def submit(self, db, collection_name, date_field, docs, sidecar_collections=()):
+        """
+        Archive document snapshots in the background.
+
+        Args:
+            db: Firestore database instance, used to read the sidecar documents
+            collection_name: Collection the documents belong to
+            date_field: Timestamp field used to partition the files by day
+            docs: Full document snapshots
+            sidecar_collections: Collections whose documents with the same ID are merged into each record
+
+        Returns:
+            Future: Resolves to the number of archived documents
+        """
+        # Firestore usage is attributed to the code that submitted the page
+        context = metrics.capture_context()
+        return self.executor.submit(self._archive, context, db, collection_name, date_field, docs, sidecar_collections)
+
+    def _archive(self, context, db, collection_name, date_field, docs, sidecar_collections):
+        with metrics.attributed(context):
+            records = {doc.id: dict(doc.to_dict() or {}, id=doc.id) for doc in docs}
+            for sidecar_collection in sidecar_collections:
+                refs = [db.collection(sidecar_collection).document(doc_id) for doc_id in records]
+                for sidecar in db.get_all(refs):
+                    if sidecar.exists:
+                        records[sidecar.id].update(sidecar.to_dict())
+
+        partitions = {}
+        for record in records.values():
+            partitions.setdefault(_partition_day(record.get(date_field)), []).append(record)
+        for day, day_records in partitions.items():
+            self._write_file(collection_name, day, day_records)
+        return len(records)
+
+    def _write_file(self, collection_name, day, records):
+        with self.lock:
+            self.sequence += 1
+            name = f"{collection_name}/dt={day}/part-{self.run_id}-{self.sequence:05d}.ndjson.gz"
+
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as gz:
+            for record in records:
+                gz.write(json.dumps(record, default=_json_default, ensure_ascii=False).encode('utf-8'))
+                gz.write(b'\n')
+        payload = buffer.getvalue()
+
+        if self.bucket is not None:
+            blob_name = f"{self.prefix.rstrip('/')}/{name}" if self.prefix else name
+            self.bucket.blob(blob_name).upload_from_string(payload, content_type='application/gzip')
+        else:
+            path = os.path.join(self.destination, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+        with self.lock:
+            self.documents += len(records)
+            self.files += 1
+            self.bytes += len(payload)
+
+    def close(self):
+        """Wait for the pending files and print a summary"""
+        self.executor.shutdown(wait=True)
+        print(f"  ✓ Archived {self.documents} documents in {self.files} files "
+              f"({self.bytes / 1024 / 1024:.1f} MiB) to {self.destination}")
+
+def create_archive_writer(destination=None):
+    """
+    ArchiveWriter for the given destination or the ARCHIVE_DESTINATION environment variable.
+    Returns None when archiving is not configured.
+    """
+    destination = destination or os.getenv('ARCHIVE_DESTINATION')
+    if not destination:
+        return None
+    try:
+        return ArchiveWriter(destination)
+    except Exception as e:
+        # Without a working archive nothing may be deleted, so the caller must not go on silently
+        print(f"  ✗ Could not open archive destination {destination}: {str(e)}")
+        traceback.print_exc()
+        raise
@@ -0,0 +1,89 @@
+import traceback
+from datetime import datetime, timedelta
+
+CHECKPOINT_COLLECTION = 'cleanup_checkpoints'
+CHECKPOINT_MAX_AGE_HOURS = 48  # Older checkpoints belong to an abandoned run and are ignored
+
+class CleanupCheckpoint:
+    """
+    Progress of a cleanup scan, persisted in 'cleanup_checkpoints/{name}'.
+
+    The scan saves the timestamp of the last document it has fully processed after
+    each page. An interrupted run (timeout, crash) leaves the checkpoint behind and
+    the next run resumes from that timestamp instead of rescanning from the start.
+    Documents sharing the checkpoint timestamp are processed again, which is harmless
+    because deletes are idempotent. The checkpoint is removed when the scan completes.
+
+    With max_age_hours=None the checkpoint never goes stale and serves as a persistent
+    watermark for incremental scans that never call complete().
+    """
+
+    def __init__(self, db, name, max_age_hours=CHECKPOINT_MAX_AGE_HOURS):
+        self.db = db
+        self.name = name
+        self.max_age_hours = max_age_hours
+        self.ref = db.collection(CHECKPOINT_COLLECTION).document(name)
+        self.last_value = None
+        self.processed = 0
+        self.deleted = 0
+
+    def load(self):
+        """
+        Load a pending checkpoint.
+
+        Returns:
+            The timestamp to resume from, or None to start from the beginning
+        """
+        try:
+            snapshot = self.ref.get()
+            if not snapshot.exists:
+                return None
+            data = snapshot.to_dict()
+            updated_at = data.get('updated_at')
+            stale = (self.max_age_hours is not None and
+                     (updated_at is None or _naive(updated_at) < datetime.now() - timedelta(hours=self.max_age_hours)))
+            if stale:
+                print(f"  ℹ️ Ignoring stale checkpoint for {self.name}")
+                return None
+            self.last_value = data.get('last_value')
+            self.processed = data.get('processed', 0)
+            self.deleted = data.get('deleted', 0)
+            if self.last_value is not None and self.max_age_hours is None:
+                print(f"  ↻ Scanning {self.name} from {self.last_value}")
+            elif self.last_value is not None:
+                print(f"  ↻ Resuming {self.name} cleanup from {self.last_value} "
+                      f"({self.processed} processed, {self.deleted} deleted before the interruption)")
+            return self.last_value
+        except Exception as e:
+            print(f"  ⚠️ Could not load checkpoint for {self.name}: {str(e)}")
+            traceback.print_exc()
+            return None
+
+    def save(self, last_value, processed, deleted):
+        """Record that every document up to last_value has been processed"""
+        self.last_value = last_value
+        self.processed += processed
+        self.deleted += deleted
+        try:
+            self.ref.set({
+                'last_value': last_value,
+                'processed': self.processed,
+                'deleted': self.deleted,
+                'updated_at': datetime.now(),
+            })
+        except Exception as e:
+            # Losing a checkpoint only costs a rescan, never fail the cleanup for it
+            print(f"  ⚠️ Could not save checkpoint for {self.name}: {str(e)}")
+
+    def complete(self):
+        """Remove the checkpoint once the scan has finished"""
+        try:
+            self.ref.delete()
+        except Exception as e:
+            print(f"  ⚠️ Could not clear checkpoint for {self.name}: {str(e)}")
+
+def _naive(value):
+    # Firestore returns timezone-aware timestamps, datetime.now() is naive local time
+    if getattr(value, 'tzinfo', None) is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
@@ -1,9 +1,98 @@
 import time
 import traceback
-from google.cloud import firestore
 from src.delete import delete_documents_batch
+from src.scan import stream_key_pages, PAGE_SIZE
+from src.checkpoint import CleanupCheckpoint
 
-def cleanup_collection(db, collection_name, time_threshold, batch_size=450):
+def delete_in_pages(db, collection_name, time_threshold, batch_size=450, date_field='created_at',
+                    protected_ids=None, sidecar_collections=(), page_size=PAGE_SIZE, start=None, archive=None):
+    """
+    Stream the keys of old documents page by page and delete them as they come.
+
+    Each page is deleted through the write pipeline before the next one is read,
+    and progress is checkpointed after every page so an interrupted run resumes
+    where it stopped.
+
+    With an archive, full documents are read and each page is archived before it
+    is deleted. Archiving runs in the background: while page N is archived, page
+    N-1 is deleted and page N+1 is read. A page whose archive fails is not deleted.
+
+    Args:
+        db: Firestore database instance
+        collection_name: Collection to clean up
+        time_threshold: Delete documents older than this timestamp
+        batch_size: Maximum batch size for Firestore operations
+        date_field: Timestamp field compared against time_threshold
+        protected_ids: Optional container of document IDs that must not be deleted (e.g. ProtectedIds)
+        sidecar_collections: Collections holding sidecar documents with the same ID, deleted alongside
+        page_size: Documents read per page
+        start: Optional lower bound (inclusive) to clean up a single time slice
+        archive: Optional ArchiveWriter receiving the documents before they are deleted
+
+    Returns:
+        tuple: (deleted_count, protected_count)
+    """
+    # Each time slice keeps its own checkpoint
+    label = slice_label(collection_name, start)
+    checkpoint = CleanupCheckpoint(db, label.replace(' ', '_'))
+    resume_from = checkpoint.load()
+    # A slice checkpoint always lies within the slice, so it replaces the slice start
+    lower_bound = resume_from if resume_from is not None else start
+    filters = [(date_field, '<', time_threshold)]
+    if lower_bound is not None:
+        filters.append((date_field, '>=', lower_bound))
+
+    deleted_count = 0
+    protected_count = 0
+    scanned = 0
+
+    def finish_page(page, docs_to_delete, archived):
+        page_deleted = 0
+        if docs_to_delete and archived is not None:
+            try:
+                archived.result()
+            except Exception as e:
+                print(f"  ✗ Could not archive {len(docs_to_delete)} documents from {label}, keeping them: {str(e)}")
+                traceback.print_exc()
+                docs_to_delete = []
+        if docs_to_delete:
+            page_deleted = delete_documents_batch(db, docs_to_delete, batch_size, collection_name,
+                                                  sidecar_collections=sidecar_collections)
+        checkpoint.save(page[-1].to_dict().get(date_field), len(page), page_deleted)
+        return page_deleted
+
+    previous = None
+    pages = stream_key_pages(db, collection_name, date_field, filters, page_size, keys_only=archive is None)
+    for page in pages:
+        scanned += len(page)
+        if protected_ids:
+            docs_to_delete = [doc for doc in page if doc.id not in protected_ids]
+            protected_count += len(page) - len(docs_to_delete)
+        else:
+            docs_to_delete = page
+
+        archived = None
+        if archive is not None and docs_to_delete:
+            archived = archive.submit(db, collection_name, date_field, docs_to_delete, sidecar_collections)
+        if previous is not None:
+            deleted_count += finish_page(*previous)
+        previous = (page, docs_to_delete, archived)
+
+    if previous is not None:
+        deleted_count += finish_page(*previous)
+    checkpoint.complete()
+    if scanned == 0 and resume_from is None:
+        print(f"  ℹ️ No old documents found in {label}")
+    else:
+        print(f"  Scanned {scanned} old documents in {label}")
+    return deleted_count, protected_count
+
+def slice_label(collection_name, start=None):
+    """Name of a collection or of one of its daily time slices, e.g. 'news 2025-05-01'"""
+    return collection_name if start is None else f"{collection_name} {start:%Y-%m-%d}"
+
+def cleanup_collection(db, collection_name, time_threshold, batch_size=450, date_field='created_at', start=None,
+                       archive=None):
     """
     Delete old documents from a specific collection.
     
@@ -12,32 +101,29 @@ def cleanup_collection(db, collection_name, time_threshold, batch_size=450):
         collection_name: Collection to clean up
         time_threshold: Delete documents older than this timestamp
         batch_size: Maximum batch size for Firestore operations
+        date_field: Timestamp field compared against time_threshold
+        start: Optional lower bound (inclusive) to clean up a single time slice
+        archive: Optional ArchiveWriter receiving the documents before they are deleted
         
     Returns:
         int: Number of deleted documents
+
+    Raises:
+        Exception: Any error that stopped the cleanup, after logging it
     """
-    print(f"Processing collection: {collection_name}")
+    label = slice_label(collection_name, start)
+    print(f"Processing collection: {label}")
     start_time = time.time()
 
     try:
-        # Get documents older than threshold
-        old_docs_query = db.collection(collection_name).where('created_at', '<', time_threshold)
-        old_docs = list(old_docs_query.stream())
-        
-        if not old_docs:
-            print(f"  ℹ️ No old documents found in {collection_name}")
-            return 0
-        
-        print(f"  Found {len(old_docs)} documents to delete in {collection_name}")
-        
-        # Delete the old documents
-        deleted_count = delete_documents_batch(db, old_docs, batch_size, collection_name)
+        deleted_count, _ = delete_in_pages(db, collection_name, time_threshold, batch_size, date_field,
+                                           start=start, archive=archive)
         
         elapsed = time.time() - start_time
-        print(f"  ✓ Completed {collection_name} cleanup in {elapsed:.2f} seconds")
+        print(f"  ✓ Completed {label} cleanup in {elapsed:.2f} seconds")
         return deleted_count
         
     except Exception as e:
-        print(f"  ✗ Error processing collection {collection_name}: {str(e)}")
-        traceback.print_exc()
-        return 0
\ No newline at end of file
+        # Re-raised so the caller reports the slice as failed, the checkpoint resumes it next run
+        print(f"  ✗ Error processing collection {label}: {str(e)}")
+        raise
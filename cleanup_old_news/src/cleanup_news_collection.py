@@ -1,54 +1,45 @@
 import time
-import traceback
-from src.delete import delete_documents_batch
+from src.cleanup import delete_in_pages, slice_label
 
-def cleanup_news_collection(db, time_threshold, protected_ids, batch_size=450):
+# Sidecar documents keyed by the same ID: heavy fields of each news document and its reverse index entry
+NEWS_SIDECAR_COLLECTIONS = ('news_content', 'news_embeddings', 'source_group_index')
+
+def cleanup_news_collection(db, time_threshold, protected_ids, batch_size=450, start=None, archive=None):
     """
     Delete old news documents except those referenced in active neutral_news
     
     Args:
         db: Firestore database instance
         time_threshold: Delete documents older than this timestamp
-        protected_ids: Set of news IDs to protect from deletion
+        protected_ids: News IDs to protect from deletion (ProtectedIds or any container)
         batch_size: Maximum batch size for Firestore operations
+        start: Optional lower bound (inclusive) to clean up a single time slice
+        archive: Optional ArchiveWriter receiving the news and their sidecars before they are deleted
         
     Returns:
         tuple: (deleted_count, protected_count)
+
+    Raises:
+        Exception: Any error that stopped the cleanup, after logging it
     """
-    print(f"Processing news collection with protection...")
+    label = slice_label('news', start)
+    print(f"Processing {label} with protection...")
     start_time = time.time()
     
     try:
-        # Get old news documents
-        old_docs_query = db.collection('news').where('created_at', '<', time_threshold)
-        old_docs = list(old_docs_query.stream())
-        
-        if not old_docs:
-            print(f"  ℹ️ No old documents found in news collection")
-            return 0, 0
-            
-        # Separate documents into protected and to-delete
-        docs_to_delete = []
-        protected_count = 0
-        
-        for doc in old_docs:
-            if doc.id in protected_ids:
-                protected_count += 1
-            else:
-                docs_to_delete.append(doc)
-        
-        # Process documents to delete in smaller batches
-        deleted_count = 0
-        if docs_to_delete:
-            # Use a more conservative batch size to avoid "Transaction too big" errors
-            adjusted_batch_size = min(batch_size, 200)  # Reduced from 450 to 200
-            deleted_count = delete_documents_batch(db, docs_to_delete, adjusted_batch_size, 'news')
+        # Use a more conservative batch size to avoid "Transaction too big" errors
+        adjusted_batch_size = min(batch_size, 200)  # Reduced from 450 to 200
+        deleted_count, protected_count = delete_in_pages(
+            db, 'news', time_threshold, adjusted_batch_size,
+            protected_ids=protected_ids, sidecar_collections=NEWS_SIDECAR_COLLECTIONS, start=start,
+            archive=archive,
+        )
             
         elapsed = time.time() - start_time
-        print(f"  ✓ Completed news cleanup: {deleted_count} deleted, {protected_count} protected in {elapsed:.2f} seconds")
+        print(f"  ✓ Completed {label} cleanup: {deleted_count} deleted, {protected_count} protected in {elapsed:.2f} seconds")
         return deleted_count, protected_count
         
     except Exception as e:
-        print(f"  ✗ Error processing news collection with protection: {str(e)}")
-        traceback.print_exc()
-        return 0, 0
\ No newline at end of file
+        # Re-raised so the caller reports the slice as failed, the checkpoint resumes it next run
+        print(f"  ✗ Error processing {label} with protection: {str(e)}")
+        raise
\ No newline at end of file
@@ -1,8 +1,10 @@
 import traceback
+from .firestore_metrics import instrument
 
 def initialize_firebase():
     """
-    Función para inicializar Firebase solo cuando sea necesario
+    Función para inicializar Firebase solo cuando sea necesario.
+    El cliente se envuelve para contabilizar sus operaciones (ver firestore_metrics.py).
     """
     try:
         import firebase_admin
@@ -12,7 +14,7 @@ def initialize_firebase():
         except ValueError:
             cred = credentials.ApplicationDefault()
             app = firebase_admin.initialize_app(cred)
-        return firestore.client()
+        return instrument(firestore.client())
     except Exception as e:
         print(f"Error initializing Firebase: {str(e)}")
         traceback.print_exc()
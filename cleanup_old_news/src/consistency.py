@@ -0,0 +1,219 @@
+import time
+import traceback
+from datetime import datetime
+from google.cloud import firestore
+from src.scan import stream_key_pages
+from src.checkpoint import CleanupCheckpoint
+from src.write_pipeline import WritePipeline
+
+# Reverse index source_id -> group of the neutral_news that lists it, as last seen by the sweeper.
+# Keyed by news ID, so the news cleanup deletes and archives it alongside the news document.
+SOURCE_GROUP_INDEX = 'source_group_index'
+
+class SweepStats:
+    """Counters of a consistency sweep"""
+
+    def __init__(self):
+        self.scanned = 0
+        self.dangling = 0
+        self.mismatched = 0
+        self.stale_assignments = 0
+        self.groups_fixed = 0
+
+    def __repr__(self):
+        return (f"SweepStats(scanned={self.scanned}, dangling={self.dangling}, mismatched={self.mismatched}, "
+                f"stale_assignments={self.stale_assignments}, groups_fixed={self.groups_fixed})")
+
+def _group_id(value):
+    try:
+        return int(float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _changed_pages(db, collection_name, fields, checkpoint):
+    # Documents sharing the watermark timestamp are checked again, the fixes are idempotent
+    since = checkpoint.load()
+    filters = [('updated_at', '>=', since)] if since is not None else []
+    return stream_key_pages(db, collection_name, 'updated_at', filters, fields=fields)
+
+def _read_groups(db, source_ids):
+    """news.group and source_group_index.group of each source, None when the document does not exist"""
+    news_refs = [db.collection('news').document(source_id) for source_id in source_ids]
+    index_refs = [db.collection(SOURCE_GROUP_INDEX).document(source_id) for source_id in source_ids]
+    news_groups = {
+        snapshot.id: _group_id(snapshot.to_dict().get('group'))
+        for snapshot in db.get_all(news_refs, field_paths=['group']) if snapshot.exists
+    }
+    indexed_groups = {
+        snapshot.id: _group_id(snapshot.to_dict().get('group'))
+        for snapshot in db.get_all(index_refs, field_paths=['group']) if snapshot.exists
+    }
+    return news_groups, indexed_groups
+
+def _run_transaction(db, operation):
+    """Run operation(transaction) in a Firestore transaction, retried on contention"""
+    if hasattr(db, "run_in_transaction"):
+        return db.run_in_transaction(operation)
+    return firestore.transactional(operation)(db.transaction())
+
+def _remove_sources(db, group, removed):
+    """
+    Remove sources from a neutral_news document in a transaction, so sources that
+    fetch_news adds concurrently are kept and member_count matches what is written.
+
+    Returns:
+        bool: True if the document changed
+    """
+    neutral_news_ref = db.collection('neutral_news').document(str(group))
+
+    def remove_in_transaction(transaction):
+        snapshot = neutral_news_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return False
+        source_ids = snapshot.to_dict().get('source_ids') or []
+        remaining_ids = [source_id for source_id in source_ids if source_id not in removed]
+        if len(remaining_ids) == len(source_ids):
+            return False
+        # The centroid in group_summaries is refreshed the next time the group is neutralized
+        transaction.update(neutral_news_ref, {"source_ids": remaining_ids, "member_count": len(remaining_ids)})
+        return True
+
+    return _run_transaction(db, remove_in_transaction)
+
+def _apply_fixes(db, removals, index_updates, stats, batch_size):
+    """
+    Remove sources from neutral_news and bring the reverse index up to date.
+
+    Args:
+        removals: Dict of group -> set of source IDs to remove from its neutral_news
+        index_updates: Dict of source ID -> group to index, or None to drop the entry
+    """
+    failed = 0
+    for group, removed in removals.items():
+        try:
+            if _remove_sources(db, group, removed):
+                stats.groups_fixed += 1
+        except Exception as e:
+            print(f"  ✗ Could not remove {len(removed)} sources from group {group}: {str(e)}")
+            failed += 1
+
+    with WritePipeline(db, name="consistency sweep", max_operations=batch_size) as writer:
+        for source_id, group in index_updates.items():
+            index_ref = db.collection(SOURCE_GROUP_INDEX).document(source_id)
+            if group is None:
+                writer.delete(index_ref)
+            else:
+                writer.set(index_ref, {"group": group, "indexed_at": datetime.now()})
+    failed += writer.report.failed
+    if failed:
+        print(f"  ✗ {failed} consistency fixes could not be written, they are retried on the next sweep")
+    return writer.report
+
+def _sweep_neutral_news_page(db, page, stats, batch_size):
+    """
+    Check the source_ids of changed neutral_news:
+    - sources whose news document no longer exists are dangling and removed
+    - sources whose news belongs to another group are removed (the news group is the truth)
+    - sources indexed under an older group are removed from that group (multiple-group assignment)
+    """
+    groups = {}
+    for doc in page:
+        data = doc.to_dict()
+        group = _group_id(data.get('group', doc.id))
+        if group is not None:
+            groups[group] = data.get('source_ids') or []
+    source_ids = list(dict.fromkeys(source_id for ids in groups.values() for source_id in ids))
+    news_groups, indexed_groups = _read_groups(db, source_ids)
+
+    removals = {}
+    index_updates = {}
+    for group, ids in groups.items():
+        for source_id in ids:
+            if source_id not in news_groups:
+                stats.dangling += 1
+                removals.setdefault(group, set()).add(source_id)
+                index_updates[source_id] = None
+                continue
+            news_group = news_groups[source_id]
+            if news_group != group:
+                stats.mismatched += 1
+                removals.setdefault(group, set()).add(source_id)
+                continue
+            indexed_group = indexed_groups.get(source_id)
+            if indexed_group is not None and indexed_group != group:
+                stats.stale_assignments += 1
+                removals.setdefault(indexed_group, set()).add(source_id)
+            if indexed_group != group:
+                index_updates[source_id] = group
+
+    if removals or index_updates:
+        _apply_fixes(db, removals, index_updates, stats, batch_size)
+
+def _sweep_news_page(db, page, stats, batch_size):
+    """
+    Check regrouped news: a news moved to another group is removed from the group
+    it is still indexed under, even when that group has not changed since the last sweep.
+    """
+    removals = {}
+    index_updates = {}
+    source_ids = [doc.id for doc in page]
+    indexed_refs = [db.collection(SOURCE_GROUP_INDEX).document(source_id) for source_id in source_ids]
+    indexed_groups = {
+        snapshot.id: _group_id(snapshot.to_dict().get('group'))
+        for snapshot in db.get_all(indexed_refs, field_paths=['group']) if snapshot.exists
+    }
+    for doc in page:
+        news_group = _group_id(doc.to_dict().get('group'))
+        indexed_group = indexed_groups.get(doc.id)
+        if news_group is None or indexed_group is None or indexed_group == news_group:
+            continue
+        stats.stale_assignments += 1
+        removals.setdefault(indexed_group, set()).add(doc.id)
+        # Indexed again when the sweep sees the neutral_news of its new group
+        index_updates[doc.id] = None
+
+    if removals or index_updates:
+        _apply_fixes(db, removals, index_updates, stats, batch_size)
+
+def sweep_consistency(db, batch_size=450):
+    """
+    Incrementally repair the references between neutral_news and news.
+
+    Only documents whose updated_at is past the watermark of the previous sweep are
+    read: changed neutral_news are checked against their news and the reverse index,
+    then regrouped news are removed from the group they were indexed under. Each
+    pass keeps its watermark in 'cleanup_checkpoints', saved after every page.
+    The first sweep scans everything and builds the index.
+
+    Args:
+        db: Firestore database instance
+        batch_size: Maximum batch size for Firestore operations
+
+    Returns:
+        SweepStats: What was checked and fixed
+    """
+    print("Sweeping neutral_news and news references...")
+    start_time = time.time()
+    stats = SweepStats()
+
+    passes = [
+        ('neutral_news', ['group', 'source_ids'], _sweep_neutral_news_page),
+        ('news', ['group'], _sweep_news_page),
+    ]
+    for collection_name, fields, sweep_page in passes:
+        try:
+            checkpoint = CleanupCheckpoint(db, f"consistency_{collection_name}", max_age_hours=None)
+            for page in _changed_pages(db, collection_name, fields, checkpoint):
+                sweep_page(db, page, stats, batch_size)
+                stats.scanned += len(page)
+                checkpoint.save(page[-1].to_dict().get('updated_at'), len(page), 0)
+        except Exception as e:
+            # The watermark only advances past fixed pages, the next sweep resumes from there
+            print(f"  ✗ Error sweeping {collection_name}: {str(e)}")
+            traceback.print_exc()
+
+    elapsed = time.time() - start_time
+    print(f"  ✓ Checked {stats.scanned} changed documents in {elapsed:.2f}s: {stats.dangling} dangling, "
+          f"{stats.mismatched} mismatched and {stats.stale_assignments} stale source assignments removed "
+          f"from {stats.groups_fixed} groups")
+    return stats
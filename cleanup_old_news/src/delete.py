@@ -1,42 +1,51 @@
 import time
 import traceback
+from src.write_pipeline import WritePipeline
 
-def delete_documents_batch(db, docs, batch_size=450, collection_name=''):
+def delete_documents_batch(db, docs, batch_size=450, collection_name='', sidecar_collections=()):
     """
-    Delete a list of documents in batches.
-    
+    Delete a list of documents through the write pipeline.
+    Batches are committed in parallel and retried on transient errors;
+    documents that still fail are reported and skipped.
+
     Args:
         db: Firestore database instance
-        docs: List of document references to delete
+        docs: List of document snapshots to delete
         batch_size: Maximum batch size (Firestore limit is 500)
         collection_name: Name of collection (for logging)
-        
+        sidecar_collections: Collections holding sidecar documents with the same ID, deleted alongside
+
     Returns:
         int: Number of deleted documents
     """
-    batch = db.batch()
-    deleted_count = 0
     start_time = time.time()
-    
-    try:
-        for i, doc in enumerate(docs):
-            batch.delete(doc.reference)
-            deleted_count += 1
-            
-            if (i + 1) % batch_size == 0:
-                print(f"  - Committing batch {(i + 1) // batch_size} ({batch_size} items) from {collection_name}...")
-                batch.commit()
-                batch = db.batch()
+    writer = WritePipeline(db, name=collection_name, max_operations=batch_size)
+    submitted = []
 
-        if deleted_count % batch_size != 0:
-            batch.commit()
-        
-        elapsed = time.time() - start_time
-        if deleted_count > 0:
-            print(f"  ✓ Deleted {deleted_count} documents from {collection_name} in {elapsed:.2f} seconds")
-        return deleted_count
-        
+    try:
+        for doc in docs:
+            # A document and its sidecars are deleted atomically: the scans only walk the
+            # main collection, so a sidecar left behind would never be cleaned up
+            writer.write_together([
+                ("delete", doc.reference, None),
+                *(("delete", db.collection(sidecar_collection).document(doc.id), None)
+                  for sidecar_collection in sidecar_collections),
+            ])
+            submitted.append(doc.id)
     except Exception as e:
         print(f"  ✗ Error while deleting documents from {collection_name}: {str(e)}")
         traceback.print_exc()
-        return deleted_count
\ No newline at end of file
+
+    report = writer.close()
+    failed_ids = {
+        path.split('/')[-1] for path in report.failed_paths()
+        if path.startswith(f"{collection_name}/")
+    }
+    deleted_count = len([doc_id for doc_id in submitted if doc_id not in failed_ids])
+
+    elapsed = time.time() - start_time
+    if deleted_count > 0:
+        print(f"  ✓ Deleted {deleted_count} documents from {collection_name} in {elapsed:.2f} seconds")
+    if failed_ids:
+        print(f"  ✗ {len(failed_ids)} documents from {collection_name} could not be deleted")
+    return deleted_count
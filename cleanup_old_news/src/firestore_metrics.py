@@ -0,0 +1,392 @@
+import os
+import sys
+import json
+import time
+import sysconfig
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+"""
+Firestore operation accounting.
+
+InstrumentedFirestore wraps a Firestore client (or a local backend) and records,
+for every call site and pipeline stage, the documents read, written and deleted,
+the queries run, the estimated bytes transferred and the time spent waiting on
+Firestore. The call site is the first application function found on the stack,
+e.g. "storage.py:get_news_for_grouping". Stages are set by the tasks:
+
+    with metrics.stage("grouping"):
+        process_news_groups()
+    metrics.report("fetch_news_task")
+
+Writes committed on WritePipeline worker threads are attributed to the call site
+and stage that buffered them (see capture_context and attributed).
+"""
+
+# Firestore list prices in USD per 100,000 operations, used for the cost estimate
+READ_PRICE = 0.06
+WRITE_PRICE = 0.18
+DELETE_PRICE = 0.02
+
+# Frames from the standard library, installed packages and these modules are skipped when looking for the call site
+LIBRARY_PATHS = tuple({sysconfig.get_paths()["stdlib"], sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"]})
+INFRASTRUCTURE_MODULES = {"firestore_metrics.py", "write_pipeline.py", "async_storage.py", "local_backends.py"}
+
+def estimate_size(value):
+    """Rough size in bytes of a value once stored in Firestore"""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(str(key)) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(estimate_size(item) for item in value)
+    if hasattr(value, "tolist"):  # numpy arrays and scalars
+        return estimate_size(value.tolist())
+    return 16
+
+class OperationStats:
+    """Totals of the Firestore operations made from one call site in one stage"""
+
+    FIELDS = ("calls", "reads", "writes", "deletes", "queries", "bytes_read", "bytes_written")
+
+    def __init__(self):
+        self.calls = 0
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.queries = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+
+    def add(self, other):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.latency += other.latency
+        self.max_latency = max(self.max_latency, other.max_latency)
+
+    @property
+    def estimated_cost(self):
+        return (self.reads * READ_PRICE + self.writes * WRITE_PRICE + self.deletes * DELETE_PRICE) / 100000
+
+    def as_dict(self):
+        result = {field: getattr(self, field) for field in self.FIELDS}
+        result["latency_seconds"] = round(self.latency, 3)
+        result["max_latency_seconds"] = round(self.max_latency, 3)
+        result["estimated_cost_usd"] = round(self.estimated_cost, 6)
+        return result
+
+class FirestoreMetrics:
+    """Registry of OperationStats by (stage, call site), shared by every instrumented client"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stats = {}
+        self.stages = []
+        self.started_at = time.time()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+            self.stages = []
+            self.started_at = time.time()
+
+    @contextmanager
+    def stage(self, name):
+        """Attribute the operations made inside the block to a pipeline stage. Stages nest."""
+        with self.lock:
+            self.stages.append(name)
+        try:
+            yield
+        finally:
+            with self.lock:
+                if self.stages and self.stages[-1] == name:
+                    self.stages.pop()
+
+    def current_stage(self):
+        stage = getattr(self.local, "stage", None)
+        if stage is not None:
+            return stage
+        with self.lock:
+            return "/".join(self.stages) or "unstaged"
+
+    def current_call_site(self):
+        call_site = getattr(self.local, "call_site", None)
+        if call_site is not None:
+            return call_site
+        frame = sys._getframe(1)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            module = os.path.basename(filename)
+            function = frame.f_code.co_name
+            if (not filename.startswith(LIBRARY_PATHS + ("<",))
+                    and module not in INFRASTRUCTURE_MODULES
+                    and not function.startswith("<")):
+                return f"{module}:{function}"
+            frame = frame.f_back
+        return "unknown"
+
+    def capture_context(self):
+        """The (stage, call site) of the calling thread, to attribute work done on another thread"""
+        return self.current_stage(), self.current_call_site()
+
+    @contextmanager
+    def attributed(self, context):
+        """Attribute the operations made by this thread inside the block to a captured context"""
+        previous = (getattr(self.local, "stage", None), getattr(self.local, "call_site", None))
+        self.local.stage, self.local.call_site = context
+        try:
+            yield
+        finally:
+            self.local.stage, self.local.call_site = previous
+
+    def record(self, reads=0, writes=0, deletes=0, queries=0, bytes_read=0, bytes_written=0, latency=0.0):
+        key = (self.current_stage(), self.current_call_site())
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = OperationStats()
+            stats.calls += 1
+            stats.reads += reads
+            stats.writes += writes
+            stats.deletes += deletes
+            stats.queries += queries
+            stats.bytes_read += bytes_read
+            stats.bytes_written += bytes_written
+            stats.latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+
+    def totals(self, by=None):
+        """
+        Aggregate the recorded stats.
+
+        Args:
+            by: None for the grand total, "stage" or "call_site" for totals per stage or call site
+        """
+        with self.lock:
+            items = list(self.stats.items())
+        if by is None:
+            total = OperationStats()
+            for _, stats in items:
+                total.add(stats)
+            return total
+        index = 0 if by == "stage" else 1
+        grouped = {}
+        for key, stats in items:
+            grouped.setdefault(key[index], OperationStats()).add(stats)
+        return grouped
+
+    def report(self, run_name, top=15):
+        """
+        Print the per-run report and return it as a dict.
+        The report is also printed as one JSON line, which Cloud Logging parses as a structured entry.
+        """
+        total = self.totals()
+        by_stage = self.totals(by="stage")
+        by_call_site = self.totals(by="call_site")
+        report = {
+            "run": run_name,
+            "duration_seconds": round(time.time() - self.started_at, 2),
+            "total": total.as_dict(),
+            "stages": {stage: stats.as_dict() for stage, stats in by_stage.items()},
+            "call_sites": {call_site: stats.as_dict() for call_site, stats in by_call_site.items()},
+        }
+
+        print(f"📊 Firestore usage for {run_name}: {total.reads} reads, {total.writes} writes, "
+              f"{total.deletes} deletes, {total.queries} queries, "
+              f"{(total.bytes_read + total.bytes_written) / 1024:.1f} KiB, "
+              f"{total.latency:.2f}s waiting, ~${total.estimated_cost:.4f}")
+        for stage, stats in sorted(by_stage.items(), key=lambda item: -item[1].estimated_cost):
+            print(f"  - stage {stage}: {stats.reads} reads, {stats.writes} writes, {stats.deletes} deletes, "
+                  f"{stats.queries} queries, {stats.latency:.2f}s")
+        ranked = sorted(by_call_site.items(), key=lambda item: -item[1].estimated_cost)
+        for call_site, stats in ranked[:top]:
+            print(f"  - {call_site}: {stats.reads} reads, {stats.writes} writes, {stats.deletes} deletes, "
+                  f"{stats.queries} queries in {stats.calls} calls, {stats.latency:.2f}s "
+                  f"(max {stats.max_latency:.2f}s)")
+        print(json.dumps({"firestore_report": report}))
+        return report
+
+metrics = FirestoreMetrics()
+
+def _unwrap(value):
+    return value._wrapped if isinstance(value, _Instrumented) else value
+
+class _Instrumented:
+    """Delegates everything that is not instrumented to the wrapped object"""
+
+    def __init__(self, wrapped, registry):
+        self._wrapped = wrapped
+        self._metrics = registry
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def _timed_stream(self, iterator, queries):
+        """Yield snapshots from iterator, recording one read per document and the time spent waiting"""
+        reads = 0
+        size = 0
+        latency = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    snapshot = next(iterator)
+                except StopIteration:
+                    latency += time.perf_counter() - start
+                    break
+                latency += time.perf_counter() - start
+                # Looking up a missing document is billed as a read too
+                reads += 1
+                if getattr(snapshot, "exists", True):
+                    size += estimate_size(snapshot.to_dict())
+                yield snapshot
+        finally:
+            # A query that returns nothing is still billed one read
+            self._metrics.record(reads=max(reads, queries), queries=queries, bytes_read=size, latency=latency)
+
+class InstrumentedFirestore(_Instrumented):
+    """Firestore client wrapper that records every operation in a FirestoreMetrics registry"""
+
+    def __init__(self, client, registry=None):
+        super().__init__(client, registry or metrics)
+
+    def collection(self, name):
+        return InstrumentedQuery(self._wrapped.collection(name), self._metrics)
+
+    def document(self, path):
+        return InstrumentedDocumentReference(self._wrapped.document(path), self._metrics)
+
+    def get_all(self, references, *args, **kwargs):
+        if "transaction" in kwargs:
+            kwargs["transaction"] = _unwrap(kwargs["transaction"])
+        iterator = iter(self._wrapped.get_all([_unwrap(ref) for ref in references], *args, **kwargs))
+        return self._timed_stream(iterator, queries=0)
+
+    def batch(self):
+        return InstrumentedWriteBatch(self._wrapped.batch(), self._metrics)
+
+    def transaction(self, *args, **kwargs):
+        return InstrumentedTransaction(self._wrapped.transaction(*args, **kwargs), self._metrics)
+
+class InstrumentedQuery(_Instrumented):
+    """Wraps collection references and queries. Query builders return wrapped queries."""
+
+    def _wrap_query(name):
+        def method(self, *args, **kwargs):
+            return InstrumentedQuery(getattr(self._wrapped, name)(*args, **kwargs), self._metrics)
+        method.__name__ = name
+        return method
+
+    where = _wrap_query("where")
+    select = _wrap_query("select")
+    order_by = _wrap_query("order_by")
+    limit = _wrap_query("limit")
+    offset = _wrap_query("offset")
+    start_at = _wrap_query("start_at")
+    start_after = _wrap_query("start_after")
+    end_at = _wrap_query("end_at")
+    end_before = _wrap_query("end_before")
+    del _wrap_query
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocumentReference(self._wrapped.document(*args, **kwargs), self._metrics)
+
+    def stream(self, *args, **kwargs):
+        if "transaction" in kwargs:
+            kwargs["transaction"] = _unwrap(kwargs["transaction"])
+        return self._timed_stream(iter(self._wrapped.stream(*args, **kwargs)), queries=1)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+class InstrumentedDocumentReference(_Instrumented):
+    def get(self, *args, **kwargs):
+        if "transaction" in kwargs:
+            kwargs["transaction"] = _unwrap(kwargs["transaction"])
+        start = time.perf_counter()
+        snapshot = self._wrapped.get(*args, **kwargs)
+        size = estimate_size(snapshot.to_dict()) if snapshot.exists else 0
+        self._metrics.record(reads=1, bytes_read=size, latency=time.perf_counter() - start)
+        return snapshot
+
+    def set(self, data, *args, **kwargs):
+        start = time.perf_counter()
+        result = self._wrapped.set(data, *args, **kwargs)
+        self._metrics.record(writes=1, bytes_written=estimate_size(data), latency=time.perf_counter() - start)
+        return result
+
+    def update(self, data, *args, **kwargs):
+        start = time.perf_counter()
+        result = self._wrapped.update(data, *args, **kwargs)
+        self._metrics.record(writes=1, bytes_written=estimate_size(data), latency=time.perf_counter() - start)
+        return result
+
+    def delete(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = self._wrapped.delete(*args, **kwargs)
+        self._metrics.record(deletes=1, latency=time.perf_counter() - start)
+        return result
+
+    def collection(self, name):
+        return InstrumentedQuery(self._wrapped.collection(name), self._metrics)
+
+class InstrumentedWriteBatch(_Instrumented):
+    """Counts the writes of a batch when it commits, so failed commits are not counted"""
+
+    def __init__(self, batch, registry):
+        super().__init__(batch, registry)
+        self._writes = 0
+        self._deletes = 0
+        self._bytes = 0
+
+    def set(self, ref, data, *args, **kwargs):
+        self._writes += 1
+        self._bytes += estimate_size(data)
+        return self._wrapped.set(_unwrap(ref), data, *args, **kwargs)
+
+    def update(self, ref, data, *args, **kwargs):
+        self._writes += 1
+        self._bytes += estimate_size(data)
+        return self._wrapped.update(_unwrap(ref), data, *args, **kwargs)
+
+    def delete(self, ref, *args, **kwargs):
+        self._deletes += 1
+        return self._wrapped.delete(_unwrap(ref), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = self._wrapped.commit(*args, **kwargs)
+        self._metrics.record(writes=self._writes, deletes=self._deletes, bytes_written=self._bytes,
+                             latency=time.perf_counter() - start)
+        return result
+
+class InstrumentedTransaction(_Instrumented):
+    """Counts the writes buffered in a transaction. Retried transactions count each attempt."""
+
+    def set(self, ref, data, *args, **kwargs):
+        self._metrics.record(writes=1, bytes_written=estimate_size(data))
+        return self._wrapped.set(_unwrap(ref), data, *args, **kwargs)
+
+    def update(self, ref, data, *args, **kwargs):
+        self._metrics.record(writes=1, bytes_written=estimate_size(data))
+        return self._wrapped.update(_unwrap(ref), data, *args, **kwargs)
+
+    def delete(self, ref, *args, **kwargs):
+        self._metrics.record(deletes=1)
+        return self._wrapped.delete(_unwrap(ref), *args, **kwargs)
+
+def instrument(client, registry=None):
+    """Wrap a Firestore client so its operations are recorded, unless it already is"""
+    if isinstance(client, InstrumentedFirestore):
+        return client
+    return InstrumentedFirestore(client, registry)
@@ -2,50 +2,62 @@ from datetime import datetime, timedelta
 import traceback
 import time
 from src.config import initialize_firebase
-from src.cleanup_news_collection import cleanup_news_collection
-from src.protect import protect_referenced_news
-from src.cleanup import cleanup_collection
+from src.partition import cleanup_in_parallel, MAX_WORKERS
+from src.archive import create_archive_writer
+from src.consistency import sweep_consistency
+from src.firestore_metrics import metrics
 
-def cleanup_old_news_task(retention_days=7, batch_size=450):
+def cleanup_old_news_task(retention_days=7, batch_size=450, max_workers=MAX_WORKERS, archive_destination=None):
     """
-    Main task to clean up old news and neutral_news documents
+    Main task to clean up old news and neutral_news documents and repair the references between them
     
     Args:
         retention_days: Number of days to keep documents
         batch_size: Maximum batch size for Firestore operations
+        max_workers: Time slices cleaned up concurrently
+        archive_destination: Local directory or gs:// URL where deleted documents are archived
+                             (defaults to the ARCHIVE_DESTINATION environment variable, no archive if unset)
         
     Returns:
-        bool: True if successful, False otherwise
+        bool: True if successful, False otherwise (including when some time slices failed)
     """
     print(f"========== CLEANUP TASK STARTED ==========")
     print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Retention period: {retention_days} days")
     overall_start = time.time()
+    metrics.reset()
     
     try:
         time_threshold = datetime.now() - timedelta(days=retention_days)
         db = initialize_firebase()
-        total_deleted = 0
+        archive = create_archive_writer(archive_destination)
         
-        # 1. Find protected news IDs (referenced in active neutral_news)
-        protected_ids = protect_referenced_news(db, time_threshold)
-        
-        # 2. Clean up news collection with protection
-        news_deleted, news_protected = cleanup_news_collection(db, time_threshold, protected_ids, batch_size)
-        total_deleted += news_deleted
-        
-        # 3. Clean up neutral_news collection
-        neutral_deleted = cleanup_collection(db, 'neutral_news', time_threshold, batch_size)
-        total_deleted += neutral_deleted
+        # Protection, news, neutral_news and group_summaries cleanup run as time slices on a worker pool.
+        # News slices start once the IDs referenced in active neutral_news are known.
+        try:
+            progress = cleanup_in_parallel(db, time_threshold, batch_size, max_workers, archive=archive)
+        finally:
+            if archive is not None:
+                archive.close()
+
+        # Repair dangling and multiple-group source assignments changed since the last sweep
+        with metrics.stage("consistency_sweep"):
+            sweep = sweep_consistency(db, batch_size)
+        total_deleted = progress.total_deleted()
+        news_protected = progress.total_protected()
         
         overall_elapsed = time.time() - overall_start
         print(f"========== CLEANUP TASK COMPLETED ==========")
         print(f"Total deleted: {total_deleted} documents")
         print(f"Total protected: {news_protected} news documents")
+        print(f"Source references fixed: {sweep.dangling + sweep.mismatched + sweep.stale_assignments}")
+        if progress.failed():
+            print(f"Failed slices: {', '.join(progress.failed())}")
         print(f"Total time: {overall_elapsed:.2f} seconds")
         print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
-        return True
+        # A partial cleanup is not a success: the failed slices are retried from their checkpoints next run
+        return not progress.failed()
         
     except Exception as e:
         overall_elapsed = time.time() - overall_start
@@ -53,4 +65,6 @@ def cleanup_old_news_task(retention_days=7, batch_size=450):
         print(f"Error in cleanup_old_news_task: {str(e)}")
         print(f"Time elapsed before failure: {overall_elapsed:.2f} seconds")
         traceback.print_exc()
-        return False
\ No newline at end of file
+        return False
+    finally:
+        metrics.report("cleanup_old_news_task")
\ No newline at end of file
@@ -0,0 +1,168 @@
+import time
+import traceback
+from threading import Lock
+from datetime import timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.cleanup import cleanup_collection, slice_label
+from src.cleanup_news_collection import cleanup_news_collection
+from src.protect import protect_referenced_news
+from src.firestore_metrics import metrics
+
+SLICE_HOURS = 24  # Width of each time slice
+MAX_WORKERS = 8  # Slices cleaned up at the same time
+
+def oldest_timestamp(db, collection_name, date_field, time_threshold):
+    """
+    Timestamp of the oldest document older than time_threshold, as a naive UTC datetime.
+
+    Returns:
+        datetime or None if there is nothing to clean up
+    """
+    query = (
+        db.collection(collection_name)
+        .where(date_field, '<', time_threshold)
+        .order_by(date_field)
+        .select([date_field])
+        .limit(1)
+    )
+    docs = list(query.stream())
+    if not docs:
+        return None
+    oldest = docs[0].to_dict().get(date_field)
+    if oldest is not None and oldest.tzinfo is not None:
+        # Naive datetimes are sent to Firestore as UTC, like time_threshold
+        oldest = oldest.astimezone(timezone.utc).replace(tzinfo=None)
+    return oldest
+
+def time_slices(oldest, time_threshold, slice_hours=SLICE_HOURS):
+    """
+    Split [oldest, time_threshold) into consecutive slices.
+    Slices start at midnight plus multiples of slice_hours, so a slice keeps the same
+    boundaries (and checkpoint) from one run to the next.
+
+    Returns:
+        list: (start, end) tuples
+    """
+    if oldest is None or oldest >= time_threshold:
+        return []
+    width = timedelta(hours=slice_hours)
+    midnight = oldest.replace(hour=0, minute=0, second=0, microsecond=0)
+    start = midnight + width * int((oldest - midnight) / width)
+    slices = []
+    while start < time_threshold:
+        slices.append((start, min(start + width, time_threshold)))
+        start += width
+    return slices
+
+class CleanupProgress:
+    """Thread-safe progress of the slices of a partitioned cleanup"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.slices = {}
+        self.total = 0
+
+    def add(self, label):
+        with self.lock:
+            self.slices[label] = {"status": "pending", "deleted": 0, "protected": 0, "seconds": 0.0}
+            self.total += 1
+
+    def finish(self, label, deleted, protected, seconds, status="done"):
+        with self.lock:
+            self.slices[label].update(status=status, deleted=deleted, protected=protected, seconds=round(seconds, 2))
+            completed = sum(1 for entry in self.slices.values() if entry["status"] != "pending")
+        mark = "✓" if status == "done" else "✗"
+        print(f"  {mark} [{completed}/{self.total}] {label}: {deleted} deleted, {protected} protected in {seconds:.2f}s")
+
+    def total_deleted(self):
+        with self.lock:
+            return sum(entry["deleted"] for entry in self.slices.values())
+
+    def total_protected(self):
+        with self.lock:
+            return sum(entry["protected"] for entry in self.slices.values())
+
+    def failed(self):
+        with self.lock:
+            return [label for label, entry in self.slices.items() if entry["status"] == "failed"]
+
+def _run_in_stage(stage, function, *args, **kwargs):
+    # Stages are per thread here: slices of several collections run at the same time
+    with metrics.attributed((stage, None)):
+        return function(*args, **kwargs)
+
+def cleanup_in_parallel(db, time_threshold, batch_size=450, max_workers=MAX_WORKERS, slice_hours=SLICE_HOURS,
+                        archive=None):
+    """
+    Clean up news, neutral_news, group_summaries and the LLM response cache in time
+    slices on a worker pool.
+
+    The protection pass and the slices of every collection but news start right
+    away. They never touch the same documents: protection reads active neutral_news,
+    the cleanup deletes old ones. The news slices start once the protected IDs are known.
+
+    Args:
+        db: Firestore database instance
+        time_threshold: Delete documents older than this timestamp
+        batch_size: Maximum batch size for Firestore operations
+        max_workers: Slices processed concurrently
+        slice_hours: Width of each time slice
+        archive: Optional ArchiveWriter receiving the documents before they are deleted
+
+    Returns:
+        CleanupProgress: Per-slice results
+    """
+    progress = CleanupProgress()
+    plans = [
+        ('neutral_news', 'created_at'),
+        ('group_summaries', 'updated_at'),
+        ('llm_response_cache', 'created_at'),
+        ('news', 'created_at'),
+    ]
+    with metrics.stage("plan_slices"):
+        slices = {
+            collection_name: time_slices(oldest_timestamp(db, collection_name, date_field, time_threshold),
+                                         time_threshold, slice_hours)
+            for collection_name, date_field in plans
+        }
+    for collection_name, collection_slices in slices.items():
+        print(f"  {collection_name}: {len(collection_slices)} time slices to clean up")
+        for start, _ in collection_slices:
+            progress.add(slice_label(collection_name, start))
+
+    def run_slice(collection_name, date_field, start, end, protected_ids=None):
+        label = slice_label(collection_name, start)
+        slice_start = time.time()
+        try:
+            if collection_name == 'news':
+                deleted, protected = cleanup_news_collection(db, end, protected_ids, batch_size, start=start,
+                                                             archive=archive)
+            else:
+                deleted = cleanup_collection(db, collection_name, end, batch_size, date_field, start=start,
+                                             archive=archive)
+                protected = 0
+            progress.finish(label, deleted, protected, time.time() - slice_start)
+        except Exception as e:
+            print(f"  ✗ Error cleaning up {label}: {str(e)}")
+            traceback.print_exc()
+            progress.finish(label, 0, 0, time.time() - slice_start, status="failed")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run_in_stage, "protect", protect_referenced_news, db, time_threshold)]
+        protect_future = futures[0]
+        for collection_name, date_field in plans:
+            if collection_name == 'news':
+                continue
+            for start, end in slices[collection_name]:
+                futures.append(executor.submit(_run_in_stage, f"cleanup_{collection_name}",
+                                               run_slice, collection_name, date_field, start, end))
+
+        protected_ids = protect_future.result()
+        for start, end in slices['news']:
+            futures.append(executor.submit(_run_in_stage, "cleanup_news",
+                                           run_slice, 'news', 'created_at', start, end, protected_ids))
+
+        for future in as_completed(futures):
+            future.result()
+
+    return progress
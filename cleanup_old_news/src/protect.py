@@ -1,40 +1,93 @@
 import time
+import hashlib
 import traceback
+from array import array
+from bisect import bisect_left
+from src.scan import stream_key_pages
+
+def fingerprint(news_id):
+    """64-bit fingerprint of a news ID"""
+    return int.from_bytes(hashlib.blake2b(str(news_id).encode('utf-8'), digest_size=8).digest(), 'little')
+
+class ProtectedIds:
+    """
+    Compact set of protected news IDs, stored as a sorted array of 64-bit fingerprints.
+
+    Each ID takes 8 bytes instead of a Python string in a set (over 100 bytes).
+    Membership is a binary search. A fingerprint collision can only protect a
+    document that should have been deleted, never delete a protected one, and at
+    64 bits it is negligible for the number of IDs kept within retention.
+    """
+
+    def __init__(self, news_ids=()):
+        self.pending = array('Q')
+        self.fingerprints = array('Q')
+        self.add_many(news_ids)
+
+    def add_many(self, news_ids):
+        self.pending.extend(fingerprint(news_id) for news_id in news_ids)
+
+    def freeze(self):
+        """Merge the added IDs into the sorted, deduplicated array. Called before lookups."""
+        if not self.pending:
+            return self
+        merged = array('Q')
+        previous = None
+        for value in sorted(self.fingerprints + self.pending):
+            if value != previous:
+                merged.append(value)
+                previous = value
+        self.fingerprints = merged
+        self.pending = array('Q')
+        return self
+
+    def __contains__(self, news_id):
+        self.freeze()
+        value = fingerprint(news_id)
+        index = bisect_left(self.fingerprints, value)
+        return index < len(self.fingerprints) and self.fingerprints[index] == value
+
+    def __len__(self):
+        self.freeze()
+        return len(self.fingerprints)
+
+    @property
+    def nbytes(self):
+        return self.fingerprints.itemsize * len(self.fingerprints)
 
 def protect_referenced_news(db, time_threshold):
     """
     Find news IDs referenced in active neutral_news to protect them from deletion
-    
+
     Args:
         db: Firestore database instance
         time_threshold: Time threshold used for active neutral_news
-        
+
     Returns:
-        set: Set of news IDs to protect
+        ProtectedIds: Compact set of news IDs to protect
     """
     print(f"Identifying news documents referenced in active neutral_news...")
     start_time = time.time()
-    
+
     try:
-        # Get active neutral_news (not older than threshold)
-        active_neutral_docs = db.collection('neutral_news').where('created_at', '>=', time_threshold).stream()
-        
-        # Collect all source IDs
-        protected_ids = set()
+        # Page through active neutral_news (not older than threshold), reading only their source_ids
+        protected_ids = ProtectedIds()
         doc_count = 0
-        
-        for doc in active_neutral_docs:
-            doc_count += 1
-            data = doc.to_dict()
-            if 'source_ids' in data:
-                for source_id in data['source_ids']:
-                    protected_ids.add(source_id)
-        
+        pages = stream_key_pages(db, 'neutral_news', 'created_at', [('created_at', '>=', time_threshold)],
+                                 fields=['source_ids'])
+
+        for page in pages:
+            doc_count += len(page)
+            for doc in page:
+                protected_ids.add_many(doc.to_dict().get('source_ids') or [])
+        protected_ids.freeze()
+
         elapsed = time.time() - start_time
-        print(f"  ✓ Found {len(protected_ids)} protected news IDs from {doc_count} active neutral_news documents ({elapsed:.2f}s)")
+        print(f"  ✓ Found {len(protected_ids)} protected news IDs from {doc_count} active neutral_news documents "
+              f"({protected_ids.nbytes / 1024:.1f} KiB, {elapsed:.2f}s)")
         return protected_ids
-        
+
     except Exception as e:
         print(f"  ✗ Error identifying protected news: {str(e)}")
         traceback.print_exc()
-        return set()
\ No newline at end of file
+        return ProtectedIds()
@@ -0,0 +1,41 @@
+PAGE_SIZE = 1000  # Documents per query page
+
+def stream_key_pages(db, collection_name, date_field, filters, page_size=PAGE_SIZE, fields=None, keys_only=True):
+    """
+    Page through the documents of a collection ordered by a timestamp field.
+
+    By default only the timestamp (plus any extra fields) is read, never the full payload.
+    Pages are chained with start_after cursors, so memory use is bounded by one
+    page whatever the size of the backlog.
+
+    Args:
+        db: Firestore database instance
+        collection_name: Collection to scan
+        date_field: Timestamp field used for the ordering and the cursor
+        filters: List of (field, operator, value) tuples. Range filters must be on date_field
+        page_size: Documents per page
+        fields: Extra fields to project
+        keys_only: Read only the projected fields. False reads full documents (e.g. to archive them)
+
+    Yields:
+        list: Document snapshots of each page, in timestamp order
+    """
+    projection = list(dict.fromkeys([date_field, *(fields or [])]))
+    base_query = db.collection(collection_name)
+    for field, op, value in filters:
+        base_query = base_query.where(field, op, value)
+    base_query = base_query.order_by(date_field)
+    if keys_only:
+        base_query = base_query.select(projection)
+    base_query = base_query.limit(page_size)
+
+    last_doc = None
+    while True:
+        query = base_query if last_doc is None else base_query.start_after(last_doc)
+        page = list(query.stream())
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_doc = page[-1]
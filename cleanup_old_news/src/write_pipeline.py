@@ -0,0 +1,223 @@
+import time
+import random
+import traceback
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from google.api_core import exceptions as google_exceptions
+from .firestore_metrics import metrics, estimate_size
+
+MAX_BATCH_OPERATIONS = 500  # Firestore limit of writes per commit
+MAX_BATCH_BYTES = 9 * 1024 * 1024  # Stay below the 10 MiB request limit
+
+# Errors worth retrying: contention, timeouts, throttling and transient server errors
+RETRYABLE_ERRORS = (
+    google_exceptions.Aborted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.TooManyRequests,
+)
+
+class WriteFailure:
+    """A write that could not be committed after all retries"""
+
+    def __init__(self, path, operation, error):
+        self.path = path
+        self.operation = operation
+        self.error = error
+
+    def __repr__(self):
+        return f"WriteFailure({self.operation} {self.path}: {self.error})"
+
+class WriteReport:
+    """Outcome of the writes sent through a WritePipeline"""
+
+    def __init__(self):
+        self.succeeded = 0
+        self.batches = 0
+        self.retries = 0
+        self.failures = []
+
+    @property
+    def failed(self):
+        return len(self.failures)
+
+    def failed_paths(self):
+        return {failure.path for failure in self.failures}
+
+    def __repr__(self):
+        return (f"WriteReport(succeeded={self.succeeded}, failed={self.failed}, "
+                f"batches={self.batches}, retries={self.retries})")
+
+class WritePipeline:
+    """
+    Buffers Firestore writes and commits them as batches on a thread pool.
+
+    - Batches are cut at max_operations writes or max_bytes of estimated payload,
+      so large documents (e.g. embeddings) never exceed the request size limit.
+    - At most max_in_flight batches are committing at a time; adding writes blocks
+      until one finishes, which keeps memory bounded on large jobs.
+    - Retryable errors are retried with exponential backoff and full jitter.
+    - A batch that still fails is split and its writes are committed one by one,
+      so a single bad write does not take the rest of the batch down with it.
+      Writes added with write_together() are always committed in the same batch.
+
+    Usage:
+        with WritePipeline(db, name="news") as writer:
+            writer.set(ref, data)
+        print(writer.report)
+    """
+
+    def __init__(self, db, name="", max_operations=450, max_bytes=MAX_BATCH_BYTES,
+                 max_workers=4, max_in_flight=8, max_retries=5, base_delay=0.5, max_delay=30.0):
+        self.db = db
+        self.name = name
+        self.max_operations = min(max_operations, MAX_BATCH_OPERATIONS)
+        self.max_bytes = min(max_bytes, MAX_BATCH_BYTES)
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.in_flight = set()
+        self.pending_units = []
+        self.pending_operations = 0
+        self.pending_bytes = 0
+        self.report = WriteReport()
+        self.lock = Lock()
+        self.start_time = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+    def set(self, ref, data, merge=False):
+        self._add([("set", ref, data, {"merge": merge} if merge else {})])
+
+    def update(self, ref, data):
+        self._add([("update", ref, data, {})])
+
+    def delete(self, ref):
+        self._add([("delete", ref, None, {})])
+
+    def write_together(self, operations):
+        """
+        Add writes that must be committed atomically in the same batch.
+        Each operation is a tuple (kind, ref, data) with kind in "set", "update", "delete".
+        """
+        unit = [(kind, ref, data, {}) for kind, ref, data in operations]
+        if len(unit) > self.max_operations:
+            raise ValueError(f"Cannot commit {len(unit)} writes atomically, limit is {self.max_operations}")
+        self._add(unit)
+
+    def _add(self, unit):
+        size = sum(estimate_size(data) + 64 for _, _, data, _ in unit)
+        if self.pending_units and (
+            self.pending_operations + len(unit) > self.max_operations
+            or self.pending_bytes + size > self.max_bytes
+        ):
+            self.flush()
+        self.pending_units.append(unit)
+        self.pending_operations += len(unit)
+        self.pending_bytes += size
+
+    def flush(self):
+        """Send the buffered writes as one batch, waiting if too many batches are in flight"""
+        if not self.pending_units:
+            return
+        units = self.pending_units
+        self.pending_units = []
+        self.pending_operations = 0
+        self.pending_bytes = 0
+
+        while len(self.in_flight) >= self.max_in_flight:
+            done, self.in_flight = wait(self.in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._collect(future)
+        self.in_flight.add(self.executor.submit(self._commit_units, units, metrics.capture_context()))
+
+    def close(self):
+        """Commit everything still buffered, wait for all batches and return the report"""
+        self.flush()
+        for future in self.in_flight:
+            self._collect(future)
+        self.in_flight = set()
+        self.executor.shutdown(wait=True)
+
+        elapsed = time.time() - self.start_time
+        label = f" to {self.name}" if self.name else ""
+        if self.report.succeeded or self.report.failures:
+            print(f"  ✓ Committed {self.report.succeeded} writes{label} in {self.report.batches} batches "
+                  f"({self.report.retries} retries, {self.report.failed} failed) in {elapsed:.2f} seconds")
+        for failure in self.report.failures[:10]:
+            print(f"  ✗ Failed {failure.operation} on {failure.path}: {failure.error}")
+        return self.report
+
+    def _collect(self, future):
+        try:
+            future.result()
+        except Exception as e:
+            # _commit_units records its own failures, this only guards against bugs
+            print(f"  ✗ Unexpected error in write pipeline{' ' + self.name if self.name else ''}: {str(e)}")
+            traceback.print_exc()
+
+    def _commit_units(self, units, context):
+        # Firestore usage is attributed to the code that buffered the writes
+        with metrics.attributed(context):
+            self._commit_units_attributed(units)
+
+    def _commit_units_attributed(self, units):
+        operations = [operation for unit in units for operation in unit]
+        error = self._commit_with_retry(operations)
+        if error is None:
+            return
+
+        if len(units) == 1:
+            self._record_failures(units[0], error)
+            return
+
+        # Isolate the failing writes by committing each unit on its own
+        print(f"  ⚠️ Batch of {len(operations)} writes failed ({str(error)}), retrying them individually")
+        for unit in units:
+            unit_error = self._commit_with_retry(unit)
+            if unit_error is not None:
+                self._record_failures(unit, unit_error)
+
+    def _record_failures(self, unit, error):
+        with self.lock:
+            for kind, ref, _, _ in unit:
+                self.report.failures.append(WriteFailure(_path(ref), kind, str(error)))
+
+    def _commit_with_retry(self, operations):
+        """Commit operations in one batch. Returns None on success or the last error."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                batch = self.db.batch()
+                for kind, ref, data, options in operations:
+                    if kind == "set":
+                        batch.set(ref, data, **options)
+                    elif kind == "update":
+                        batch.update(ref, data)
+                    else:
+                        batch.delete(ref)
+                batch.commit()
+                with self.lock:
+                    self.report.batches += 1
+                    self.report.succeeded += len(operations)
+                return None
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    return e
+                with self.lock:
+                    self.report.retries += 1
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                time.sleep(delay)
+            except Exception as e:
+                return e
+
+def _path(ref):
+    return getattr(ref, "path", None) or str(getattr(ref, "id", ref))
@@ -0,0 +1,183 @@
+import asyncio
+import time
+import threading
+from .config import initialize_async_firebase
+from .firestore_metrics import metrics, estimate_size
+
+FIRESTORE_IN_QUERY_LIMIT = 30  # Maximum number of values in a Firestore 'in' filter
+GET_ALL_CHUNK_SIZE = 300  # Documents per get_all call
+MAX_CONCURRENCY = 16  # Firestore requests in flight at once
+
+# Event loop shared by every run_async call, see get_storage_loop
+_storage_loop = None
+_storage_loop_lock = threading.Lock()
+
+class AsyncStorage:
+    """
+    Async counterpart of the batch read helpers in storage.py, built on Firestore's
+    AsyncClient. Writes go through WritePipeline (write_pipeline.py). Every request goes through one semaphore, so a stage can
+    fire all its reads at once and still keep at most max_concurrency in flight.
+
+    The client is created inside the running event loop and must only be used on it,
+    which run_async guarantees by running every operation on one loop. Any object with the
+    AsyncClient interface can be passed as db, e.g. a client connected to the
+    Firestore emulator (FIRESTORE_EMULATOR_HOST) or an in-memory fake in tests.
+
+    Usage:
+        async with AsyncStorage() as storage:
+            news_by_group = await storage.get_news_by_groups(group_ids, ["title"])
+    """
+
+    def __init__(self, db=None, max_concurrency=MAX_CONCURRENCY):
+        self.db = db
+        self.max_concurrency = max_concurrency
+        self.semaphore = None
+        self.requests = 0
+
+    async def __aenter__(self):
+        if self.db is None:
+            self.db = initialize_async_firebase()
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        return False
+
+    async def _limited(self, coro):
+        async with self.semaphore:
+            self.requests += 1
+            return await coro
+
+    async def _collect(self, async_iterable, queries=0):
+        """Collect the snapshots of a get_all or query stream and record them in the Firestore metrics"""
+        start = time.perf_counter()
+        snapshots = [item async for item in async_iterable]
+        existing = [doc for doc in snapshots if doc.exists]
+        metrics.record(
+            reads=max(len(snapshots), queries),
+            queries=queries,
+            bytes_read=sum(estimate_size(doc.to_dict()) for doc in existing),
+            latency=time.perf_counter() - start,
+        )
+        return snapshots
+
+    async def get_documents(self, collection_name, doc_ids, field_paths=None) -> dict:
+        """
+        Batch read documents by ID with concurrent get_all calls.
+
+        Returns:
+            dict: {doc_id: document data or None if it does not exist}
+        """
+        doc_ids = [str(doc_id) for doc_id in dict.fromkeys(doc_ids) if doc_id is not None]
+        chunks = [doc_ids[i:i + GET_ALL_CHUNK_SIZE] for i in range(0, len(doc_ids), GET_ALL_CHUNK_SIZE)]
+
+        async def fetch_chunk(chunk):
+            refs = [self.db.collection(collection_name).document(doc_id) for doc_id in chunk]
+            return await self._limited(self._collect(self.db.get_all(refs, field_paths=field_paths)))
+
+        documents = {doc_id: None for doc_id in doc_ids}
+        for snapshots in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+            for doc in snapshots:
+                if doc.exists:
+                    documents[doc.id] = doc.to_dict()
+        return documents
+
+    async def query(self, collection_name, filters, fields=None) -> list:
+        """
+        Run a query and return its documents as dicts with their 'id'.
+
+        Args:
+            collection_name: Collection to query
+            filters: List of (field, operator, value) tuples
+            fields: Optional list of fields to project
+        """
+        query = self.db.collection(collection_name)
+        for field, operator, value in filters:
+            query = query.where(field, operator, value)
+        if fields:
+            query = query.select(fields)
+
+        snapshots = await self._limited(self._collect(query.stream(), queries=1))
+        results = []
+        for doc in snapshots:
+            data = doc.to_dict()
+            data["id"] = doc.id
+            results.append(data)
+        return results
+
+    async def get_news_by_groups(self, group_ids, fields) -> dict:
+        """
+        Get the news of several groups with concurrent 'in' queries, projecting only the given fields.
+
+        Returns:
+            dict: {group_id: [news dict with 'id' and the requested fields]} for every requested group
+        """
+        group_ids = list(dict.fromkeys(int(float(group_id)) for group_id in group_ids if group_id is not None))
+        news_by_group = {group_id: [] for group_id in group_ids}
+        projection = list(dict.fromkeys(["group", *fields]))
+        chunks = [
+            group_ids[i:i + FIRESTORE_IN_QUERY_LIMIT]
+            for i in range(0, len(group_ids), FIRESTORE_IN_QUERY_LIMIT)
+        ]
+
+        results = await asyncio.gather(*(
+            self.query('news', [('group', 'in', chunk)], projection) for chunk in chunks
+        ))
+        for news_list in results:
+            for news in news_list:
+                group = news.get("group")
+                if group is not None and int(group) in news_by_group:
+                    news_by_group[int(group)].append(news)
+
+        print(f"Fetched {sum(len(news) for news in news_by_group.values())} news for {len(group_ids)} groups in {len(chunks)} queries")
+        return news_by_group
+
+    async def get_neutral_news_by_groups(self, group_ids) -> dict:
+        """
+        Batch read the 'neutral_news' documents of several groups.
+
+        Returns:
+            dict: {group_id: document data} for the groups that already have a neutral_news document
+        """
+        group_ids = [int(float(group_id)) for group_id in group_ids if group_id is not None]
+        documents = await self.get_documents('neutral_news', group_ids)
+        neutral_news = {int(doc_id): data for doc_id, data in documents.items() if data is not None}
+        print(f"Loaded {len(neutral_news)} existing neutral_news documents for {len(group_ids)} groups")
+        return neutral_news
+
+def get_storage_loop():
+    """
+    Return the event loop of the async storage layer, running forever on a daemon thread.
+
+    The AsyncClient returned by firestore_async.client() is cached by firebase_admin and its
+    grpc.aio channel is bound to the loop it was first used on, so every operation has to run
+    on the same loop: a new loop per call (asyncio.run) fails with "Event loop is closed".
+    """
+    global _storage_loop
+    with _storage_loop_lock:
+        if _storage_loop is None or _storage_loop.is_closed():
+            _storage_loop = asyncio.new_event_loop()
+            threading.Thread(target=_storage_loop.run_forever, name="async-storage", daemon=True).start()
+        return _storage_loop
+
+def run_async(operation, max_concurrency=MAX_CONCURRENCY, db=None):
+    """
+    Run an async storage operation from synchronous code, on the storage event loop.
+    Safe to call from worker threads and from code that runs its own event loop.
+
+    Args:
+        operation: Function receiving an AsyncStorage and returning an awaitable
+        max_concurrency: Maximum Firestore requests in flight
+        db: Optional AsyncClient-compatible database (defaults to the Firebase AsyncClient)
+
+    Returns:
+        The result of the operation
+    """
+    async def run():
+        start_time = time.time()
+        async with AsyncStorage(db=db, max_concurrency=max_concurrency) as storage:
+            result = await operation(storage)
+        print(f"ℹ️ {storage.requests} concurrent Firestore requests completed in {time.time() - start_time:.2f} seconds")
+        return result
+
+    return asyncio.run_coroutine_threadsafe(run(), get_storage_loop()).result()
@@ -1,9 +1,17 @@
+import os
 import traceback
+from .firestore_metrics import instrument
 
 def initialize_firebase():
     """
-    Función para inicializar Firebase solo cuando sea necesario
+    Función para inicializar Firebase solo cuando sea necesario.
+    Con STORAGE_BACKEND=memory o STORAGE_BACKEND=sqlite devuelve un backend local
+    (ver local_backends.py) en lugar de Firestore.
+    El cliente se envuelve para contabilizar sus operaciones (ver firestore_metrics.py).
     """
+    if os.getenv("STORAGE_BACKEND", "firestore").lower() != "firestore":
+        from .local_backends import get_local_backend
+        return instrument(get_local_backend())
     try:
         import firebase_admin
         from firebase_admin import credentials, firestore
@@ -12,8 +20,33 @@ def initialize_firebase():
         except ValueError:
             cred = credentials.ApplicationDefault()
             app = firebase_admin.initialize_app(cred)
-        return firestore.client()
+        return instrument(firestore.client())
     except Exception as e:
         print(f"Error initializing Firebase: {str(e)}")
         traceback.print_exc()
-        raise
\ No newline at end of file
+        raise
+
+def initialize_async_firebase():
+    """
+    Devuelve un cliente asíncrono de Firestore (AsyncClient) sobre la misma app de Firebase.
+    Si FIRESTORE_EMULATOR_HOST está definido, el cliente se conecta al emulador.
+    firebase_admin reutiliza el mismo cliente, ligado al primer event loop en que se usa:
+    úsalo solo desde run_async (async_storage.py), que ejecuta todo en un único loop.
+    Con un backend local (STORAGE_BACKEND) devuelve su vista asíncrona.
+    """
+    if os.getenv("STORAGE_BACKEND", "firestore").lower() != "firestore":
+        from .local_backends import get_local_backend, AsyncLocalFirestore
+        return AsyncLocalFirestore(get_local_backend())
+    try:
+        import firebase_admin
+        from firebase_admin import credentials, firestore_async
+        try:
+            app = firebase_admin.get_app()
+        except ValueError:
+            cred = credentials.ApplicationDefault()
+            app = firebase_admin.initialize_app(cred)
+        return firestore_async.client()
+    except Exception as e:
+        print(f"Error initializing async Firebase client: {str(e)}")
+        traceback.print_exc()
+        raise
@@ -2,15 +2,19 @@ import traceback
 from src.process import process_news_groups
 from src.storage import store_news_in_firestore
 from src.parsers import fetch_all_rss
+from src.firestore_metrics import metrics
 
 def fetch_news_task():
+    metrics.reset()
     try:
         print("🪵 Starting periodic RSS loading...")
-        all_news = fetch_all_rss()
+        with metrics.stage("fetch_rss"):
+            all_news = fetch_all_rss()
         print(f"🪵 Total news obtained: {len(all_news)}")
         
         print("🪵 Storing news in Firestore...")
-        stored_count = store_news_in_firestore(all_news)
+        with metrics.stage("store_news"):
+            stored_count = store_news_in_firestore(all_news)
         print(f"{stored_count} new news were saved")
         
         print("🪵 Starting news grouping...")
@@ -18,4 +22,6 @@ def fetch_news_task():
         print("🪵 RSS processing completed successfully")
     except Exception as e:
         print(f"Error in fetch_news_task: {str(e)}")
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+    finally:
+        metrics.report("fetch_news_task")
\ No newline at end of file
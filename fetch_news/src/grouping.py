@@ -1,23 +1,28 @@
 import os
 import traceback
-from .storage import update_news_embedding, get_group_item_count, get_group_items, get_all_group_ids
+from .storage import update_news_embedding, get_group_summaries, reserve_group_ids
+from .vector_index import VectorIndex, load_index, save_index
+from .similarity import normalize_rows, mean_pairwise_similarity, cluster_similarity_stats
 import pandas as pd
 import numpy as np
 
 _model = None
 _nlp_modules_loaded = False
 MIN_VALID_SOURCES = 3
+MAX_GROUP_SIZE = 25  # Maximum number of news items per group
+CENTROID_MATCH_THRESHOLD = 0.80  # Minimum cosine similarity to join an existing group's centroid
+CENTROID_INDEX_NAME = "group_centroids"
 
 def _load_nlp_modules():
     """Lazily import NLP-related modules to speed up cold starts"""
     global _nlp_modules_loaded
     if not _nlp_modules_loaded:
-        global np, pd, SentenceTransformer, NearestNeighbors, lil_matrix, DBSCAN, sort_graph_by_row_values
+        global np, pd, SentenceTransformer, lil_matrix, DBSCAN, sort_graph_by_row_values
 
         import numpy as np
         import pandas as pd
         from sentence_transformers import SentenceTransformer
-        from sklearn.neighbors import NearestNeighbors, sort_graph_by_row_values
+        from sklearn.neighbors import sort_graph_by_row_values
         from scipy.sparse import lil_matrix
         from sklearn.cluster import DBSCAN
 
@@ -53,9 +58,11 @@ def get_sentence_transformer_model(retry_count=3):
             # print("ℹ️ Falling back to downloading the model.")  # Uncommented this line
             # If loading from bundled path fails, proceed to download logic below
     return _model
-def group_news(news_for_grouping: list) -> list:
+def group_news(news_for_grouping: list, incremental: bool = True) -> list:
     """
-    Groups news based on their semantic similarity
+    Groups news based on their semantic similarity.
+    In incremental mode new items are first matched against the centroids of
+    existing groups and only the leftovers are clustered with DBSCAN.
     """
     try:
         print("ℹ️ Starting news grouping...")
@@ -69,6 +76,15 @@ def group_news(news_for_grouping: list) -> list:
         # Step 2: Process embeddings
         all_items_for_clustering_df, embeddings_norm = process_embeddings(df)
         
+        # Step 2b: Attach new items to existing groups and keep only the leftovers for clustering
+        if incremental and has_reference_news and embeddings_norm is not None:
+            all_items_for_clustering_df, embeddings_norm = assign_to_existing_groups(df, all_items_for_clustering_df, embeddings_norm)
+            if len(all_items_for_clustering_df) < MIN_VALID_SOURCES:
+                print(f"ℹ️ {len(all_items_for_clustering_df)} items left after centroid matching. Skipping clustering.")
+                result = process_results(df, has_reference_news)
+                print("✅ Grouping completed successfully")
+                return result
+        
         # Step 3: Perform clustering if we have valid embeddings
         clustering_succeeded = perform_clustering(all_items_for_clustering_df, embeddings_norm, df, has_reference_news)
         if not clustering_succeeded:
@@ -226,6 +242,92 @@ def process_embeddings(df: pd.DataFrame) -> tuple:
     
     return all_items_for_clustering_df, embeddings_norm
 
+def load_group_centroid_index(all_items_for_clustering_df, embeddings_norm):
+    """
+    Load the persisted centroid index and sync it with the reference groups of the window.
+    group_summaries is the source of truth: entries are replaced by the persisted centroid
+    when the group is missing from the index, or its summary changed (member count or
+    updated_at) since the entry was indexed. Groups without a summary use the mean of their
+    reference items, and groups no longer active are removed.
+    Each entry's weight is the group's member count.
+    """
+    reference_mask = all_items_for_clustering_df["is_reference"].astype(bool).values
+    reference_groups = all_items_for_clustering_df.loc[reference_mask, "existing_group"].astype(float).astype(int).values
+    active_groups = {str(group_id) for group_id in np.unique(reference_groups)}
+
+    dim = embeddings_norm.shape[1]
+    index = load_index(CENTROID_INDEX_NAME, dim) or VectorIndex(dim)
+    index.remove([key for key in index.keys if key not in active_groups])
+    if not active_groups:
+        return index
+
+    summaries = get_group_summaries([int(key) for key in active_groups])
+    reference_embeddings = embeddings_norm[reference_mask]
+    refreshed = 0
+    for key in active_groups:
+        group_id = int(key)
+        summary = summaries.get(group_id)
+        if summary and len(summary["centroid"]) == dim:
+            member_count = int(summary.get("member_count") or 0)
+            updated_at = summary.get("updated_at")
+            if key in index and index.weight(key) == member_count and not (
+                hasattr(updated_at, "timestamp") and updated_at.timestamp() > index.added(key)
+            ):
+                continue
+            index.add([group_id], summary["centroid"], weights=[member_count])
+        else:
+            members = reference_embeddings[reference_groups == group_id]
+            index.add([group_id], members.mean(axis=0), weights=[len(members)])
+        refreshed += 1
+    print(f"ℹ️ Refreshed {refreshed} of {len(active_groups)} groups in the centroid index ({len(summaries)} persisted summaries)")
+
+    # The index only holds what is already in Firestore, items matched this run are
+    # folded in by the next sync once their group has been written
+    save_index(CENTROID_INDEX_NAME, index)
+    return index
+
+def assign_to_existing_groups(df, all_items_for_clustering_df, embeddings_norm) -> tuple:
+    """
+    Assign new items to the nearest existing group centroid when the similarity
+    reaches CENTROID_MATCH_THRESHOLD and the group has room left.
+    Returns tuple of (leftover_items_df, leftover_embeddings_norm) for DBSCAN.
+    """
+    new_mask = ~all_items_for_clustering_df["is_reference"].astype(bool).values
+    index = load_group_centroid_index(all_items_for_clustering_df, embeddings_norm)
+    if len(index) == 0 or not new_mask.any():
+        leftovers_df = all_items_for_clustering_df[new_mask].copy()
+        return leftovers_df, embeddings_norm[new_mask]
+
+    new_positions = np.flatnonzero(new_mask)
+    nearest_groups, nearest_similarities = index.search(embeddings_norm[new_positions], k=1)
+    best_group = [int(keys[0]) for keys in nearest_groups]
+    best_similarity = np.array([sims[0] for sims in nearest_similarities])
+
+    # Most similar items claim the remaining capacity of each group first
+    capacity = {group_id: MAX_GROUP_SIZE - index.weight(group_id) for group_id in set(best_group)}
+    matched = {}
+    matched_positions = []
+    for i in np.argsort(-best_similarity, kind="stable"):
+        if best_similarity[i] < CENTROID_MATCH_THRESHOLD:
+            break
+        group_id = best_group[i]
+        if capacity[group_id] <= 0:
+            continue
+        capacity[group_id] -= 1
+        matched[all_items_for_clustering_df.iloc[new_positions[i]]["id"]] = group_id
+        matched_positions.append(new_positions[i])
+
+    if matched:
+        matched_mask = df["id"].isin(matched.keys())
+        df.loc[matched_mask, "group"] = df.loc[matched_mask, "id"].map(matched)
+
+    leftover_mask = new_mask.copy()
+    leftover_mask[matched_positions] = False
+    print(f"ℹ️ Matched {len(matched)} of {len(new_positions)} new items to {len(set(matched.values()))} existing groups. {leftover_mask.sum()} left for clustering.")
+
+    leftovers_df = all_items_for_clustering_df[leftover_mask].copy()
+    return leftovers_df, embeddings_norm[leftover_mask]
+
 def perform_clustering(all_items_for_clustering_df, embeddings_norm, df, has_reference_news):
     """
     Perform DBSCAN clustering and map results to the original dataframe
@@ -247,8 +349,9 @@ def perform_clustering(all_items_for_clustering_df, embeddings_norm, df, has_ref
             df.loc[df['id'] == row_clustered['id'], 'group'] = row_clustered['group']
         return False
 
-    nbrs = NearestNeighbors(n_neighbors=n_neighbors, metric="cosine").fit(embeddings_norm)
-    dist_matrix_sparse = nbrs.kneighbors_graph(embeddings_norm, n_neighbors=n_neighbors, mode='distance')
+    index = VectorIndex(embeddings_norm.shape[1])
+    index.add(range(embeddings_norm.shape[0]), embeddings_norm)
+    dist_matrix_sparse = index.kneighbors_graph(n_neighbors)
     
     print("ℹ️ Sorting sparse distance graph...")
     dist_matrix_sparse_sorted = sort_graph_by_row_values(dist_matrix_sparse)
@@ -274,7 +377,6 @@ def assign_group_ids(df, has_reference_news):
     Ensures no group exceeds MAX_GROUP_SIZE by subdividing when necessary.
     """
     # Configuration constants
-    MAX_GROUP_SIZE = 25  # Maximum number of news items per group
     MIN_SUBDIVISION_SIZE = 5  # Minimum cluster size needed for subdivision
     SIMILARITY_THRESHOLD = 0.85  # Higher threshold for stricter clustering
     
@@ -285,8 +387,21 @@ def assign_group_ids(df, has_reference_news):
     else:
         df.loc[df['temp_group'] == -1, 'group'] = None
     
-    # Initialize a set to track assigned groups
-    all_group_ids = get_all_group_ids()
+    # Reserve a block of group IDs for this run: one per cluster plus room for a subdivision
+    cluster_count = int((df['temp_group'].dropna().unique() != -1).sum())
+    allocator = GroupIdAllocator(block_size=cluster_count + 5)
+
+    # In incremental mode reference items are matched by centroid and never clustered
+    # (their temp_group is NaN), so only clusters that contain references take the
+    # reference path and need the maintained member counts of their groups
+    clusters_have_references = False
+    group_summaries = {}
+    if has_reference_news:
+        clustered_references = df[df['temp_group'].notna() & (df['temp_group'] != -1) & (df['is_reference'] == True)]
+        clusters_have_references = not clustered_references.empty
+        if clusters_have_references:
+            group_summaries = get_group_summaries(clustered_references['existing_group'].dropna().unique())
+
     # Process each DBSCAN cluster
     for db_cluster_id in df['temp_group'].dropna().unique():
         if db_cluster_id == -1:  # Skip outliers (already handled)
@@ -300,13 +415,13 @@ def assign_group_ids(df, has_reference_news):
             continue
             
         # Process with or without reference news
-        if has_reference_news:
+        if clusters_have_references:
             _process_cluster_with_references(df, cluster_items, db_cluster_id, 
                                             MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, 
-                                            SIMILARITY_THRESHOLD, all_group_ids)
+                                            SIMILARITY_THRESHOLD, allocator, group_summaries)
         else:
             _process_cluster_without_references(df, cluster_items, db_cluster_id, 
-                                              MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, all_group_ids)
+                                              MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, allocator)
 
     # Ensure reference items keep their original groups
     if has_reference_news:
@@ -318,18 +433,18 @@ def assign_group_ids(df, has_reference_news):
 
 def _process_cluster_with_references(df, cluster_items, db_cluster_id, 
                                     MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, 
-                                    SIMILARITY_THRESHOLD, all_group_ids):
+                                    SIMILARITY_THRESHOLD, allocator, group_summaries):
     """Process a cluster that has reference news items."""
     # Find reference items in this cluster
     reference_items = cluster_items[cluster_items['is_reference'] == True]
     
     if reference_items.empty:
         # No reference items - check if subdivision is needed first
-        next_group_id = _get_next_available_group_id(df, all_group_ids)
+        next_group_id = allocator.next_id()
         
         if len(cluster_items) > MAX_GROUP_SIZE and len(cluster_items) > MIN_SUBDIVISION_SIZE:
             # Large enough for subdivision - directly create subgroups
-            _subdivide_group(df, cluster_items, next_group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE)
+            _subdivide_group(df, cluster_items, next_group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, allocator)
             print(f"ℹ️ DBSCAN cluster {db_cluster_id} was subdivided based on new group ID {next_group_id}")
         else:
             # Not large enough for subdivision - assign single group ID
@@ -340,9 +455,14 @@ def _process_cluster_with_references(df, cluster_items, db_cluster_id,
         group_counts = reference_items['existing_group'].value_counts()
         target_group = group_counts.idxmax()  # Most common reference group
         
-        # Get the total count of items in this target group from Firestore
+        # Get the total count of items in this target group from its summary
         # This includes items not in our current dataframe
-        total_items_in_group_from_db = get_group_item_count(target_group)
+        summary = group_summaries.get(int(target_group))
+        if summary:
+            total_items_in_group_from_db = summary["member_count"]
+        else:
+            # Groups without a summary yet: count the reference items we already have
+            total_items_in_group_from_db = int((df['existing_group'] == target_group).sum())
         
         # Count new non-reference items we're going to add
         new_non_reference_items = len(cluster_items[~cluster_items['is_reference']])
@@ -357,14 +477,14 @@ def _process_cluster_with_references(df, cluster_items, db_cluster_id,
             
             # For subdivision, we need to get all existing items in this group
             # We'll handle this in the _subdivide_group function
-            _subdivide_group_with_firestore(df, cluster_items, target_group, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, db_cluster_id)
+            _subdivide_group_with_firestore(df, cluster_items, target_group, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, db_cluster_id, allocator)
         else:
             # Check if we should create a new group based on similarity
             similarity = _calculate_group_similarity(cluster_items)
             
             if similarity < SIMILARITY_THRESHOLD:
                 # Low similarity - create a new group
-                next_group_id = _get_next_available_group_id(df, all_group_ids)
+                next_group_id = allocator.next_id()
                 df.loc[(df['temp_group'] == db_cluster_id) & (df['group'].isna()), 'group'] = next_group_id
                 target_group = next_group_id
                 print(f"ℹ️ Low similarity ({similarity:.3f}) - created new group {next_group_id}")
@@ -372,50 +492,36 @@ def _process_cluster_with_references(df, cluster_items, db_cluster_id,
                 # High similarity - assign to target group
                 df.loc[(df['temp_group'] == db_cluster_id) & (df['group'].isna()), 'group'] = target_group
                 print(f"ℹ️ High similarity ({similarity:.3f}) - assigned to group {target_group}")
-                
-        all_group_ids.add(target_group)
 
 
 def _process_cluster_without_references(df, cluster_items, db_cluster_id, 
-                                       MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, all_group_ids):
+                                       MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, allocator):
     """Process a cluster when there are no reference news items."""
         # Check if we need to subdivide this group
-    next_group_id = _get_next_available_group_id(df, all_group_ids)
+    next_group_id = allocator.next_id()
     if len(cluster_items) > MAX_GROUP_SIZE and len(cluster_items) > MIN_SUBDIVISION_SIZE:
-        _subdivide_group(df, cluster_items, next_group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE)
+        _subdivide_group(df, cluster_items, next_group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, allocator)
     else: 
         df.loc[(df['temp_group'] == db_cluster_id) & (df['group'].isna()), 'group'] = next_group_id
         print(f"ℹ️ Assigned DBSCAN cluster {db_cluster_id} to new group {next_group_id}")
 
-def _get_next_available_group_id(df, all_group_ids):
-    """Calculate the next available group ID, ignoring 7-digit subdivision IDs."""
-    # Get maximum existing group ID from database
-    max_existing_group = 0
-    
-    # Retrieve all group IDs from the database
-    if all_group_ids:
-        # Convert to numeric, ignoring non-numeric values - convert set to list first
-        numeric_ids = pd.to_numeric(pd.Series(list(all_group_ids)), errors='coerce').dropna()
-        
-        if not numeric_ids.empty:
-            # Filter out 7-digit IDs (subdivision IDs)
-            regular_ids = numeric_ids[numeric_ids < 1000000]
-            if not regular_ids.empty:
-                max_existing_group = regular_ids.max()
-    
-    # Also check the current DataFrame for any newly assigned IDs not yet in the database
-    max_assigned_group = 0
-    if 'group' in df.columns and not df['group'].dropna().empty:
-        # Filter to only numeric values and exclude 7-digit IDs
-        numeric_groups = pd.to_numeric(df['group'].dropna(), errors='coerce').dropna()
-        if not numeric_groups.empty:
-            # Filter out 7-digit IDs (subdivision IDs)
-            regular_ids = numeric_groups[numeric_groups < 1000000]
-            if not regular_ids.empty:
-                max_assigned_group = regular_ids.max()
-    
-    # Return next available ID
-    return max(int(max_existing_group), int(max_assigned_group)) + 1
+class GroupIdAllocator:
+    """
+    Hands out new group IDs from blocks reserved atomically in Firestore.
+    A block is reserved lazily on first use and another one when it runs out;
+    IDs left unused at the end of a run are simply skipped.
+    """
+    def __init__(self, block_size):
+        self.block_size = max(1, block_size)
+        self._ids = iter(())
+
+    def next_id(self):
+        """Return the next reserved group ID, reserving a new block if needed."""
+        group_id = next(self._ids, None)
+        if group_id is None:
+            self._ids = iter(reserve_group_ids(self.block_size))
+            group_id = next(self._ids)
+        return group_id
 
 
 def _calculate_group_similarity(items):
@@ -431,18 +537,12 @@ def _calculate_group_similarity(items):
     if len(embeddings) < MIN_VALID_SOURCES:
         return 0.5  # Default middle value
         
-    # Calculate pairwise similarities
-    similarities = []
-    for i in range(len(embeddings)):
-        for j in range(i+1, len(embeddings)):
-            sim = np.dot(embeddings[i], embeddings[j])
-            similarities.append(sim)
-    
-    # Return average similarity
-    return sum(similarities) / len(similarities) if similarities else 0.5
+    # Return average pairwise cosine similarity
+    similarity = mean_pairwise_similarity(normalize_rows(embeddings))
+    return similarity if similarity is not None else 0.5
 
 
-def _subdivide_group(df, items, base_group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE):
+def _subdivide_group(df, items, base_group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, allocator):
     """Subdivide a large group into smaller groups using K-means clustering."""
     try:
         # Extract embeddings
@@ -477,11 +577,8 @@ def _subdivide_group(df, items, base_group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_S
             for item_id, subtopic in zip(items['id'].values, subtopic_labels)
         }
         
-        # Use 7-digit IDs derived from the base_group_id
-        base_id = _generate_base_id(df, base_group_id, num_subgroups)
-        
-        # Evaluate quality of each cluster before assigning group IDs
-        created_groups = _evaluate_cluster_quality(df, items, subtopic_labels, embeddings, item_to_subtopic, base_id)
+        # Evaluate quality of each cluster and assign new group IDs to the good ones
+        created_groups = _evaluate_cluster_quality(df, items, subtopic_labels, embeddings, item_to_subtopic, allocator)
         
         if created_groups:
             min_id = min(created_groups)
@@ -498,7 +595,7 @@ def _subdivide_group(df, items, base_group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_S
         traceback.print_exc()
         # Fall back to not subdividing
 
-def _evaluate_cluster_quality(df, items, subtopic_labels, embeddings, item_to_subtopic, base_id):
+def _evaluate_cluster_quality(df, items, subtopic_labels, embeddings, item_to_subtopic, allocator):
     """
     Evaluate the quality of each cluster and only create groups for good clusters.
     Returns a list of group IDs that were actually created.
@@ -509,39 +606,28 @@ def _evaluate_cluster_quality(df, items, subtopic_labels, embeddings, item_to_su
     # Track created groups
     created_groups = []
     
-    # Count items per cluster
-    unique_subtopics = np.unique(subtopic_labels)
-    print(f"ℹ️ K-means created {len(unique_subtopics)} clusters")
+    # Score every cluster in one pass
+    subtopic_labels = np.asarray(subtopic_labels)
+    stats = cluster_similarity_stats(normalize_rows(embeddings), subtopic_labels)
+    print(f"ℹ️ K-means created {len(stats['labels'])} clusters")
+    item_ids = np.array(list(item_to_subtopic.keys()))
+    item_labels = np.array(list(item_to_subtopic.values()))
     
     # For each cluster, evaluate quality
-    for subtopic in unique_subtopics:
-        # Get embeddings for this cluster
-        cluster_indices = [i for i, label in enumerate(subtopic_labels) if label == subtopic]
-        cluster_embeddings = embeddings[cluster_indices]
-        
+    for subtopic, cluster_size, mean_similarity in zip(stats["labels"], stats["sizes"], stats["mean_similarity"]):
         # Skip clusters that are too small
-        if len(cluster_embeddings) < MIN_CLUSTER_SIZE:
-            print(f"ℹ️ Cluster {subtopic} skipped: too small ({len(cluster_embeddings)} items)")
+        if cluster_size < MIN_CLUSTER_SIZE:
+            print(f"ℹ️ Cluster {subtopic} skipped: too small ({cluster_size} items)")
             continue
         
-        # Calculate average pairwise similarity within cluster
-        similarities = []
-        for i in range(len(cluster_embeddings)):
-            for j in range(i+1, len(cluster_embeddings)):
-                sim = np.dot(cluster_embeddings[i], cluster_embeddings[j])
-                similarities.append(sim)
-        
-        if not similarities:
-            avg_similarity = 0
-        else:
-            avg_similarity = sum(similarities) / len(similarities)
+        avg_similarity = 0 if np.isnan(mean_similarity) else mean_similarity
         
         # Create group only if similarity is above threshold
         if avg_similarity >= SIMILARITY_THRESHOLD:
-            new_group_id = base_id + subtopic
+            new_group_id = allocator.next_id()
             
             # Get IDs of items in this cluster
-            cluster_item_ids = [item_id for item_id, label in item_to_subtopic.items() if label == subtopic]
+            cluster_item_ids = item_ids[item_labels == subtopic].tolist()
             
             # Assign group ID to these items
             df.loc[df['id'].isin(cluster_item_ids), 'group'] = new_group_id
@@ -555,44 +641,7 @@ def _evaluate_cluster_quality(df, items, subtopic_labels, embeddings, item_to_su
     
     return created_groups
 
-def _generate_base_id(df, base_group_id, num_subgroups):
-    """Generate a consistent base ID for subgroups"""
-    base_id = 7777777
-    try:
-        base_group_id_int = int(base_group_id)
-        # Convert to string to get the first digits
-        base_group_str = str(base_group_id_int)
-        
-        # If base_group_id has more than 7 digits already, use it as is
-        if len(base_group_str) >= 7:
-            base_id = base_group_id_int
-        else:
-            # Take the first digits and append zeros to get a 7-digit number
-            # For example: 42 -> 4200000, 123 -> 1230000
-            first_digits = base_group_str
-            zeros_needed = 7 - len(first_digits)
-            base_id = int(first_digits + '0' * zeros_needed)
-    except (ValueError, TypeError):
-        # Fallback if base_group_id can't be converted to int
-        base_id = 7777777
-        print(f"⚠️ Could not derive base_id from {base_group_id}, using default {base_id}")
-    
-    # Check if any existing groups already use IDs in this range
-    target_range_end = base_id + num_subgroups
-    if 'group' in df.columns and not df['group'].dropna().empty:
-        # Convert to numeric, ignoring errors
-        numeric_groups = pd.to_numeric(df['group'].dropna(), errors='coerce').dropna()
-        
-        # Check for conflicts in the range we want to use
-        conflicting_ids = numeric_groups[(numeric_groups >= base_id) & (numeric_groups < target_range_end)]
-        if not conflicting_ids.empty:
-            # If there's a conflict, find a new base_id
-            base_id = max(base_id, int(conflicting_ids.max()) + 1)
-            print(f"⚠️ ID conflict detected. Using new base_id: {base_id}")
-    
-    return base_id
-
-def _subdivide_group_with_firestore(df, new_items, group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, db_cluster_id):
+def _subdivide_group_with_firestore(df, new_items, group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, db_cluster_id, allocator):
     """
     Subdivide a group that includes items from Firestore and items in the current dataframe
     
@@ -603,11 +652,18 @@ def _subdivide_group_with_firestore(df, new_items, group_id, MAX_GROUP_SIZE, MIN
         MAX_GROUP_SIZE: Maximum allowed group size
         MIN_SUBDIVISION_SIZE: Minimum size for subdivision
         db_cluster_id: The ID of the database cluster
+        allocator: GroupIdAllocator used for the new subgroup IDs
     """
     try:
-        # Get existing items from Firestore
-        existing_items = get_group_items(group_id)
-        print(f"ℹ️ Retrieved {len(existing_items)} existing items from group {group_id} in Firestore")
+        # Get existing members from the group summary
+        summary = get_group_summaries([group_id], include_members=True).get(int(group_id), {})
+        batch_ids = set(new_items['id'])
+        existing_items = [
+            {"id": news_id, "embedding": embedding}
+            for news_id, embedding in summary.get("members", {}).items()
+            if news_id not in batch_ids
+        ]
+        print(f"ℹ️ Retrieved {len(existing_items)} existing items from group {group_id} summary")
         
         # Convert to DataFrame with the same structure as our working dataframe
         if existing_items:
@@ -633,7 +689,7 @@ def _subdivide_group_with_firestore(df, new_items, group_id, MAX_GROUP_SIZE, MIN
         
         # Now proceed with subdivision on the combined items
         if len(combined_items) > MIN_SUBDIVISION_SIZE:
-            _subdivide_group(df, combined_items, group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE)
+            _subdivide_group(df, combined_items, group_id, MAX_GROUP_SIZE, MIN_SUBDIVISION_SIZE, allocator)
             print(f"ℹ️ Subdivided group {group_id} with items from Firestore and current batch")
         else:
             # Not enough items for subdivision after all, just assign to the group
@@ -648,105 +704,55 @@ def _subdivide_group_with_firestore(df, new_items, group_id, MAX_GROUP_SIZE, MIN
 
 def process_results(df, has_reference_news=False):
     """
-    Process final results, handling deduplication and edge cases
+    Process final results, handling deduplication and edge cases.
+    Runs as a single sort + groupby pass in linear time:
+    - each group keeps one item per source medium, reference items first,
+    - groups left with fewer than MIN_VALID_SOURCES items and no reference item are ungrouped,
+    - items dropped by the deduplication are emitted afterwards with their current group.
     """
-    result = []
-    processed_ids_for_result = set()
-
-    # Process news by final groups
-    unique_final_groups = df["group"].dropna().unique()
-
-    for group_id in unique_final_groups:
-        group_df = df[df["group"] == group_id]
-        
-        # Handle single news item in group case
-        if len(group_df) == 1 and not group_df.iloc[0]["is_reference"]:
-            item_row = group_df.iloc[0]
-            result_item = {
-                "id": item_row["id"], "group": None, "title": item_row["title"],
-                "scraped_description": item_row["scraped_description"], 
-                "description": item_row.get("description", ""),
-                "source_medium": item_row["source_medium"]
-            }
-            
-            # Include existing_group if present
-            if has_reference_news and "existing_group" in item_row and pd.notna(item_row["existing_group"]):
-                result_item["existing_group"] = item_row["existing_group"]
-                
-            result.append(result_item)
-            processed_ids_for_result.add(item_row["id"])
-            continue
-
-        seen_media_in_group = set()
-        current_group_items_for_result = []
-
-        # Process reference items first
-        reference_items_in_final_group = group_df[group_df["is_reference"] == True]
-        for _, item_row in reference_items_in_final_group.iterrows():
-            if item_row["source_medium"] not in seen_media_in_group:
-                result_item = {
-                    "id": item_row["id"], 
-                    "group": group_id, 
-                    "title": item_row["title"],
-                    "scraped_description": item_row["scraped_description"],
-                    "description": item_row.get("description", ""),
-                    "source_medium": item_row["source_medium"]
-                }
-                
-                # Include existing_group for reference items
-                if has_reference_news and "existing_group" in item_row and pd.notna(item_row["existing_group"]):
-                    result_item["existing_group"] = item_row["existing_group"]
-                    
-                current_group_items_for_result.append(result_item)
-                seen_media_in_group.add(item_row["source_medium"])
-                processed_ids_for_result.add(item_row["id"])
-        
-        # Then non-reference items
-        non_reference_items_in_final_group = group_df[group_df["is_reference"] == False]
-        for _, item_row in non_reference_items_in_final_group.iterrows():
-            if item_row["id"] not in processed_ids_for_result and item_row["source_medium"] not in seen_media_in_group:
-                result_item = {
-                    "id": item_row["id"], 
-                    "group": group_id, 
-                    "title": item_row["title"],
-                    "scraped_description": item_row["scraped_description"],
-                    "description": item_row.get("description", ""),
-                    "source_medium": item_row["source_medium"]
-                }
-                
-                # Track existing_group when available (might be None/NaN)
-                if has_reference_news and "existing_group" in item_row and pd.notna(item_row["existing_group"]):
-                    result_item["existing_group"] = item_row["existing_group"]
-                    
-                current_group_items_for_result.append(result_item)
-                seen_media_in_group.add(item_row["source_medium"])
-                processed_ids_for_result.add(item_row["id"])
-
-        # Handle groups with fewer than 2 items after deduplication
-        if len(current_group_items_for_result) < MIN_VALID_SOURCES and not any(item['id'] in reference_items_in_final_group['id'].values for item in current_group_items_for_result):
-            for item_dict in current_group_items_for_result:
-                item_dict["group"] = None
-                result.append(item_dict)
-        else:
-            result.extend(current_group_items_for_result)
-
-    # Add any remaining ungrouped items
-    for index, row in df.iterrows():
-        if row["id"] not in processed_ids_for_result:
-            result_item = {
-                "id": row["id"], 
-                "group": row["group"],
-                "title": row["title"], 
-                "scraped_description": row["scraped_description"],
-                "description": row.get("description", ""),
-                "source_medium": row["source_medium"]
-            }
-            
-            # Include existing_group if present
-            if has_reference_news and "existing_group" in row and pd.notna(row["existing_group"]):
-                result_item["existing_group"] = row["existing_group"]
-                
-            result.append(result_item)
+    result_columns = ["id", "group", "title", "scraped_description", "description", "source_medium"]
+    columns = [column for column in result_columns if column in df.columns]
+    include_existing_group = has_reference_news and "existing_group" in df.columns
+    if include_existing_group:
+        columns.append("existing_group")
+
+    # Group codes in order of first appearance (-1 for ungrouped items)
+    codes, group_values = pd.factorize(df["group"].values)
+    is_reference = (df["is_reference"] == True).values
+    positions = np.flatnonzero(codes >= 0)
+
+    # Sort by group, reference items before the rest, then original order
+    positions = positions[np.lexsort((positions, ~is_reference[positions], codes[positions]))]
+
+    # Keep the first item of each medium within each group
+    duplicated_medium = pd.DataFrame({
+        "group": codes[positions],
+        "source_medium": df["source_medium"].values[positions],
+    }).duplicated().values
+    kept_positions = positions[~duplicated_medium]
+    kept_codes = codes[kept_positions]
+
+    # Groups that end up too small and have no reference item are dissolved
+    kept_counts = np.bincount(kept_codes, minlength=len(group_values))
+    has_reference = np.zeros(len(group_values), dtype=bool)
+    has_reference[codes[is_reference & (codes >= 0)]] = True
+    dissolved = (kept_counts < MIN_VALID_SOURCES) & ~has_reference
+
+    kept_records = df.iloc[kept_positions][columns].to_dict("records")
+    for record, code in zip(kept_records, kept_codes):
+        record["group"] = None if dissolved[code] else group_values[code]
+
+    # Add any remaining items (ungrouped or deduplicated) with their current group
+    remaining_mask = np.ones(len(df), dtype=bool)
+    remaining_mask[kept_positions] = False
+    remaining_records = df.iloc[np.flatnonzero(remaining_mask)][columns].to_dict("records")
+
+    result = kept_records + remaining_records
+    for record in result:
+        if "description" not in record:
+            record["description"] = ""
+        if include_existing_group and pd.isna(record["existing_group"]):
+            del record["existing_group"]
     
     # Final check for all items having None as group
     all_groups_are_none = all(r.get("group") is None for r in result)
@@ -756,6 +762,7 @@ def process_results(df, has_reference_news=False):
             item_dict["group"] = i
 
     return result
+
 def extract_titles_and_descriptions(df_embeddings):
     titles = df_embeddings["title"].fillna("")
             
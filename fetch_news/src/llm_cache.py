@@ -0,0 +1,101 @@
+import re
+import copy
+import hashlib
+import traceback
+from threading import Lock
+from datetime import datetime
+from .config import initialize_firebase
+
+LLM_CACHE_COLLECTION = 'llm_response_cache'  # {model, result, total_tokens, created_at}
+
+def normalize_prompt(text):
+    """Collapse whitespace so formatting differences do not change the key"""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache of parsed LLM responses.
+
+    The key is a SHA-256 of the model, the system prompt and the normalized sources
+    text, so the same set of sources sent again (after a failed store, a retry, or a
+    group going back to an earlier membership) is answered from Firestore instead of
+    paying the latency and tokens of a new completion. Entries are removed by the
+    cleanup job with the rest of the documents past retention.
+
+    Lookups that hit are also kept in memory for the rest of the run. The
+    counters are shared by the concurrent groups, so they are guarded by a lock.
+    """
+
+    def __init__(self, collection_name=LLM_CACHE_COLLECTION):
+        self.collection_name = collection_name
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self.lock = Lock()
+
+    @staticmethod
+    def key(model, system_message, user_message):
+        content = "\x1f".join([model, normalize_prompt(system_message), normalize_prompt(user_message)])
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Returns:
+            dict: The parsed JSON result, or None on a miss
+        """
+        with self.lock:
+            entry = self.memory.get(key)
+        if entry is None:
+            try:
+                doc = initialize_firebase().collection(self.collection_name).document(key).get()
+                entry = doc.to_dict() if doc.exists else None
+            except Exception as e:
+                # The cache is an optimization, a failed lookup is a miss
+                print(f"⚠️ Could not read LLM cache entry {key[:12]}: {str(e)}")
+                entry = None
+
+        with self.lock:
+            if entry is None or not isinstance(entry.get("result"), dict):
+                self.misses += 1
+                return None
+            self.memory[key] = entry
+            self.hits += 1
+            self.tokens_saved += entry.get("total_tokens") or 0
+        # Callers modify the result (e.g. unassigned sources), never the cached copy
+        return copy.deepcopy(entry["result"])
+
+    def put(self, key, model, result, total_tokens=None):
+        """Store a parsed result"""
+        entry = {
+            "model": model,
+            "result": result,
+            "total_tokens": total_tokens,
+            "created_at": datetime.now(),
+        }
+        try:
+            initialize_firebase().collection(self.collection_name).document(key).set(entry)
+        except Exception as e:
+            print(f"⚠️ Could not store LLM cache entry {key[:12]}: {str(e)}")
+            traceback.print_exc()
+
+    def reset_stats(self):
+        """Start the counters of a new run, the persisted entries are kept"""
+        with self.lock:
+            self.memory.clear()
+            self.hits = 0
+            self.misses = 0
+            self.tokens_saved = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        """Print how many completions the cache saved"""
+        print(f"📊 LLM response cache: {self.hits} hits, {self.misses} misses "
+              f"({self.hit_rate():.1%} hit rate), {self.tokens_saved} tokens saved")
+
+response_cache = ResponseCache()
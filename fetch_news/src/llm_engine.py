@@ -0,0 +1,221 @@
+import asyncio
+import os
+import time
+from .rate_limiter import api_rate_limiter, estimate_tokens, EXPECTED_COMPLETION_TOKENS
+
+MODEL = "gpt-4o-mini"
+INITIAL_CONCURRENCY = 10  # OpenAI requests in flight at the start of a run
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 25  # Upper bound of the adaptive concurrency and size of the connection pool
+DECREASE_FACTOR = 0.5  # Concurrency kept after an overload signal
+LATENCY_TOLERANCE = 2.0  # Latency above this multiple of the baseline stops the increase
+REQUEST_TIMEOUT = 60.0  # Seconds before a single completion request is abandoned
+CONNECT_TIMEOUT = 10.0
+
+def create_async_openai_client(max_concurrency=MAX_CONCURRENCY, request_timeout=REQUEST_TIMEOUT):
+    """
+    AsyncOpenAI client with a keep-alive connection pool sized for max_concurrency.
+    Retries are disabled in the client, call_openai_api handles them.
+    """
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    import httpx
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        print("ERROR: OPENAI_API_KEY environment variable not set.")
+        raise ValueError("OpenAI API Key not configured.")
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        timeout=httpx.Timeout(request_timeout, connect=CONNECT_TIMEOUT),
+    )
+    return AsyncOpenAI(api_key=api_key.strip(), http_client=http_client, max_retries=0)
+
+def is_overload(error):
+    """429, 5xx, timeouts and dropped connections mean the provider is saturated"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return (isinstance(error, (asyncio.TimeoutError, ConnectionError))
+            or type(error).__name__ in ("APITimeoutError", "APIConnectionError"))
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on the requests in flight, like TCP congestion control.
+
+    Every healthy response adds 1/limit, so the limit grows by about one request per
+    round of requests while latency stays within latency_tolerance times the baseline
+    (the fastest recent latency). An overload signal (429, 5xx, timeout) multiplies
+    the limit by decrease_factor. Only the first overload of a round counts: requests
+    started before the last decrease were sent at the old limit.
+
+    The concurrency therefore settles just below what the current provider quota
+    allows, without configuring it per account.
+    """
+
+    def __init__(self, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY,
+                 decrease_factor=DECREASE_FACTOR, latency_tolerance=LATENCY_TOLERANCE):
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+        self.latency_baseline = None
+        self.last_decrease = 0.0
+        self.increases = 0
+        self.decreases = 0
+        self.lowest = self.limit
+        self.highest = self.limit
+
+    async def acquire(self):
+        """
+        Wait for a slot under the current limit.
+
+        Returns:
+            float: Start time to pass to release()
+        """
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started, outcome):
+        """
+        Free a slot and adapt the limit.
+
+        Args:
+            started: Value returned by acquire()
+            outcome: "success", "overload" or "error" (errors unrelated to load leave the limit as is)
+        """
+        now = time.monotonic()
+        latency = now - started
+        async with self.condition:
+            self.in_flight -= 1
+            if outcome == "overload" and started >= self.last_decrease:
+                self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+                self.last_decrease = now
+                self.decreases += 1
+                print(f"📉 Overload signal, concurrency cut to {int(self.limit)}")
+            elif outcome == "success":
+                if self.latency_baseline is None or latency < self.latency_baseline:
+                    self.latency_baseline = latency
+                else:
+                    # Let the baseline drift up slowly when the fastest latency is no longer reachable
+                    self.latency_baseline += 0.05 * (latency - self.latency_baseline)
+                if latency <= self.latency_baseline * self.latency_tolerance and self.limit < self.maximum:
+                    self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+                    self.increases += 1
+            self.lowest = min(self.lowest, self.limit)
+            self.highest = max(self.highest, self.limit)
+            self.condition.notify_all()
+
+class NeutralizationEngine:
+    """
+    Runs the OpenAI calls of a neutralization run on one event loop.
+
+    A single AsyncOpenAI client is shared by every group, so HTTPS connections are
+    kept alive and reused instead of opening a new client per group. All groups can
+    be started at once: an AdaptiveConcurrency limit decides how many requests are
+    in flight, between 1 and max_concurrency. Each request has its own timeout.
+
+    Before a request is sent, its estimated tokens are reserved in the rate limiter;
+    afterwards the reservation is reconciled with the usage and the x-ratelimit-*
+    headers of the response.
+
+    The client is created inside the running event loop and closed on exit. Any
+    object with the AsyncOpenAI chat.completions interface can be passed as client,
+    e.g. a stub in tests or in the local pipeline runner.
+
+    Usage:
+        async with NeutralizationEngine() as engine:
+            response = await engine.complete(system_message, user_message)
+    """
+
+    def __init__(self, client=None, max_concurrency=MAX_CONCURRENCY, request_timeout=REQUEST_TIMEOUT, model=MODEL,
+                 limiter=None, initial_concurrency=INITIAL_CONCURRENCY):
+        self.client = client
+        self.limiter = limiter or api_rate_limiter
+        self.owns_client = client is None
+        self.max_concurrency = max_concurrency
+        self.initial_concurrency = initial_concurrency
+        self.request_timeout = request_timeout
+        self.model = model
+        self.concurrency = None
+        self.requests = 0
+        self.request_seconds = 0.0
+
+    async def __aenter__(self):
+        if self.client is None:
+            self.client = create_async_openai_client(self.max_concurrency, self.request_timeout)
+        self.concurrency = AdaptiveConcurrency(initial=self.initial_concurrency, maximum=self.max_concurrency)
+        self.limiter.reset_stats()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        if self.owns_client and self.client is not None:
+            await self.client.close()
+        return False
+
+    async def complete(self, system_message, user_message):
+        """
+        Send one chat completion request returning a JSON object.
+
+        Raises:
+            The client's errors, or asyncio.TimeoutError when request_timeout is exceeded
+        """
+        # Wait for rate limit capacity before taking a concurrency slot
+        estimated_tokens = estimate_tokens(system_message) + estimate_tokens(user_message) + EXPECTED_COMPLETION_TOKENS
+        reservation = await self.limiter.acquire(estimated_tokens)
+        started = await self.concurrency.acquire()
+        self.requests += 1
+        outcome = "error"
+        try:
+            response, headers = await asyncio.wait_for(
+                self._create(system_message, user_message),
+                # Also bounds clients that ignore the timeout argument, like stubs
+                timeout=self.request_timeout,
+            )
+            outcome = "success"
+        except Exception as e:
+            if is_overload(e):
+                outcome = "overload"
+            if getattr(e, "status_code", None) == 429:
+                self.limiter.penalize(getattr(getattr(e, "response", None), "headers", None))
+            raise
+        finally:
+            self.request_seconds += time.monotonic() - started
+            await self.concurrency.release(started, outcome)
+        usage = getattr(response, "usage", None)
+        self.limiter.reconcile(reservation, getattr(usage, "total_tokens", None), headers)
+        return response
+
+    async def _create(self, system_message, user_message):
+        """Send the request, with its headers when the client exposes raw responses"""
+        completions = self.client.chat.completions
+        request = dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_message}
+            ],
+            temperature=0.3,
+            response_format={"type": "json_object"},
+            timeout=self.request_timeout,
+        )
+        raw_completions = getattr(completions, "with_raw_response", None)
+        if raw_completions is None:
+            return await completions.create(**request), None
+        raw = await raw_completions.create(**request)
+        return raw.parse(), raw.headers
+
+    def report(self, elapsed):
+        """Print the throughput of the run"""
+        rate = self.requests / elapsed * 60 if elapsed > 0 else 0
+        average = self.request_seconds / self.requests if self.requests else 0
+        concurrency = self.concurrency
+        print(f"ℹ️ {self.requests} OpenAI requests in {elapsed:.2f}s ({rate:.1f}/min, {average:.2f}s average latency), "
+              f"concurrency {int(concurrency.limit)} at the end ({int(concurrency.lowest)}-{int(concurrency.highest)}, "
+              f"{concurrency.increases} increases, {concurrency.decreases} decreases)")
+        self.limiter.report()
@@ -0,0 +1,485 @@
+"""
+Local storage backends with the subset of the Firestore client API the pipeline uses,
+so fetch_news_task can run end to end without a Firestore project:
+
+- InMemoryFirestore keeps every document in memory.
+- SQLiteFirestore persists documents as JSON in a SQLite file, so realistic data
+  volumes can be loaded once and reused across runs.
+
+Both count document reads, writes, deletes and queries, like Firestore bills them.
+Select a backend with STORAGE_BACKEND=memory or STORAGE_BACKEND=sqlite
+(SQLITE_STORAGE_PATH sets the database file). See initialize_firebase in config.py.
+"""
+import os
+import json
+import copy
+import base64
+import sqlite3
+import operator
+from datetime import datetime, timezone
+from threading import RLock
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+    "not-in": lambda value, options: value not in options,
+    "array-contains": lambda value, item: isinstance(value, list) and item in value,
+}
+
+class OperationCounter:
+    """Counts the document operations of a backend"""
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.queries = 0
+        self.lock = RLock()
+
+    def add(self, reads=0, writes=0, deletes=0, queries=0):
+        with self.lock:
+            self.reads += reads
+            self.writes += writes
+            self.deletes += deletes
+            self.queries += queries
+
+    def reset(self):
+        with self.lock:
+            self.reads = self.writes = self.deletes = self.queries = 0
+
+    def as_dict(self):
+        return {"reads": self.reads, "writes": self.writes, "deletes": self.deletes, "queries": self.queries}
+
+    def __repr__(self):
+        return f"OperationCounter(reads={self.reads}, writes={self.writes}, deletes={self.deletes}, queries={self.queries})"
+
+def _comparable(value):
+    # Firestore orders and compares timestamps regardless of timezone awareness
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _matches(data, filters):
+    for field, op, value in filters:
+        if field not in data:
+            return False
+        try:
+            if not OPERATORS[op](_comparable(data[field]), _comparable(value)):
+                return False
+        except TypeError:
+            return False
+    return True
+
+def _project(data, fields):
+    if fields is None:
+        return copy.deepcopy(data)
+    return {field: copy.deepcopy(data[field]) for field in fields if field in data}
+
+class LocalDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+class LocalDocumentReference:
+    def __init__(self, db, collection_name, doc_id):
+        self._db = db
+        self.collection_name = collection_name
+        self.id = str(doc_id)
+        self.path = f"{collection_name}/{self.id}"
+
+    def get(self, transaction=None, field_paths=None):
+        data = self._db._read(self.collection_name, self.id)
+        return LocalDocumentSnapshot(self, _project(data, field_paths) if data is not None else None)
+
+    def set(self, data, merge=False):
+        self._db._write(self.collection_name, self.id, data, merge=merge)
+
+    def update(self, data):
+        self._db._update(self.collection_name, self.id, data)
+
+    def delete(self):
+        self._db._delete(self.collection_name, self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, LocalDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+def _descending(direction):
+    return str(direction).upper().startswith("DESC")
+
+class LocalQuery:
+    def __init__(self, db, collection_name, filters=(), fields=None, orders=(), limit_count=None, cursor=None):
+        self._db = db
+        self.collection_name = collection_name
+        self.filters = list(filters)
+        self.fields = fields
+        self.orders = list(orders)
+        self.limit_count = limit_count
+        self.cursor = cursor
+
+    def _copy(self, **changes):
+        values = {
+            "filters": self.filters, "fields": self.fields, "orders": self.orders,
+            "limit_count": self.limit_count, "cursor": self.cursor,
+        }
+        values.update(changes)
+        return LocalQuery(self._db, self.collection_name, **values)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self.filters + [(field, op, value)])
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self.orders + [(field, direction)])
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def start_after(self, snapshot):
+        return self._copy(cursor=snapshot)
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            import uuid
+            doc_id = uuid.uuid4().hex
+        return LocalDocumentReference(self._db, self.collection_name, doc_id)
+
+    def _sort_key(self, field):
+        def key(item):
+            doc_id, data = item
+            value = doc_id if field == "__name__" else data.get(field)
+            return (value is None, _comparable(value) if value is not None else 0)
+        return key
+
+    def _orders(self):
+        # Like Firestore, results are ordered by document ID after the explicit orders
+        orders = list(self.orders)
+        if not any(field == "__name__" for field, _ in orders):
+            orders.append(("__name__", orders[-1][1] if orders else "ASCENDING"))
+        return orders
+
+    def _after_cursor(self, orders, doc_id, data):
+        """Whether a document sorts strictly after the cursor. Cursors are value-based, the cursor document may be gone."""
+        cursor_data = self.cursor.to_dict() or {}
+        for field, direction in orders:
+            if field == "__name__":
+                value, cursor_value = doc_id, self.cursor.id
+            else:
+                value, cursor_value = _comparable(data.get(field)), _comparable(cursor_data.get(field))
+            if value == cursor_value:
+                continue
+            try:
+                return value < cursor_value if _descending(direction) else value > cursor_value
+            except TypeError:
+                return False
+        return False
+
+    def stream(self, transaction=None):
+        items = [(doc_id, data) for doc_id, data in self._db._scan(self.collection_name) if _matches(data, self.filters)]
+        orders = self._orders()
+        for field, direction in reversed(orders):
+            if field != "__name__":
+                items = [item for item in items if field in item[1]]
+            items.sort(key=self._sort_key(field), reverse=_descending(direction))
+        if self.cursor is not None:
+            items = [(doc_id, data) for doc_id, data in items if self._after_cursor(orders, doc_id, data)]
+        if self.limit_count is not None:
+            items = items[:self.limit_count]
+
+        self._db.counter.add(reads=max(1, len(items)), queries=1)
+        for doc_id, data in items:
+            yield LocalDocumentSnapshot(LocalDocumentReference(self._db, self.collection_name, doc_id), _project(data, self.fields))
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+class LocalWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self.operations = []
+
+    def set(self, ref, data, merge=False):
+        self.operations.append(("set", ref, data, merge))
+
+    def update(self, ref, data):
+        self.operations.append(("update", ref, data, False))
+
+    def delete(self, ref):
+        self.operations.append(("delete", ref, None, False))
+
+    def commit(self):
+        with self._db.lock:
+            # Validate first so a failing update leaves the batch unapplied, like Firestore
+            for kind, ref, _, _ in self.operations:
+                if kind == "update" and self._db._read(ref.collection_name, ref.id, count=False) is None:
+                    raise KeyError(f"No document to update: {ref.path}")
+            for kind, ref, data, merge in self.operations:
+                if kind == "set":
+                    ref.set(data, merge=merge)
+                elif kind == "update":
+                    ref.update(data)
+                else:
+                    ref.delete()
+        return []
+
+class LocalTransaction(LocalWriteBatch):
+    """Writes are buffered and applied at the end; the backend lock makes the transaction serial"""
+
+class LocalFirestore:
+    """Base class of the local backends. Subclasses implement the document store primitives."""
+
+    def __init__(self):
+        self.counter = OperationCounter()
+        self.lock = RLock()
+
+    # Firestore client API
+    def collection(self, name):
+        return LocalQuery(self, name)
+
+    def document(self, path):
+        collection_name, doc_id = path.split("/", 1)
+        return LocalDocumentReference(self, collection_name, doc_id)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        for ref in references:
+            yield ref.get(field_paths=field_paths)
+
+    def batch(self):
+        return LocalWriteBatch(self)
+
+    def transaction(self):
+        return LocalTransaction(self)
+
+    def run_in_transaction(self, operation):
+        """Run operation(transaction) atomically. Stands in for @firestore.transactional."""
+        with self.lock:
+            transaction = self.transaction()
+            result = operation(transaction)
+            transaction.commit()
+            return result
+
+    # Document operations shared by the subclasses
+    def _read(self, collection_name, doc_id, count=True):
+        if count:
+            self.counter.add(reads=1)
+        return self._load(collection_name, doc_id)
+
+    def _write(self, collection_name, doc_id, data, merge=False):
+        with self.lock:
+            existing = self._load(collection_name, doc_id) if merge else None
+            document = copy.deepcopy(existing) if existing else {}
+            document.update(copy.deepcopy(data))
+            self._store(collection_name, doc_id, document)
+            self.counter.add(writes=1)
+
+    def _update(self, collection_name, doc_id, data):
+        with self.lock:
+            existing = self._load(collection_name, doc_id)
+            if existing is None:
+                raise KeyError(f"No document to update: {collection_name}/{doc_id}")
+            document = copy.deepcopy(existing)
+            for field, value in data.items():
+                # Dotted paths update nested map fields
+                target = document
+                parts = field.split(".")
+                for part in parts[:-1]:
+                    target = target.setdefault(part, {})
+                target[parts[-1]] = copy.deepcopy(value)
+            self._store(collection_name, doc_id, document)
+            self.counter.add(writes=1)
+
+    def _delete(self, collection_name, doc_id):
+        with self.lock:
+            self._remove(collection_name, doc_id)
+            self.counter.add(deletes=1)
+
+    def count_documents(self, collection_name):
+        """Number of documents in a collection, without counting reads"""
+        return sum(1 for _ in self._scan(collection_name))
+
+    # Primitives implemented by the subclasses
+    def _load(self, collection_name, doc_id):
+        raise NotImplementedError
+
+    def _store(self, collection_name, doc_id, document):
+        raise NotImplementedError
+
+    def _remove(self, collection_name, doc_id):
+        raise NotImplementedError
+
+    def _scan(self, collection_name):
+        raise NotImplementedError
+
+class InMemoryFirestore(LocalFirestore):
+    """Local backend keeping every document in memory"""
+
+    def __init__(self, data=None):
+        super().__init__()
+        self.data = {
+            collection_name: {str(doc_id): copy.deepcopy(document) for doc_id, document in documents.items()}
+            for collection_name, documents in (data or {}).items()
+        }
+
+    def _load(self, collection_name, doc_id):
+        return self.data.get(collection_name, {}).get(str(doc_id))
+
+    def _store(self, collection_name, doc_id, document):
+        self.data.setdefault(collection_name, {})[str(doc_id)] = document
+
+    def _remove(self, collection_name, doc_id):
+        self.data.get(collection_name, {}).pop(str(doc_id), None)
+
+    def _scan(self, collection_name):
+        with self.lock:
+            return list(self.data.get(collection_name, {}).items())
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, dict):
+        return {str(key): _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if hasattr(value, "tolist"):  # numpy arrays and scalars
+        return value.tolist()
+    return value
+
+def _decode(value):
+    if isinstance(value, dict):
+        if "__datetime__" in value and len(value) == 1:
+            return datetime.fromisoformat(value["__datetime__"])
+        if "__bytes__" in value and len(value) == 1:
+            return base64.b64decode(value["__bytes__"])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+class SQLiteFirestore(LocalFirestore):
+    """Local backend persisting documents as JSON rows in a SQLite database"""
+
+    def __init__(self, path=":memory:"):
+        super().__init__()
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "collection TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, "
+            "PRIMARY KEY (collection, id))"
+        )
+        self.connection.commit()
+
+    def _load(self, collection_name, doc_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM documents WHERE collection = ? AND id = ?", (collection_name, str(doc_id))
+            ).fetchone()
+        return _decode(json.loads(row[0])) if row else None
+
+    def _store(self, collection_name, doc_id, document):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)",
+                (collection_name, str(doc_id), json.dumps(_encode(document))),
+            )
+            self.connection.commit()
+
+    def _remove(self, collection_name, doc_id):
+        with self.lock:
+            self.connection.execute("DELETE FROM documents WHERE collection = ? AND id = ?", (collection_name, str(doc_id)))
+            self.connection.commit()
+
+    def _scan(self, collection_name):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, data FROM documents WHERE collection = ? ORDER BY id", (collection_name,)
+            ).fetchall()
+        return [(doc_id, _decode(json.loads(data))) for doc_id, data in rows]
+
+class AsyncLocalFirestore:
+    """AsyncClient-style view over a local backend, for AsyncStorage"""
+
+    def __init__(self, db):
+        self.db = db
+        self.counter = db.counter
+
+    def collection(self, name):
+        return _AsyncLocalQuery(self.db.collection(name))
+
+    async def get_all(self, references, field_paths=None, transaction=None):
+        for snapshot in self.db.get_all([ref._ref if isinstance(ref, _AsyncLocalReference) else ref for ref in references], field_paths=field_paths):
+            yield snapshot
+
+class _AsyncLocalReference:
+    def __init__(self, ref):
+        self._ref = ref
+        self.id = ref.id
+        self.path = ref.path
+
+class _AsyncLocalQuery:
+    def __init__(self, query):
+        self._query = query
+
+    def where(self, field, op, value):
+        return _AsyncLocalQuery(self._query.where(field, op, value))
+
+    def select(self, fields):
+        return _AsyncLocalQuery(self._query.select(fields))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return _AsyncLocalQuery(self._query.order_by(field, direction))
+
+    def limit(self, count):
+        return _AsyncLocalQuery(self._query.limit(count))
+
+    def document(self, doc_id):
+        return _AsyncLocalReference(self._query.document(doc_id))
+
+    async def stream(self):
+        for snapshot in self._query.stream():
+            yield snapshot
+
+_local_backend = None
+
+def get_local_backend(kind=None):
+    """
+    Return the process-wide local backend, creating it on first use.
+
+    Args:
+        kind: "memory" or "sqlite" (defaults to the STORAGE_BACKEND environment variable)
+    """
+    global _local_backend
+    if _local_backend is None:
+        kind = (kind or os.getenv("STORAGE_BACKEND", "memory")).lower()
+        if kind == "sqlite":
+            _local_backend = SQLiteFirestore(os.getenv("SQLITE_STORAGE_PATH", "neutral_news_local.db"))
+        elif kind == "memory":
+            _local_backend = InMemoryFirestore()
+        else:
+            raise ValueError(f"Unknown local storage backend: {kind}")
+        print(f"ℹ️ Using local '{kind}' storage backend")
+    return _local_backend
+
+def set_local_backend(backend):
+    """Use a specific local backend instance, e.g. one pre-loaded with test data"""
+    global _local_backend
+    _local_backend = backend
@@ -1,98 +1,54 @@
-from openai import OpenAI
-import os, json
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import asyncio
 import time
-from threading import Lock
-import queue
 import datetime
 
-from src.storage import store_neutral_news, update_news_with_neutral_scores, update_existing_neutral_news
+from src.storage import store_neutral_news, update_news_with_neutral_scores, update_existing_neutral_news, remove_group_members, prefetch_neutralization_state, news_cache, embedding_cache
 from .config import initialize_firebase
-from google.cloud import firestore
+from .llm_engine import NeutralizationEngine
+from .llm_cache import response_cache
+from .prompt_builder import build_sources_text, SOURCES_TOKEN_BUDGET
 MIN_VALID_SOURCES = 3  # Minimum number of valid sources required
 
-# Rate limiter class to manage API call rate limiting
-class RateLimiter:
-    def __init__(self, calls_per_minute=500):
-        self.calls_per_minute = calls_per_minute
-        self.call_count = 0
-        self.call_time = time.time()
-        self.lock = Lock()
-        self.rate_limited_queue = queue.Queue()
-        self.global_cooldown = False
-        self.cooldown_until = 0
-    
-    def check_limit(self, group_id="unknown"):
-        """Check if we're over the rate limit and handle accordingly"""
-        with self.lock:
-            current_time = time.time()
-            
-            # If we're in global cooldown, sleep until cooldown period ends
-            if self.global_cooldown and current_time < self.cooldown_until:
-                sleep_time = self.cooldown_until - current_time
-                print(f"🛑 Global cooldown active: sleeping for {sleep_time:.2f}s before processing group {group_id}")
-                time.sleep(sleep_time)
-                self.global_cooldown = False
-                self.call_count = 0
-                self.call_time = time.time()
-                return True
-                
-            elapsed = current_time - self.call_time
-            
-            # Reset counter after 60 seconds
-            if elapsed > 60:
-                self.call_count = 0
-                self.call_time = current_time
-                
-            # If we've made too many calls in the last minute, sleep
-            if self.call_count >= self.calls_per_minute:
-                sleep_time = max(0, 60 - elapsed)
-                print(f"⏳ Rate limiting: sleeping for {sleep_time:.2f}s before processing group {group_id}")
-                time.sleep(sleep_time)
-                self.call_count = 0
-                self.call_time = time.time()
-                
-            self.call_count += 1
-            return False
-
-    def force_cooldown(self, minutes=1):
-        """Force a cooldown period after hitting an API limit"""
-        with self.lock:
-            self.global_cooldown = True
-            self.cooldown_until = time.time() + (minutes * 60)
-            print(f"⛔ Enforcing global cooldown for {minutes} minute(s) until {time.strftime('%H:%M:%S', time.localtime(self.cooldown_until))}")
-    
-    def queue_rate_limited_group(self, group_info):
-        """Add a rate-limited group to the queue for later processing"""
-        self.rate_limited_queue.put(group_info)
-        group_id = group_info.get('group', 'unknown')
-        print(f"📋 Added group {group_id} to rate-limited queue for later processing")
-    
-    def has_rate_limited_groups(self):
-        """Check if there are any rate-limited groups to process"""
-        return not self.rate_limited_queue.empty()
-    
-    def get_rate_limited_group(self):
-        """Get the next rate-limited group to process"""
-        if not self.rate_limited_queue.empty():
-            return self.rate_limited_queue.get()
-        return None
+# neutral_news documents of the groups in the current run, loaded once by neutralize_and_more
+# and shared with the workers. Maps group ID to document data.
+neutral_news_snapshots = {}
+
+def get_neutral_news_snapshot(group_id):
+    """
+    Return the neutral_news data of a group loaded at the start of the run.
+    Falls back to a direct read for groups that were not part of the batch read.
+    """
+    group_id = int(float(group_id))
+    if group_id in neutral_news_snapshots:
+        return neutral_news_snapshots[group_id]
 
-# Create a single instance of the rate limiter
-api_rate_limiter = RateLimiter()
+    db = initialize_firebase()
+    neutral_doc = db.collection('neutral_news').document(str(group_id)).get()
+    return neutral_doc.to_dict() if neutral_doc.exists else None
 
 def neutralize_and_more(groups_prepared):
     """
     Coordina el proceso de neutralización de grupos de noticias y actualiza Firestore.
-    Procesa los grupos en paralelo usando ThreadPoolExecutor para optimizar el rendimiento.
+    Procesa los grupos de forma concurrente en un bucle asyncio con un único cliente de
+    OpenAI (ver llm_engine.py); cada resultado se guarda en cuanto llega.
     """
     if not groups_prepared:
         print("No news groups to neutralize")
         return 0
     
-    db = initialize_firebase()
-    
     try:
+        # Read the neutral_news documents of every candidate group and the news of their
+        # sources concurrently, before any worker starts
+        group_ids = [int(float(group['group'])) for group in groups_prepared if group.get('group') is not None]
+        source_ids = [source.get('id') for group in groups_prepared for source in group.get('sources', []) if source.get('id')]
+        news_cache.clear()
+        embedding_cache.clear()
+        response_cache.reset_stats()
+        neutral_news_snapshots.clear()
+        neutral_news_snapshots.update({group_id: None for group_id in group_ids})
+        neutral_news_snapshots.update(prefetch_neutralization_state(group_ids, source_ids))
+        
         groups_to_neutralize = []
         groups_to_update = []
         
@@ -119,16 +75,13 @@ def neutralize_and_more(groups_prepared):
             current_source_ids.sort()  # Ordenar para comparación consistente
             
             # Verificar si ya existe una neutralización para este grupo
-            neutral_doc_ref = db.collection('neutral_news').document(str(group_number))
-            neutral_doc = neutral_doc_ref.get()
+            existing_data = neutral_news_snapshots.get(group_number)
             
-            if neutral_doc.exists:
+            if existing_data is not None:
                 # El grupo ya tiene una neutralización, verificar si ha cambiado
-                existing_data = neutral_doc.to_dict()
-                existing_source_ids = existing_data.get('source_ids', [])
+                existing_source_ids = sorted(existing_data.get('source_ids', []))
                 
                 if existing_source_ids:
-                    existing_source_ids.sort()  # Ordenar para comparación consistente
                     
                     # Si los IDs son iguales, no es necesario volver a neutralizar
                     if current_source_ids == existing_source_ids:
@@ -174,30 +127,27 @@ def neutralize_and_more(groups_prepared):
         print(f"Groups changed and will be updated: {changed_group_count}. IDs: {changed_group_ids}")
         print(f"Groups to neutralize: {len(sorted_groups_to_neutralize)}. IDs: {to_neutralize_ids}")
         
-        # More conservative initial worker count to prevent immediate rate limiting
-        INITIAL_WORKERS = 10  # Start with fewer workers
-        MAX_WORKERS = 25      # Maximum number of workers (reduced from 50)
-        
         skipped_update_count = 0
         skipped_update_groups = []
         
         rate_limited_count = 0
         rate_limited_groups = []
+        rate_limited_queue = []  # group_info of the groups to retry
 
-        # Define a function to process a single group (either update or neutralize)
-        def process_group(group_info, is_update=False):
+        # Define a coroutine to process a single group (either update or neutralize)
+        async def process_group(engine, group_info, is_update=False):
             try:
                 group = group_info.get('group')
                 sources = group_info.get('sources', []) # Existing sources in db
                 source_ids = group_info.get('source_ids', []) # Current source IDs
                 
                 # Generate neutral analysis for this single group
-                response = generate_neutral_analysis_single(group_info, is_update)
+                response = await generate_neutral_analysis_single(engine, group_info, is_update)
                 
                 if response is None:
-                    # Add to rate-limited queue for later processing
-                    api_rate_limiter.queue_rate_limited_group(group_info)
-                    return {"success": False, "error": "API limit or quota exceeded", "group": group, "rate_limited": True}
+                    # Keep the group for the retry pass
+                    return {"success": False, "error": "API limit or quota exceeded", "group": group, "rate_limited": True,
+                            "group_info": group_info}
                 
                 # Unpack the response
                 skipped = False
@@ -212,19 +162,20 @@ def neutralize_and_more(groups_prepared):
                 if not result:
                     return {"success": False, "error": "No result generated", "group": group}
                     
-                # Process the result based on whether this is an update or new neutralization
+                # Store the result as soon as it arrives, on a worker thread, while the
+                # other groups are still waiting for OpenAI
                 if is_update:
                     if skipped:
                         success = True
                     else:
-                        success = update_existing_neutral_news(group, result, source_ids, sources_to_unassign)
+                        success = await asyncio.to_thread(update_existing_neutral_news, group, result, source_ids, sources_to_unassign)
                 else:
-                    success = store_neutral_news(group, result, source_ids, sources_to_unassign)
+                    success = await asyncio.to_thread(store_neutral_news, group, result, source_ids, sources_to_unassign)
                 
                 # Initialize scores_result to avoid UnboundLocalError
                 scores_result = None
                 if not skipped:
-                    scores_result = update_news_with_neutral_scores(sources, result, sources_to_unassign)
+                    scores_result = await asyncio.to_thread(update_news_with_neutral_scores, sources, result, sources_to_unassign)
                 
                 return {
                     "success": success,
@@ -240,91 +191,71 @@ def neutralize_and_more(groups_prepared):
                 traceback.print_exc()
                 return {"success": False, "error": str(e), "group": group_info.get('group')}
         
-        def process_all_groups(groups_to_update, groups_to_neutralize, worker_count):
-            """Process all groups with the specified worker count"""
+        async def process_all_groups(engine, groups_to_update, groups_to_neutralize):
+            """Process all groups, the engine decides how many OpenAI requests are in flight"""
             nonlocal neutralized_count, neutralized_groups, updated_count, updated_groups
             nonlocal skipped_update_count, skipped_update_groups, updated_neutral_scores_count, updated_neutral_scores_news
             nonlocal rate_limited_count, rate_limited_groups
             
-            worker_count = min(worker_count, len(groups_to_update) + len(groups_to_neutralize))
-            print(f"ℹ️ Processing {len(groups_to_update)} updates and {len(groups_to_neutralize)} new neutralizations with {worker_count} workers")
+            print(f"ℹ️ Processing {len(groups_to_update)} updates and {len(groups_to_neutralize)} new neutralizations "
+                  f"starting at {int(engine.concurrency.limit)} concurrent requests")
             
-            with ThreadPoolExecutor(max_workers=worker_count) as executor:
-                # Submit all update tasks
-                update_futures = {
-                    executor.submit(process_group, group, True): group 
-                    for group in groups_to_update
-                }
-                
-                # Submit all neutralization tasks  
-                neutralize_futures = {
-                    executor.submit(process_group, group, False): group
-                    for group in groups_to_neutralize
-                }
-                
-                all_futures = {**update_futures, **neutralize_futures}
+            # Start every group at once, the engine's adaptive limit bounds the requests in flight
+            tasks = [process_group(engine, group, True) for group in groups_to_update]
+            tasks += [process_group(engine, group, False) for group in groups_to_neutralize]
+            
+            # Process results as they complete
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                group_id = result.get("group")
                 
-                # Process results as they complete
-                for future in as_completed(all_futures):
-                    result = future.result()
-                    group_id = result.get("group")
+                # Check if this group was rate limited
+                if result.get("rate_limited"):
+                    rate_limited_count += 1
+                    rate_limited_groups.append(group_id)
+                    rate_limited_queue.append(result["group_info"])
+                    print(f"📋 Added group {group_id} to rate-limited queue for later processing")
+                    continue
                     
-                    # Check if this group was rate limited
-                    if result.get("rate_limited"):
-                        rate_limited_count += 1
-                        rate_limited_groups.append(group_id)
-                        continue
-                        
-                    if result["success"]:
-                        is_update = result.get("is_update", False)
-                        
-                        if is_update:
-                            if result.get("skipped"):
-                                # This was a skipped update
-                                skipped_update_count += 1
-                                skipped_update_groups.append(group_id)
-                            else:
-                                # This was a completed update
-                                updated_count += 1
-                                updated_groups.append(group_id)
+                if result["success"]:
+                    is_update = result.get("is_update", False)
+                    
+                    if is_update:
+                        if result.get("skipped"):
+                            # This was a skipped update
+                            skipped_update_count += 1
+                            skipped_update_groups.append(group_id)
                         else:
-                            # This was a new neutralization
-                            neutralized_count += 1
-                            neutralized_groups.append(group_id)
+                            # This was a completed update
+                            updated_count += 1
+                            updated_groups.append(group_id)
+                    else:
+                        # This was a new neutralization
+                        neutralized_count += 1
+                        neutralized_groups.append(group_id)
 
-                        if result.get("scores_result"):
-                            count, news_ids = result["scores_result"]
-                            updated_neutral_scores_count += count
-                            updated_neutral_scores_news.extend(news_ids)
-        
-        # First, process with conservative worker count - using the sorted groups
-        process_all_groups(sorted_groups_to_update, sorted_groups_to_neutralize, INITIAL_WORKERS)
+                    if result.get("scores_result"):
+                        count, news_ids = result["scores_result"]
+                        updated_neutral_scores_count += count
+                        updated_neutral_scores_news.extend(news_ids)
+        
+        async def run_all_groups():
+            start_time = time.time()
+            # One OpenAI client with a keep-alive connection pool for the whole run
+            async with NeutralizationEngine() as engine:
+                # The engine adapts the requests in flight to the provider's capacity (AIMD)
+                await process_all_groups(engine, sorted_groups_to_update, sorted_groups_to_neutralize)
+                
+                # Retry rate-limited groups once; the concurrency has already been cut by the overload
+                if rate_limited_queue:
+                    rate_limited_updates = [group_info for group_info in rate_limited_queue if group_info.get('group') in changed_group_ids]
+                    rate_limited_neutralizations = [group_info for group_info in rate_limited_queue if group_info.get('group') not in changed_group_ids]
+                    rate_limited_queue.clear()
+                    print(f"🔄 Retrying {len(rate_limited_updates)} updates and {len(rate_limited_neutralizations)} neutralizations that were rate limited")
+                    await process_all_groups(engine, rate_limited_updates, rate_limited_neutralizations)
+                engine.report(time.time() - start_time)
         
-        # Process rate-limited groups if any
-        if api_rate_limiter.has_rate_limited_groups():
-            print(f"🔄 Processing {rate_limited_count} rate-limited groups with reduced concurrency")
-            
-            # Collect rate-limited groups
-            rate_limited_updates = []
-            rate_limited_neutralizations = []
-            
-            while api_rate_limiter.has_rate_limited_groups():
-                group_info = api_rate_limiter.get_rate_limited_group()
-                if group_info:
-                    # Wait between processing rate-limited groups
-                    time.sleep(1)  # Add a small delay between each group
-                    
-                    group_id = group_info.get('group')
-                    # Check if it's an update or new neutralization
-                    if group_id in changed_group_ids:
-                        rate_limited_updates.append(group_info)
-                    else:
-                        rate_limited_neutralizations.append(group_info)
-            
-            # Process with very conservative settings (1 worker)
-            if rate_limited_updates or rate_limited_neutralizations:
-                print(f"⚠️ Retrying {len(rate_limited_updates)} updates and {len(rate_limited_neutralizations)} neutralizations with 1 worker")
-                process_all_groups(rate_limited_updates, rate_limited_neutralizations, 1)
+        asyncio.run(run_all_groups())
         
         print(f"Created {neutralized_count}, updated {updated_count} neutral news groups, skipped {skipped_update_count} updates, rate-limited {rate_limited_count}")
         print(f"Updated {updated_neutral_scores_count} regular news with neutral scores")
@@ -332,6 +263,8 @@ def neutralize_and_more(groups_prepared):
         print(f"Groups updated with new neutralization: {updated_groups}")
         print(f"Groups with skipped updates: {skipped_update_groups}")
         print(f"Rate-limited groups (retried): {rate_limited_groups}")
+        news_cache.report()
+        response_cache.report()
         return neutralized_count + updated_count
 
     except Exception as e:
@@ -414,14 +347,11 @@ def check_if_update_needed(group_id, valid_sources):
     """Check if an update is necessary for existing neutralization."""    
     group_dict = {}
     try:
-        db = initialize_firebase()
-        neutral_doc_ref = db.collection('neutral_news').document(str(group_id))
-        neutral_doc = neutral_doc_ref.get()
+        existing_data = get_neutral_news_snapshot(group_id)
         
-        if not neutral_doc.exists:
+        if existing_data is None:
             return None, {}
             
-        existing_data = neutral_doc.to_dict()
         existing_source_ids = set(existing_data.get('source_ids', []))  # Sources in database
         current_source_ids = {source.get('id') for source in valid_sources if source.get('id')}
         
@@ -505,10 +435,7 @@ def handle_insufficient_sources(valid_sources, group_id, group_dict, is_update=F
                 })
                 # Also handle neutral news doc
                 if (is_update):
-                    neutral_doc_ref = db.collection('neutral_news').document(str(group_id))
-                    neutral_doc_ref.update({
-                        'source_ids': firestore.ArrayRemove([source_id])
-                    })
+                    remove_group_members(group_id, [source_id])
                 # Add to dictionary
                 if str(group_id) not in group_dict:
                     group_dict[str(group_id)] = []
@@ -517,139 +444,73 @@ def handle_insufficient_sources(valid_sources, group_id, group_dict, is_update=F
             except Exception as e:
                 print(f"  Failed to unassign group {group_id} from source {source_id}: {str(e)}")
 
-def prepare_sources_for_api(valid_sources):
-    """Prepare sources for API call by handling long descriptions."""
-    # Calculate average description length for this group
-    avg_desc_length = sum(len(s['scraped_description']) for s in valid_sources) / len(valid_sources)
-    
-    # Handle outliers (sources with extremadamente long descripciones)
-    for source in valid_sources:
-        desc_len = len(source['scraped_description'])
-        if desc_len > (avg_desc_length * 3) and desc_len > 10000:
-            truncated_length = int(max(avg_desc_length * 2, 10000))
-            source['scraped_description'] = source['scraped_description'][:truncated_length] + "... [truncated due to excessive length]"
-    
-    # Prepare sources text for API call
-    sources_text = ""
-    for i, source in enumerate(valid_sources):
-        source_text = f"Fuente {i+1}: {source['source_medium']}\n"
-        source_text += f"Titular: {source['title']}\n"
-        source_text += f"Descripción: {source['scraped_description']}\n\n"
-        sources_text += source_text
-    
+def prepare_sources_for_api(valid_sources, token_budget=SOURCES_TOKEN_BUDGET):
+    """Prepare sources for API call within a token budget (see prompt_builder.py)."""
+    sources_text, stats = build_sources_text(valid_sources, token_budget)
+    if stats["trimmed"]:
+        print(f"ℹ️ Trimmed {stats['trimmed']}/{len(valid_sources)} sources to fit {token_budget} tokens (~{stats['tokens']} sent)")
     return sources_text
 
-def call_openai_api(client, system_message, user_message, group_id):
-    """Make the OpenAI API call with retry logic."""
+async def call_openai_api(engine, system_message, user_message, group_id):
+    """Make the OpenAI API call through the engine with retry logic, answering from the response cache when possible."""
     max_retries = 3
     retry_count = 0
     
+    # The same prompt always gets the same analysis: reuse it instead of paying for it again
+    cache_key = response_cache.key(engine.model, system_message, user_message)
+    cached_result = await asyncio.to_thread(response_cache.get, cache_key)
+    if cached_result is not None:
+        print(f"♻️ Using cached neutral analysis for group {group_id}")
+        return cached_result, None
+    
     while retry_count < max_retries:
         try:
             print(f"ℹ️ Generating neutral analysis for group {group_id} (attempt {retry_count + 1})")
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
-            )
+            response = await engine.complete(system_message, user_message)
             
             result_json = json.loads(response.choices[0].message.content)
+            usage = getattr(response, "usage", None)
+            await asyncio.to_thread(response_cache.put, cache_key, engine.model, result_json,
+                                    getattr(usage, "total_tokens", None))
             return result_json, None  # Success
             
         except Exception as e:
             error_message = str(e)
             
-            # Check for rate limit/quota errors
-            if "429" in error_message or "insufficient_quota" in error_message or "rate_limit" in error_message:
-                # More aggressive cooldown (2 minutes instead of just hitting force_cooldown)
-                print(f"⛔ Rate limit or quota exceeded for group {group_id}. Enforcing 2-minute cooldown.")
-                api_rate_limiter.force_cooldown(minutes=2)
-                import traceback
-                traceback.print_exc()
+            # An exhausted quota does not recover within the run
+            if "insufficient_quota" in error_message:
+                print(f"⛔ Quota exceeded for group {group_id}.")
+                return None, "rate_limit"
+            
+            # Rate limited: the engine already paused the rate limiter for as long as the
+            # provider asked, so the next attempt waits in the limiter instead of here
+            if "429" in error_message or "rate_limit" in error_message:
+                retry_count += 1
+                if retry_count < max_retries:
+                    print(f"⏳ Rate limited for group {group_id} (attempt {retry_count}/{max_retries}), retrying when capacity is available")
+                    continue
+                print(f"⛔ Still rate limited for group {group_id} after {max_retries} attempts")
                 return None, "rate_limit"
             
             # Handle token limit errors
             if "context_length_exceeded" in str(e):
                 return None, "context_length"
             
-            # Standard retry with backoff
+            # Standard retry with backoff (timeouts included)
             retry_count += 1
             print(f"Error in API call (attempt {retry_count}/{max_retries}): {type(e).__name__}: {error_message}")
             
             if retry_count < max_retries:
                 wait_time = 2 ** retry_count  # 2, 4, 8 seconds
                 print(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
+                await asyncio.sleep(wait_time)
             else:
                 print(f"Max retries reached for group {group_id}, giving up")
                 import traceback
                 traceback.print_exc()
                 return None, "max_retries"
 
-def generate_neutral_analysis_single(group_info, is_update):
-    """
-    Process a single group for neutral analysis.
-    This modularized version improves readability and ensures correct behavior.
-    """
-    if not group_info:
-        return None
-    
-    # Create base dictionary for source IDs to unassign
-    group_dict = {}
-    group_id = group_info.get('group', 'unknown')
-    sources = group_info.get('sources', [])
-    
-    # Use the rate limiter and check if we need to delay
-    if api_rate_limiter.check_limit(group_id):
-        # If we had to enforce a cooldown, re-check the limit
-        api_rate_limiter.check_limit(group_id)
-
-    # Get API key and create client
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key:
-        print("ERROR: OPENAI_API_KEY environment variable not set.")
-        raise ValueError("OpenAI API Key not configured.")
-        
-    api_key = api_key.strip()
-    client = OpenAI(api_key=api_key)
-    
-    SOURCES_LIMIT = 16  # Maximum number of sources to process
-    
-    try:
-        # Step 1: Validate initial sources
-        initial_sources = validate_initial_sources(sources, group_id)
-        if not initial_sources:
-            return None
-            
-        # Step 2: Select one source per media (deduplicate)
-        valid_sources, sources_to_deduplicate = deduplicate_sources_by_medium(initial_sources)
-        
-        # Step 3: For updates, check if update is necessary
-        if is_update:
-            existing_data_to_keep, update_dict = check_if_update_needed(group_id, valid_sources)
-            if existing_data_to_keep:
-                skipped = True
-                if update_dict: 
-                    group_dict[str(group_id)] = list(update_dict.keys())
-                return existing_data_to_keep, group_dict, skipped
-            elif sources_to_deduplicate:
-                delete_invalid_sources_from_db(is_update, sources_to_deduplicate, group_dict, group_id)
-                print(f"ℹ️ Deduplicated sources for group {group_id} during update. Selected {len(valid_sources)} valid sources from {len(initial_sources)} original sources.")
-        elif sources_to_deduplicate:
-            delete_invalid_sources_from_db(is_update, sources_to_deduplicate, group_dict, group_id)
-            print(f"ℹ️ Deduplicated sources for group {group_id} during update. Selected {len(valid_sources)} valid sources from {len(initial_sources)} original sources.")
-
-        # Step 4: Apply source limits and handle insufficient sources
-        valid_sources, group_dict = apply_source_limits(valid_sources, group_id, group_dict, SOURCES_LIMIT, is_update)
-        if not valid_sources:
-            return None
-            
-        # Step 5: Prepare sources for API call
-        system_message = """
+SYSTEM_MESSAGE = """
         Eres un analista de noticias imparcial. Te voy a pasar varios titulares y descripciones
         de una misma noticia contada por diferentes medios. Tu tarea:
 
@@ -683,43 +544,168 @@ def generate_neutral_analysis_single(group_info, is_update):
             ]
         }
         """
+
+UPDATE_SYSTEM_MESSAGE = """
+        Eres un analista de noticias imparcial. Te voy a pasar el titular y la descripción neutrales
+        que ya escribiste para una noticia, y las fuentes nuevas que la cuentan desde que los escribiste. Tu tarea:
+
+        1. Revisar el titular neutral para que siga siendo CONCISO (entre 8-14 palabras máximo) y refleje
+           la información nueva. Si no cambia nada relevante, mantén el titular actual.
+        
+        2. Revisar la descripción neutral incorporando solo los hechos nuevos que aporten las fuentes, con
+           párrafos cortos (máximo 50 palabras por párrafo) y un límite aproximado de 250 palabras en total.
+           El primer párrafo debe contener la información más importante.
         
-        sources_text = prepare_sources_for_api(valid_sources)
-        user_message = f"Analiza las siguientes fuentes de noticias:\n\n{sources_text}"
+        3. Evaluar SOLO las fuentes nuevas con una puntuación de neutralidad (0 a 100).
+        
+        4. Asignar una categoría entre: Economía, Política, Ciencia, Tecnología, Cultura, Sociedad, Deportes, 
+           Internacional, Entretenimiento, Otros.
+           
+        5. Evaluar la relevancia de la noticia en una escala del 1 al 5, donde:
+           1 = Muy baja relevancia (interés muy local o limitado / publicidad o propaganda)
+           2 = Baja relevancia (interés limitado a ciertos grupos)
+           3 = Relevancia media (interés general pero sin gran impacto)
+           4 = Alta relevancia (interés amplio con posible impacto social/político/económico)
+           5 = Muy alta relevancia (gran impacto social/político/económico, noticia de primer nivel)
+
+        Devuelve SOLO un JSON con esta estructura (sin explicaciones adicionales):
+        {
+            "neutral_title": "...",
+            "neutral_description": "...",
+            "category": "...",
+            "relevance": X,
+            "source_ratings": [
+                {"source_medium": "...", "rating": X},
+                ...
+            ]
+        }
+        """
+
+def split_update_sources(group_id, valid_sources):
+    """
+    Decide whether an update can revise the existing summary instead of regenerating it.
+
+    That is the case when the group has a neutral title and description and gained
+    no more new sources than it kept, so the summary still describes most of the group.
+
+    Returns:
+        tuple: (existing_data, new_sources), or None for a full regeneration
+    """
+    existing_data = get_neutral_news_snapshot(group_id)
+    if not existing_data or not existing_data.get('neutral_title') or not existing_data.get('neutral_description'):
+        return None
+
+    existing_source_ids = set(existing_data.get('source_ids', []))
+    new_sources = [source for source in valid_sources if source.get('id') not in existing_source_ids]
+    kept_count = len(valid_sources) - len(new_sources)
+    if not new_sources or len(new_sources) > kept_count:
+        return None
+    return existing_data, new_sources
+
+def prepare_update_message(existing_data, new_sources, token_budget):
+    """Build the user message of a delta update: the current summary and the new sources only."""
+    sources_text = prepare_sources_for_api(new_sources, token_budget)
+    return (
+        f"Titular neutral actual: {existing_data['neutral_title']}\n\n"
+        f"Descripción neutral actual:\n{existing_data['neutral_description']}\n\n"
+        f"Fuentes nuevas:\n\n{sources_text}"
+    )
+
+def prepare_group_for_api(group_info, is_update):
+    """
+    Validate, deduplicate and limit the sources of a group before calling the API.
+    Runs on a worker thread: it may read and write Firestore.
+
+    Returns:
+        tuple: (valid_sources, group_dict, response). valid_sources is None when no API
+        call is needed, and response is then the final result of the group
+    """
+    # Create base dictionary for source IDs to unassign
+    group_dict = {}
+    group_id = group_info.get('group', 'unknown')
+    sources = group_info.get('sources', [])
+    
+    SOURCES_LIMIT = 16  # Maximum number of sources to process
+    
+    # Step 1: Validate initial sources
+    initial_sources = validate_initial_sources(sources, group_id)
+    if not initial_sources:
+        return None, group_dict, None
+        
+    # Step 2: Select one source per media (deduplicate)
+    valid_sources, sources_to_deduplicate = deduplicate_sources_by_medium(initial_sources)
+    
+    # Step 3: For updates, check if update is necessary
+    if is_update:
+        existing_data_to_keep, update_dict = check_if_update_needed(group_id, valid_sources)
+        if existing_data_to_keep:
+            skipped = True
+            if update_dict: 
+                group_dict[str(group_id)] = list(update_dict.keys())
+            return None, group_dict, (existing_data_to_keep, group_dict, skipped)
+        elif sources_to_deduplicate:
+            delete_invalid_sources_from_db(is_update, sources_to_deduplicate, group_dict, group_id)
+            print(f"ℹ️ Deduplicated sources for group {group_id} during update. Selected {len(valid_sources)} valid sources from {len(initial_sources)} original sources.")
+    elif sources_to_deduplicate:
+        delete_invalid_sources_from_db(is_update, sources_to_deduplicate, group_dict, group_id)
+        print(f"ℹ️ Deduplicated sources for group {group_id} during update. Selected {len(valid_sources)} valid sources from {len(initial_sources)} original sources.")
+
+    # Step 4: Apply source limits and handle insufficient sources
+    valid_sources, group_dict = apply_source_limits(valid_sources, group_id, group_dict, SOURCES_LIMIT, is_update)
+    return valid_sources, group_dict, None
+
+async def generate_neutral_analysis_single(engine, group_info, is_update):
+    """
+    Process a single group for neutral analysis.
+    Source preparation runs on a worker thread and the API call on the engine's shared client,
+    whose rate limiter reserves the estimated tokens of the prompt before sending it.
+    Updates that only gained a few sources revise the existing summary with the new ones.
+    """
+    if not group_info:
+        return None
+    
+    group_id = group_info.get('group', 'unknown')
+    
+    try:
+        # Steps 1 to 4: validate, deduplicate and limit the sources
+        valid_sources, group_dict, response = await asyncio.to_thread(prepare_group_for_api, group_info, is_update)
+        if not valid_sources:
+            return response
+            
+        # Step 5: Prepare sources for API call, in a canonical order so the same
+        # sources always produce the same prompt (and response cache key)
+        valid_sources.sort(key=lambda source: (source['source_medium'], source['id']))
+        delta = await asyncio.to_thread(split_update_sources, group_id, valid_sources) if is_update else None
+        if delta:
+            # Revise the existing summary with the new sources, each one with the share
+            # of the budget it would get in a full regeneration
+            existing_data, new_sources = delta
+            system_message = UPDATE_SYSTEM_MESSAGE
+            token_budget = SOURCES_TOKEN_BUDGET * len(new_sources) // len(valid_sources)
+            build_message = lambda budget: prepare_update_message(existing_data, new_sources, budget)
+            print(f"ℹ️ Delta update for group {group_id}: sending the current summary and {len(new_sources)}/{len(valid_sources)} new sources")
+        else:
+            system_message = SYSTEM_MESSAGE
+            token_budget = SOURCES_TOKEN_BUDGET
+            build_message = lambda budget: f"Analiza las siguientes fuentes de noticias:\n\n{prepare_sources_for_api(valid_sources, budget)}"
+        user_message = build_message(token_budget)
         
         # Step 6: Call OpenAI API
-        result, error = call_openai_api(client, system_message, user_message, group_id)
+        result, error = await call_openai_api(engine, system_message, user_message, group_id)
         
         # Handle errors
         if error == "rate_limit":
             # Return None to indicate rate limit - this will be queued for later
             return None
         
-        # Handle token limit errors
-        if error == "context_length" and len(valid_sources) > MIN_VALID_SOURCES:
-            # Take just 3 shortest sources with aggressive truncation
-            valid_sources.sort(key=lambda x: len(x.get('scraped_description', '')))
-            reduced_sources = valid_sources[:min(3, len(valid_sources))]
-            
-            # Create a reduced text with more aggressive truncation
-            sources_text = ""
-            for i, source in enumerate(reduced_sources):
-                sources_text += f"Fuente {i+1}: {source['source_medium']}\n"
-                sources_text += f"Titular: {source['title']}\n"
-                
-                # Very aggressive truncation
-                desc = source['scraped_description']
-                max_length = 5000 if i == 0 else (3000 if i == 1 else 2000)
-                if len(desc) > max_length:
-                    desc = desc[:max_length] + "... [truncated]"
-                        
-                sources_text += f"Descripción: {desc}\n\n"
-            
-            user_message = f"Analiza las siguientes fuentes de noticias:\n\n{sources_text}"
-            print(f"⚠️ Reducing to {len(reduced_sources)} sources for group {group_id} after token error")
+        # Handle token limit errors (the budget should prevent them)
+        if error == "context_length":
+            # Rebuild the prompt with a much smaller budget
+            user_message = build_message(token_budget // 4)
+            print(f"⚠️ Reducing the sources of group {group_id} to {token_budget // 4} tokens after token error")
             
             # Try again with reduced content
-            result, error = call_openai_api(client, system_message, user_message, group_id)
+            result, error = await call_openai_api(engine, system_message, user_message, group_id)
             
             # If still failing, we need to give up
             if not result:
@@ -749,10 +735,7 @@ def delete_invalid_sources_from_db(is_update, sources_to_deduplicate, group_dict
                 })
                 # Also handle neutral news doc
                 if is_update:
-                    neutral_doc_ref = db.collection('neutral_news').document(str(group_id))
-                    neutral_doc_ref.update({
-                        'source_ids': firestore.ArrayRemove([source_id])
-                    })
+                    remove_group_members(group_id, [source_id])
                 # Add to dictionary for later removal
                 if str(group_id) not in group_dict:
                     group_dict[str(group_id)] = []
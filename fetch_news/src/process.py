@@ -1,27 +1,33 @@
 import traceback
 from collections import defaultdict
 from src.grouping import group_news
-from src.storage import get_news_for_grouping
+from src.storage import get_news_for_grouping, get_news_by_groups, get_news_sidecar_fields
 from src.storage import update_groups_in_firestore
 from src.neutralization import neutralize_and_more
-from src.config import initialize_firebase
+from src.firestore_metrics import metrics
+
+# Fields read from the database for the sources of each group
+SOURCE_FIELDS = ["title", "scraped_description", "description", "source_medium", "pub_date", "created_at"]
 
 def process_news_groups():
     try:
         # Get news for grouping with the option to fetch all news documents
-        news_for_grouping, news_docs = get_news_for_grouping()
+        with metrics.stage("load_for_grouping"):
+            news_for_grouping, news_docs = get_news_for_grouping()
         
         if not news_for_grouping:
             print("No news to group")
             return 0
                 
         # Perform grouping process directly
-        grouped_news: list = group_news(news_for_grouping)
-        groups_prepared = prepare_groups_for_neutralization(grouped_news)
+        with metrics.stage("grouping"):
+            grouped_news: list = group_news(news_for_grouping)
+            groups_prepared = prepare_groups_for_neutralization(grouped_news)
         print(f"ℹ️ Prepared {len(groups_prepared)} news groups for neutralization")
         
         # Neutralizar los grupos recién creados y guardarlos
-        neutralized_count = neutralize_and_more(groups_prepared)
+        with metrics.stage("neutralization"):
+            neutralized_count = neutralize_and_more(groups_prepared)
         print(f"Neutralized {neutralized_count} groups")
     except Exception as e:
         print(f"Error in process_news_groups: {str(e)}")
@@ -41,6 +47,18 @@ def prepare_groups_for_neutralization(grouped_news) -> list:
     
     MIN_VALID_SOURCES = 3
     
+    # Grouping only loads the body text of the news it had to embed, so fetch the
+    # rest from their sidecars now that we know which news ended up in a group
+    missing_description_ids = [
+        noticia.get("id") for noticia in grouped_news
+        if noticia.get("group") is not None and not isinstance(noticia.get("scraped_description"), str)
+    ]
+    if missing_description_ids:
+        contents = get_news_sidecar_fields(missing_description_ids, ["scraped_description"])
+        for noticia in grouped_news:
+            if noticia.get("id") in contents:
+                noticia["scraped_description"] = contents[noticia["id"]]["scraped_description"]
+    
     # Process each news item from current batch
     for noticia in grouped_news:
         grupo = noticia.get("group")
@@ -84,26 +102,22 @@ def prepare_groups_for_neutralization(grouped_news) -> list:
                         "created_at": noticia.get("created_at"),
                     })
     
-    # Fetch all additional sources from the database for each group
-    db = initialize_firebase()
+    # Fetch all additional sources of these groups from the database in a few batched queries
     all_group_ids = list(grupos.keys())
     processed_ids = {source["id"] for group_sources in grupos.values() for source in group_sources}
     
     # Only query database if we have groups
     if all_group_ids:
         print(f"Fetching all existing sources for {len(all_group_ids)} groups from the database...")
+        news_by_group = get_news_by_groups(all_group_ids, SOURCE_FIELDS)
         
-        # Get all news with groups that match our current groups
-        for group_id in all_group_ids:
-            query = db.collection('news').where('group', '==', group_id).stream()
-            
-            for doc in query:
-                doc_id = doc.id
+        for group_id, group_news_docs in news_by_group.items():
+            for data in group_news_docs:
+                doc_id = data["id"]
                 # Skip if we already processed this document in the current batch
                 if doc_id in processed_ids:
                     continue
                     
-                data = doc.to_dict()
                 title = data.get("title", "")
                 description = data.get("scraped_description", "")
                 
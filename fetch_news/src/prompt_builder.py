@@ -0,0 +1,137 @@
+import re
+from .rate_limiter import estimate_tokens, CHARS_PER_TOKEN
+
+SOURCES_TOKEN_BUDGET = 8000  # Tokens of source text sent per group
+MIN_PARAGRAPH_WORDS = 4  # Shorter lines are bylines, captions or buttons
+
+# Paragraphs that belong to the page, not to the story
+BOILERPLATE_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"^(lee|leer|ver) (también|más)\b",
+    r"^te puede interesar",
+    r"^(noticias|artículos) relacionad",
+    r"^más información",
+    r"^archivado en",
+    r"^(suscr[ií]bete|hazte suscriptor|date de alta)",
+    r"^s[ií]guenos\b",
+    r"^comparte?\b",
+    r"^publicidad$",
+    r"newsletter",
+    r"cookies",
+    r"todos los derechos reservados",
+    r"^(foto|imagen|v[ií]deo|fuente)\s*:",
+)]
+
+def clean_paragraphs(text):
+    """
+    Split a scraped description into paragraphs, dropping boilerplate, fragments and repeats.
+
+    Returns:
+        list: Paragraphs in their original order
+    """
+    paragraphs = []
+    seen = set()
+    for line in re.split(r"\n+", text or ""):
+        paragraph = re.sub(r"\s+", " ", line).strip()
+        if not paragraph or paragraph.lower() in seen:
+            continue
+        if len(paragraph.split()) < MIN_PARAGRAPH_WORDS:
+            continue
+        if any(pattern.search(paragraph) for pattern in BOILERPLATE_PATTERNS):
+            continue
+        seen.add(paragraph.lower())
+        paragraphs.append(paragraph)
+    if not paragraphs and text and text.strip():
+        # Nothing looked like a paragraph, keep the text rather than send an empty description
+        paragraphs.append(re.sub(r"\s+", " ", text).strip())
+    return paragraphs
+
+def lead_text(paragraphs, max_tokens):
+    """
+    Keep the lead paragraphs that fit in max_tokens. The last one is cut at a
+    sentence boundary, or at a word boundary if not even a sentence fits.
+    """
+    kept = []
+    remaining = max_tokens
+    for paragraph in paragraphs:
+        tokens = estimate_tokens(paragraph + "\n")
+        if tokens <= remaining:
+            kept.append(paragraph)
+            remaining -= tokens
+            continue
+        max_chars = remaining * CHARS_PER_TOKEN
+        sentences = re.split(r"(?<=[.!?])\s+", paragraph)
+        partial = ""
+        for sentence in sentences:
+            if len(partial) + len(sentence) + 1 > max_chars:
+                break
+            partial = f"{partial} {sentence}".strip()
+        if not partial and max_chars > 0:
+            partial = paragraph[:max_chars].rsplit(" ", 1)[0] + "..."
+        if partial:
+            kept.append(partial)
+        break
+    return "\n".join(kept)
+
+def allocate_budget(needs, budget):
+    """
+    Split a budget with max-min fairness: every key gets what it needs if that is
+    below an equal share, and what the small ones leave is shared by the rest.
+
+    Args:
+        needs: Dict of key -> tokens needed
+        budget: Tokens to split
+
+    Returns:
+        dict: key -> tokens allocated
+    """
+    allocation = {}
+    remaining = dict(needs)
+    left = max(0, budget)
+    while remaining:
+        share = left / len(remaining)
+        satisfied = {key: need for key, need in remaining.items() if need <= share}
+        if not satisfied:
+            for key in remaining:
+                allocation[key] = int(share)
+            break
+        for key, need in satisfied.items():
+            allocation[key] = need
+            left -= need
+            del remaining[key]
+    return allocation
+
+def build_sources_text(sources, token_budget=SOURCES_TOKEN_BUDGET):
+    """
+    Format the sources of a group for the prompt within a token budget.
+
+    Titles and media are always sent. The rest of the budget is shared fairly
+    across media (then across the sources of each medium), and each description
+    keeps its cleaned lead paragraphs up to its share. Sources are not modified.
+
+    Returns:
+        tuple: (sources_text, stats) with stats {"tokens": int, "trimmed": int}
+    """
+    headers = [f"Fuente {i+1}: {source['source_medium']}\nTitular: {source['title']}\nDescripción: " for i, source in enumerate(sources)]
+    paragraphs = [clean_paragraphs(source.get('scraped_description')) for source in sources]
+    needs = [sum(estimate_tokens(paragraph + "\n") for paragraph in source_paragraphs) for source_paragraphs in paragraphs]
+    description_budget = token_budget - sum(estimate_tokens(header + "\n\n") for header in headers)
+
+    by_medium = {}
+    for index, source in enumerate(sources):
+        by_medium.setdefault(source['source_medium'], []).append(index)
+    medium_budgets = allocate_budget(
+        {medium: sum(needs[index] for index in indexes) for medium, indexes in by_medium.items()},
+        description_budget,
+    )
+    allocation = {}
+    for medium, indexes in by_medium.items():
+        allocation.update(allocate_budget({index: needs[index] for index in indexes}, medium_budgets[medium]))
+
+    sources_text = ""
+    trimmed = 0
+    for index, header in enumerate(headers):
+        if allocation[index] < needs[index]:
+            trimmed += 1
+        description = lead_text(paragraphs[index], allocation[index])
+        sources_text += f"{header}{description}\n\n"
+    return sources_text, {"tokens": estimate_tokens(sources_text), "trimmed": trimmed}
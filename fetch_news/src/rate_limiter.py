@@ -0,0 +1,194 @@
+import re
+import math
+import time
+import asyncio
+from threading import Lock
+
+REQUESTS_PER_MINUTE = 500  # gpt-4o-mini defaults, replaced by the x-ratelimit-limit-* headers
+TOKENS_PER_MINUTE = 200000
+CHARS_PER_TOKEN = 4  # Rough average for Spanish news text
+EXPECTED_COMPLETION_TOKENS = 700  # Neutral title, ~250 word description and the source ratings
+DEFAULT_RETRY_SECONDS = 5.0  # Pause after a 429 that does not say how long to wait
+
+def estimate_tokens(text):
+    """Approximate number of tokens of a text, without loading a tokenizer"""
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+def parse_reset(value):
+    """
+    Parse the duration of an x-ratelimit-reset-* or retry-after header ('1s', '6m0s', '20ms', '2').
+
+    Returns:
+        float: Seconds, or None if the value cannot be parsed
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    factors = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * factors[unit] for amount, unit in parts)
+
+class Reservation:
+    """Capacity taken from the limiter for one request"""
+
+    def __init__(self, tokens, wait):
+        self.tokens = tokens
+        self.wait = wait
+
+class RateLimiter:
+    """
+    Keeps the OpenAI calls within the requests per minute and tokens per minute of the account.
+
+    Both limits are token buckets refilled continuously. Before each call, reserve()
+    takes one request and the estimated tokens from the buckets, even if that leaves
+    them in debt, and returns how long the caller must wait for the debt to be repaid.
+    Each call therefore waits behind the calls reserved before it, and the lock is
+    only held for the bookkeeping, never while waiting.
+
+    After the call, reconcile() replaces the estimate with the tokens reported in
+    the response usage and adopts the limits and remaining capacity from the
+    x-ratelimit-* headers. A 429 pauses new reservations only for as long as the
+    provider asks (retry-after or the reset headers).
+
+    Usage:
+        reservation = await limiter.acquire(estimated_tokens)
+        response = ...
+        limiter.reconcile(reservation, response.usage.total_tokens, headers)
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+        self.lock = Lock()
+        self.requests_per_minute = float(requests_per_minute)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self.requests_available = self.requests_per_minute
+        self.tokens_available = self.tokens_per_minute
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.reservations = 0
+        self.waited_seconds = 0.0
+        self.throttled = 0
+        self.estimated_tokens = 0
+        self.used_tokens = 0
+
+    def reset_stats(self):
+        """Start the counters of a new run, the buckets carry over"""
+        with self.lock:
+            self.reservations = 0
+            self.waited_seconds = 0.0
+            self.throttled = 0
+            self.estimated_tokens = 0
+            self.used_tokens = 0
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self.updated)
+        self.requests_available = min(self.requests_per_minute,
+                                      self.requests_available + elapsed * self.requests_per_minute / 60)
+        self.tokens_available = min(self.tokens_per_minute,
+                                    self.tokens_available + elapsed * self.tokens_per_minute / 60)
+        self.updated = now
+
+    def reserve(self, tokens):
+        """
+        Take one request and the given tokens from the buckets.
+
+        Returns:
+            Reservation: With the seconds to wait before sending the request
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            # A single request larger than the whole budget would otherwise never be sent
+            tokens = min(int(tokens), int(self.tokens_per_minute))
+            self.requests_available -= 1
+            self.tokens_available -= tokens
+            wait = max(
+                0.0,
+                -self.requests_available * 60 / self.requests_per_minute,
+                -self.tokens_available * 60 / self.tokens_per_minute,
+                self.paused_until - now,
+            )
+            self.reservations += 1
+            self.estimated_tokens += tokens
+            self.waited_seconds += wait
+            return Reservation(tokens, wait)
+
+    async def acquire(self, tokens):
+        """Reserve capacity and wait, outside the lock, until it is available"""
+        reservation = self.reserve(tokens)
+        if reservation.wait > 0:
+            await asyncio.sleep(reservation.wait)
+        return reservation
+
+    def reconcile(self, reservation, used_tokens=None, headers=None):
+        """
+        Correct a reservation with what the request actually used.
+
+        Args:
+            reservation: Returned by reserve() or acquire()
+            used_tokens: total_tokens from the response usage, if reported
+            headers: Response headers with the x-ratelimit-* values, if available
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            if used_tokens is not None:
+                self.tokens_available += reservation.tokens - used_tokens
+                self.used_tokens += used_tokens
+            if headers:
+                self._apply_headers(headers)
+
+    def _apply_headers(self, headers):
+        limit_requests = _header_number(headers, "x-ratelimit-limit-requests")
+        limit_tokens = _header_number(headers, "x-ratelimit-limit-tokens")
+        if limit_requests:
+            self.requests_per_minute = limit_requests
+        if limit_tokens:
+            self.tokens_per_minute = limit_tokens
+        # The provider's remaining capacity does not include the requests still in flight,
+        # so it can only lower ours
+        remaining_requests = _header_number(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = _header_number(headers, "x-ratelimit-remaining-tokens")
+        if remaining_requests is not None:
+            self.requests_available = min(self.requests_available, remaining_requests)
+        if remaining_tokens is not None:
+            self.tokens_available = min(self.tokens_available, remaining_tokens)
+
+    def penalize(self, headers=None):
+        """Pause new requests after a 429 for as long as the provider asks"""
+        headers = headers or {}
+        pause = parse_reset(headers.get("retry-after"))
+        if pause is None:
+            resets = [parse_reset(headers.get(name)) for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+            resets = [reset for reset in resets if reset is not None]
+            pause = max(resets) if resets else DEFAULT_RETRY_SECONDS
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.paused_until = max(self.paused_until, now + pause)
+            self.requests_available = min(self.requests_available, 0.0)
+            self.tokens_available = min(self.tokens_available, 0.0)
+            self.throttled += 1
+        print(f"⛔ Rate limited by the provider, pausing new requests for {pause:.1f}s")
+
+    def report(self):
+        """Print how much the limiter delayed the calls"""
+        with self.lock:
+            print(f"ℹ️ Rate limiter: {self.reservations} requests, {self.waited_seconds:.1f}s waited, "
+                  f"{self.throttled} throttled by the provider, {self.used_tokens} tokens used "
+                  f"({self.estimated_tokens} estimated), limits {self.requests_per_minute:.0f} requests "
+                  f"and {self.tokens_per_minute:.0f} tokens per minute")
+
+def _header_number(headers, name):
+    try:
+        value = headers.get(name)
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+# Shared by every run of a warm instance: the provider quota is per account, not per run
+api_rate_limiter = RateLimiter()
@@ -0,0 +1,67 @@
+import numpy as np
+
+def normalize_rows(embeddings):
+    """Return a float array with every row scaled to unit length (zero rows are left as zeros)."""
+    embeddings = np.asarray(embeddings, dtype=float)
+    if embeddings.ndim == 1:
+        embeddings = embeddings.reshape(1, -1)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1e-10
+    return embeddings / norms
+
+def mean_pairwise_similarity(embeddings_norm):
+    """
+    Mean cosine similarity over all distinct pairs of normalized embeddings.
+    Uses the identity sum_{i != j} v_i . v_j = ||sum v||^2 - n, so it runs in O(n * d)
+    instead of looping over n^2 pairs.
+    Returns None when there are fewer than two embeddings.
+    """
+    n = len(embeddings_norm)
+    if n < 2:
+        return None
+    total = np.asarray(embeddings_norm).sum(axis=0)
+    return float((total @ total - n) / (n * (n - 1)))
+
+def cluster_similarity_stats(embeddings_norm, labels):
+    """
+    Score every cluster of a labelled set of normalized embeddings in one pass.
+
+    Args:
+        embeddings_norm: (n, d) array of normalized embeddings
+        labels: (n,) array of cluster labels
+
+    Returns:
+        dict with:
+            labels: (k,) unique labels, in sorted order
+            sizes: (k,) number of members per cluster
+            mean_similarity: (k,) mean pairwise cosine similarity per cluster (NaN for single-member clusters)
+            centroids: (k, d) normalized centroid of each cluster
+            centroid_distances: (k, k) cosine distance between cluster centroids
+            member_distances: (n,) cosine distance of each embedding to its own cluster centroid
+    """
+    embeddings_norm = np.asarray(embeddings_norm, dtype=float)
+    unique_labels, inverse = np.unique(np.asarray(labels), return_inverse=True)
+    k = len(unique_labels)
+
+    membership = np.zeros((k, len(inverse)))
+    membership[inverse, np.arange(len(inverse))] = 1.0
+    sums = membership @ embeddings_norm
+    sizes = np.bincount(inverse, minlength=k)
+
+    squared_norms = np.einsum("ij,ij->i", sums, sums)
+    pair_counts = sizes * (sizes - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_similarity = np.where(pair_counts > 0, (squared_norms - sizes) / pair_counts, np.nan)
+
+    centroids = normalize_rows(sums)
+    centroid_distances = 1.0 - centroids @ centroids.T
+    member_distances = 1.0 - np.einsum("ij,ij->i", embeddings_norm, centroids[inverse])
+
+    return {
+        "labels": unique_labels,
+        "sizes": sizes,
+        "mean_similarity": mean_similarity,
+        "centroids": centroids,
+        "centroid_distances": centroid_distances,
+        "member_distances": member_distances,
+    }
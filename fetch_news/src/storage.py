@@ -1,7 +1,174 @@
 from datetime import datetime, timedelta
 from urllib.parse import urlparse, unquote
 from .config import initialize_firebase
+from .write_pipeline import WritePipeline
+from .async_storage import run_async
+from google.cloud import firestore
 import traceback
+import struct
+import asyncio
+from threading import Lock
+
+class DocumentCache:
+    """
+    Run-scoped identity map of the documents of one collection.
+    Each document is fetched at most once, in batched get_all calls, and writes made
+    through the storage helpers are applied to the cached copy so later reads see them.
+    Shared by the neutralization workers, so access is guarded by a lock.
+    """
+
+    GET_ALL_CHUNK_SIZE = 300  # Documents per get_all call
+
+    def __init__(self, collection_name):
+        self.collection_name = collection_name
+        self.documents = {}  # id -> dict, or None when the document does not exist
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get_many(self, db, doc_ids):
+        """
+        Get several documents, fetching the ones not cached yet with get_all.
+
+        Returns:
+            dict: {doc_id: document data or None if it does not exist}
+        """
+        doc_ids = [doc_id for doc_id in dict.fromkeys(doc_ids) if doc_id]
+        with self.lock:
+            missing = [doc_id for doc_id in doc_ids if doc_id not in self.documents]
+            self.hits += len(doc_ids) - len(missing)
+            self.misses += len(missing)
+
+        # Fetch outside the lock so workers do not wait on each other's round trips
+        fetched = {doc_id: None for doc_id in missing}
+        for i in range(0, len(missing), self.GET_ALL_CHUNK_SIZE):
+            refs = [db.collection(self.collection_name).document(doc_id) for doc_id in missing[i:i + self.GET_ALL_CHUNK_SIZE]]
+            for doc in db.get_all(refs):
+                if doc.exists:
+                    fetched[doc.id] = doc.to_dict()
+
+        with self.lock:
+            for doc_id, data in fetched.items():
+                self.documents.setdefault(doc_id, data)
+            return {doc_id: self.documents[doc_id] for doc_id in doc_ids}
+
+    def prime(self, documents):
+        """Add documents fetched elsewhere, e.g. by a concurrent prefetch. Cached copies are kept."""
+        with self.lock:
+            for doc_id, data in documents.items():
+                if doc_id not in self.documents:
+                    self.documents[doc_id] = data
+                    self.misses += 1
+
+    def get(self, db, doc_id):
+        """Get a single document, or None if it does not exist"""
+        return self.get_many(db, [doc_id]).get(doc_id)
+
+    def apply(self, doc_id, fields):
+        """Apply a write to the cached copy of a document, if it is cached"""
+        with self.lock:
+            data = self.documents.get(doc_id)
+            if data is not None:
+                data.update(fields)
+
+    def clear(self):
+        """Forget every cached document and reset the counters, e.g. at the start of a run"""
+        with self.lock:
+            self.documents.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        """Print how many reads the cache saved"""
+        print(f"📊 '{self.collection_name}' cache: {self.hits} hits, {self.misses} misses "
+              f"({self.hit_rate():.1%} hit rate), {len(self.documents)} documents cached")
+
+# Heavy news fields live in sidecar documents with the same ID as the news document,
+# so listing and filtering 'news' only transfers the small fields
+NEWS_CONTENT_COLLECTION = 'news_content'  # {"scraped_description": str}
+NEWS_EMBEDDINGS_COLLECTION = 'news_embeddings'  # {"embedding": list}
+SIDECAR_FIELDS = {
+    "scraped_description": NEWS_CONTENT_COLLECTION,
+    "embedding": NEWS_EMBEDDINGS_COLLECTION,
+}
+# Fields of the slim news document used by grouping
+NEWS_GROUPING_FIELDS = ["id", "title", "description", "source_medium", "group", "pub_date", "created_at"]
+
+# Documents of the 'news' collection read during the current run
+news_cache = DocumentCache('news')
+# Embedding sidecars read during the current run
+embedding_cache = DocumentCache(NEWS_EMBEDDINGS_COLLECTION)
+
+def split_news_document(news_dict):
+    """
+    Split a news dict into the slim news document and its sidecar documents.
+
+    Returns:
+        tuple: (news document, {sidecar collection: sidecar document})
+    """
+    news_dict = dict(news_dict)
+    sidecars = {}
+    for field, collection_name in SIDECAR_FIELDS.items():
+        value = news_dict.pop(field, None)
+        if value is not None:
+            sidecars[collection_name] = {field: value}
+    return news_dict, sidecars
+
+async def read_news_sidecar_fields(storage, news_ids, fields) -> dict:
+    """
+    Read heavy fields of several news from their sidecars through an AsyncStorage, so the
+    sidecar reads and the inline fallback share one run_async call with the caller's reads.
+    News not migrated yet still keep these fields inline, so they are read from the
+    news document instead.
+
+    Args:
+        storage: AsyncStorage to read with
+        news_ids: Iterable of news IDs
+        fields: Sidecar fields to read, e.g. ["scraped_description"]
+
+    Returns:
+        dict: {news_id: {field: value}} with None for missing values
+    """
+    news_ids = [news_id for news_id in dict.fromkeys(news_ids) if news_id]
+    fields = [field for field in fields if field in SIDECAR_FIELDS]
+    result = {news_id: {field: None for field in fields} for news_id in news_ids}
+    if not news_ids or not fields:
+        return result
+
+    sidecars = await asyncio.gather(*(
+        storage.get_documents(SIDECAR_FIELDS[field], news_ids) for field in fields
+    ))
+
+    missing = set()
+    for field, documents in zip(fields, sidecars):
+        for news_id, data in documents.items():
+            if data is None:
+                missing.add(news_id)
+            else:
+                result[news_id][field] = data.get(field)
+
+    if missing:
+        inline = await storage.get_documents('news', missing, field_paths=fields)
+        for news_id, data in inline.items():
+            for field in fields:
+                if data and result[news_id][field] is None:
+                    result[news_id][field] = data.get(field)
+
+    return result
+
+def get_news_sidecar_fields(news_ids, fields) -> dict:
+    """
+    Get heavy fields of several news from their sidecars with concurrent batch reads
+    (see read_news_sidecar_fields).
+
+    Returns:
+        dict: {news_id: {field: value}} with None for missing values
+    """
+    return run_async(lambda storage: read_news_sidecar_fields(storage, news_ids, fields))
 
 def parse_pub_date(date_str):
     """
@@ -68,9 +235,8 @@ def store_news_in_firestore(news_list):
         return 0
     
     db = initialize_firebase()
-    batch = db.batch()
+    writer = WritePipeline(db, name="news")
     news_count = 0
-    current_batch = 0
     
     for news in news_list:
         # Check if this news already exists in the database by URL
@@ -91,20 +257,16 @@ def store_news_in_firestore(news_list):
                     news_dict['pub_date'] = datetime.now()
             
             # Create a new document in the 'news' collection
-            news_ref = db.collection('news').document(news.id)
-            batch.set(news_ref, news_dict)
+            # Store the slim document and its sidecars together
+            news_doc, sidecars = split_news_document(news_dict)
+            operations = [("set", db.collection('news').document(news.id), news_doc)]
+            for collection_name, sidecar in sidecars.items():
+                operations.append(("set", db.collection(collection_name).document(news.id), sidecar))
+            writer.write_together(operations)
             news_count += 1
-            current_batch += 1
-            
-            # Firebase has a 500 operation limit per batch
-            if current_batch >= 450:
-                batch.commit()
-                batch = db.batch()
-                current_batch = 0
     
-    # Final batch commit if there are pending operations
-    if current_batch > 0:
-        batch.commit()
+    report = writer.close()
+    news_count -= len({path.split('/')[-1] for path in report.failed_paths()})
     
     print(f"Saved {news_count} new news to Firestore")
     return news_count
@@ -124,10 +286,115 @@ def get_all_group_ids() -> set:
             groups_ids.add(data['group'])
     
     print(f"Found {len(groups_ids)} unique group IDs")
-    # Print them in a single line for debugging
-    print(f"Group IDs: {', '.join(map(str, groups_ids))}")
     return groups_ids
 
+def get_news_by_groups(group_ids, fields) -> dict:
+    """
+    Get the news of several groups with a few concurrent 'in' queries.
+    Group IDs are split into chunks of the 'in' filter limit and only the requested
+    fields are read. Sidecar fields (e.g. scraped_description) are joined only if requested.
+
+    Args:
+        group_ids: Iterable of group IDs
+        fields: Fields to read from each news document
+
+    Returns:
+        dict: {group_id: [news dict with 'id' and the requested fields]} for every requested group
+    """
+    slim_fields = [field for field in fields if field not in SIDECAR_FIELDS]
+    heavy_fields = [field for field in fields if field in SIDECAR_FIELDS]
+
+    async def read_groups(storage):
+        news_by_group = await storage.get_news_by_groups(group_ids, slim_fields)
+        # Join the heavy fields from their sidecars only when the caller asked for them
+        if heavy_fields:
+            news_ids = [news["id"] for group_news in news_by_group.values() for news in group_news]
+            sidecar_fields = await read_news_sidecar_fields(storage, news_ids, heavy_fields)
+            for group_news in news_by_group.values():
+                for news in group_news:
+                    news.update(sidecar_fields.get(news["id"], {}))
+        return news_by_group
+
+    return run_async(read_groups)
+
+def prefetch_neutralization_state(group_ids, source_ids) -> dict:
+    """
+    Load the neutral_news documents of the groups and the news documents and embeddings of
+    their sources concurrently. They are primed into news_cache and embedding_cache for the
+    storage helpers.
+
+    Args:
+        group_ids: Iterable of group IDs
+        source_ids: Iterable of news IDs
+
+    Returns:
+        dict: {group_id: document data} for the groups that already have a neutral_news document
+    """
+    neutral_news, news_documents, embedding_documents = run_async(lambda storage: asyncio.gather(
+        storage.get_neutral_news_by_groups(group_ids),
+        storage.get_documents('news', source_ids),
+        storage.get_documents(NEWS_EMBEDDINGS_COLLECTION, source_ids),
+    ))
+    news_cache.prime(news_documents)
+    embedding_cache.prime(embedding_documents)
+    return neutral_news
+
+def get_max_group_id(db) -> int:
+    """
+    Get the highest numeric group ID used in 'news' or 'neutral_news'.
+    Uses descending single-field queries, so it reads at most one document per collection.
+    """
+    max_group_id = 0
+    for collection_name in ('news', 'neutral_news'):
+        query = db.collection(collection_name).order_by('group', direction=firestore.Query.DESCENDING).limit(1)
+        for doc in query.stream():
+            group = doc.to_dict().get('group')
+            try:
+                max_group_id = max(max_group_id, int(float(group)))
+            except (TypeError, ValueError):
+                continue
+    return max_group_id
+
+def run_transaction(db, operation):
+    """
+    Run operation(transaction) in a Firestore transaction, retried on contention.
+    Local backends (see local_backends.py) provide their own run_in_transaction.
+    """
+    if hasattr(db, "run_in_transaction"):
+        return db.run_in_transaction(operation)
+    return firestore.transactional(operation)(db.transaction())
+
+def reserve_group_ids(count) -> range:
+    """
+    Atomically reserve a block of consecutive group IDs.
+
+    The next free ID lives in the 'counters/group_ids' document and is advanced
+    inside a transaction, so concurrent runs never receive the same IDs.
+    The first reservation seeds the counter from the highest group ID in use.
+
+    Args:
+        count: Number of IDs to reserve
+
+    Returns:
+        range: The reserved group IDs
+    """
+    db = initialize_firebase()
+    counter_ref = db.collection('counters').document('group_ids')
+
+    def reserve(transaction):
+        snapshot = counter_ref.get(transaction=transaction)
+        if snapshot.exists and snapshot.to_dict().get('next_id') is not None:
+            next_id = int(snapshot.to_dict()['next_id'])
+        else:
+            next_id = get_max_group_id(db) + 1
+            print(f"ℹ️ Group ID counter not found. Seeding it at {next_id}")
+        transaction.set(counter_ref, {"next_id": next_id + count, "updated_at": datetime.now()})
+        return next_id
+
+    start = run_transaction(db, reserve)
+    print(f"ℹ️ Reserved group IDs {start}-{start + count - 1}")
+    return range(start, start + count)
+
 def get_news_for_grouping() -> tuple:
     """
     Get news items for grouping process with improved reference selection
@@ -158,7 +425,7 @@ def get_news_for_grouping() -> tuple:
     reference_groups_time_threshold = datetime.now() - timedelta(hours=REFERENCE_NEWS_HOURS)
     all_news_query = db.collection('news').where(
         'pub_date', '>=', reference_groups_time_threshold
-    )
+    ).select(NEWS_GROUPING_FIELDS)
     
     all_news = list(all_news_query.stream())
     print(f"Fetched {len(all_news)} total news items from the last {REFERENCE_NEWS_HOURS} hours")
@@ -181,6 +448,17 @@ def get_news_for_grouping() -> tuple:
 
     news_docs = {doc.id: doc for doc in ungrouped_news + reference_news}
     
+    # Embeddings come from their sidecars; the body text is only needed to embed the news that have none
+    async def read_grouping_fields(storage):
+        embeddings = await read_news_sidecar_fields(storage, news_docs.keys(), ["embedding"])
+        not_embedded_ids = [news_id for news_id, fields in embeddings.items() if not fields["embedding"]]
+        contents = await read_news_sidecar_fields(storage, not_embedded_ids, ["scraped_description"])
+        return embeddings, contents, not_embedded_ids
+
+    # One run_async call for the embeddings, the descriptions and their inline fallbacks
+    embeddings, contents, not_embedded_ids = run_async(read_grouping_fields) if news_docs else ({}, {}, [])
+    print(f"Loaded {len(embeddings) - len(not_embedded_ids)} embeddings and {len(contents)} descriptions from sidecars")
+    
     # Convert documents to processing format
     news_for_grouping = []
     
@@ -190,10 +468,10 @@ def get_news_for_grouping() -> tuple:
         news_item = {
             "id": data["id"],
             "title": data["title"],
-            "scraped_description": data["scraped_description"],
+            "scraped_description": contents.get(doc.id, {}).get("scraped_description"),
             "description": data["description"],
             "source_medium": data["source_medium"],
-            "embedding": data["embedding"] if "embedding" in data else None,
+            "embedding": embeddings[doc.id]["embedding"],
         }
         
         # Add existing group if it has one
@@ -217,10 +495,9 @@ def update_groups_in_firestore(groups_data: list, news_docs: dict) -> tuple:
         tuple: (updated_count, created_count, updated_groups, created_groups) - Numbers and sets of groups
     """
     db = initialize_firebase()
-    batch = db.batch()
+    writer = WritePipeline(db, name="news groups")
     updated_count = 0
     created_count = 0
-    current_batch = 0
     updated_groups = set()
     created_groups = set()
 
@@ -245,8 +522,10 @@ def update_groups_in_firestore(groups_data: list, news_docs: dict) -> tuple:
                 
                 # Only update if the group changed
                 if current_group != group_id:
-                    batch.update(doc_ref, {
-                        "group": group_id
+                    # updated_at lets the cleanup consistency sweep find regrouped news
+                    writer.update(doc_ref, {
+                        "group": group_id,
+                        "updated_at": datetime.now()
                         })
                     # Only add to either updated_groups OR created_groups, not both
                     if current_group is None:
@@ -259,18 +538,8 @@ def update_groups_in_firestore(groups_data: list, news_docs: dict) -> tuple:
                         updated_count += 1
                         if group_id is not None:
                             updated_groups.add(group_id)
-                        
-                    current_batch += 1
-                    
-                    # Handle batch size limit
-                    if current_batch >= 450:
-                        batch.commit()
-                        batch = db.batch()
-                        current_batch = 0
     
-    # Final batch commit if there are pending operations
-    if current_batch > 0:
-        batch.commit()
+    writer.close()
     
     return updated_count, created_count, updated_groups, created_groups
 
@@ -280,9 +549,10 @@ def update_news_with_neutral_scores(sources, neutralization_result, sources_to_u
     """
     try:
         db = initialize_firebase()
-        batch = db.batch()
+        writer = WritePipeline(db, name="neutral scores")
         updated_count = 0
         updated_news_ids = set()
+        updates = {}
         
         # First, create a set of all source IDs that should be unassigned
         sources_to_unassign_set = set()
@@ -292,6 +562,7 @@ def update_news_with_neutral_scores(sources, neutralization_result, sources_to_u
                     sources_to_unassign_set.add(source_id)
         
         source_ratings = neutralization_result.get("source_ratings", [])
+        cached_news = news_cache.get_many(db, [source.get("id") for source in sources])
         for rating in source_ratings:
             source_medium = rating.get("source_medium")
             neutral_score = rating.get("rating")
@@ -301,20 +572,23 @@ def update_news_with_neutral_scores(sources, neutralization_result, sources_to_u
                 if source.get("source_medium") == source_medium:
                     news_id = source.get("id")
                     if news_id and news_id not in sources_to_unassign_set:
-                        news_ref = db.collection('news').document(news_id)
-                        doc = news_ref.get()
-                        if doc.exists:
-                            news_data = doc.to_dict()
-                            if news_data:
-                                # Solo actualizar si la puntuación es diferente
-                                if news_data.get("neutral_score") != neutral_score:
-                                    batch.update(news_ref, {"neutral_score": neutral_score, "updated_at": datetime.now()})
-                                    updated_count += 1
-                                    updated_news_ids.add(news_id)
-        
-        # Commit the batch
-        if updated_count > 0:
-            batch.commit()
+                        news_data = cached_news.get(news_id)
+                        if news_data:
+                            # Solo actualizar si la puntuación es diferente
+                            if news_data.get("neutral_score") != neutral_score:
+                                updates[news_id] = {"neutral_score": neutral_score, "updated_at": datetime.now()}
+                                writer.update(db.collection('news').document(news_id), updates[news_id])
+                                updated_count += 1
+                                updated_news_ids.add(news_id)
+        
+        # Commit the writes and keep the cache in sync with the ones that succeeded
+        failed_paths = writer.close().failed_paths()
+        for news_id, fields in updates.items():
+            if f"news/{news_id}" in failed_paths:
+                updated_count -= 1
+                updated_news_ids.discard(news_id)
+            else:
+                news_cache.apply(news_id, fields)
         
         return updated_count, updated_news_ids
         
@@ -329,7 +603,7 @@ def load_all_news_links_from_medium(medium):
     """
 
     db = initialize_firebase()
-    news_query = db.collection('news').where('source_medium', '==', medium)
+    news_query = db.collection('news').where('source_medium', '==', medium).select(['link'])
     news_docs = list(news_query.stream())
     
     news_links = []
@@ -422,16 +696,24 @@ def store_neutral_news(group, neutralization_result, source_ids, sources_to_unas
 
  
         # Update sources' groups
-        for source_id in source_ids:
-            news_ref = db.collection('news').document(source_id)
-            news_snapshot = news_ref.get()  # Retrieve the document snapshot
-            if news_snapshot.exists:  # Check if the document exists
-                news_data = news_snapshot.to_dict()
-                if news_data.get("group") != group:
-                    # Update only if the group is different
-                    news_ref.update({"group": group, "updated_at": datetime.now()})
-        
-        neutral_news_ref.set(neutral_news_data)
+        member_embeddings = {}
+        group_updates = {}
+        embedding_docs = embedding_cache.get_many(db, source_ids)
+        with WritePipeline(db, name=f"group {group} sources") as writer:
+            for source_id, news_data in news_cache.get_many(db, source_ids).items():
+                if news_data is not None:
+                    # Not migrated news still keep their embedding inline
+                    member_embeddings[source_id] = (embedding_docs.get(source_id) or news_data).get("embedding")
+                    if news_data.get("group") != group:
+                        # Update only if the group is different
+                        group_updates[source_id] = {"group": group, "updated_at": datetime.now()}
+                        writer.update(db.collection('news').document(source_id), group_updates[source_id])
+        failed_paths = writer.report.failed_paths()
+        for source_id, fields in group_updates.items():
+            if f"news/{source_id}" not in failed_paths:
+                news_cache.apply(source_id, fields)
+        
+        write_group_with_summary(db, neutral_news_ref, neutral_news_data, group, member_embeddings)
         return True
         
     except Exception as e:
@@ -459,10 +741,12 @@ def update_existing_neutral_news(group, neutralization_result, source_ids, sourc
         # Initialize neutral_news_ref before any usage
         neutral_news_ref = db.collection('neutral_news').document(str(group))
         
-        image_url, image_medium = get_most_neutral_image(
-            source_ids, 
+        # Delta updates only rate the new media, the members already rated keep their score
+        source_ratings = merge_source_ratings(
+            news_cache.get_many(db, source_ids),
             neutralization_result.get("source_ratings", [])
         )
+        image_url, image_medium = get_most_neutral_image(source_ids, source_ratings)
         
         oldest_pub_date = get_oldest_pub_date(source_ids, db)
         # Convert to standard datetime
@@ -492,16 +776,24 @@ def update_existing_neutral_news(group, neutralization_result, source_ids, sourc
             neutral_news_data["image_medium"] = image_medium
 
         # Update sources' groups
-        for source_id in source_ids:
-            news_ref = db.collection('news').document(source_id)
-            news_snapshot = news_ref.get()  # Retrieve the document snapshot
-            if news_snapshot.exists:
-                news_data = news_snapshot.to_dict()
-                if news_data.get("group") != group:
-                    # Update only if the group is different
-                    news_ref.update({"group": group, "updated_at": datetime.now()})
-        
-        neutral_news_ref.update(neutral_news_data)
+        member_embeddings = {}
+        group_updates = {}
+        embedding_docs = embedding_cache.get_many(db, source_ids)
+        with WritePipeline(db, name=f"group {group} sources") as writer:
+            for source_id, news_data in news_cache.get_many(db, source_ids).items():
+                if news_data is not None:
+                    # Not migrated news still keep their embedding inline
+                    member_embeddings[source_id] = (embedding_docs.get(source_id) or news_data).get("embedding")
+                    if news_data.get("group") != group:
+                        # Update only if the group is different
+                        group_updates[source_id] = {"group": group, "updated_at": datetime.now()}
+                        writer.update(db.collection('news').document(source_id), group_updates[source_id])
+        failed_paths = writer.report.failed_paths()
+        for source_id, fields in group_updates.items():
+            if f"news/{source_id}" not in failed_paths:
+                news_cache.apply(source_id, fields)
+        
+        write_group_with_summary(db, neutral_news_ref, neutral_news_data, group, member_embeddings, update=True)
         return True
         
     except Exception as e:
@@ -510,6 +802,29 @@ def update_existing_neutral_news(group, neutralization_result, source_ids, sourc
         traceback.print_exc()
         return False
     
+def merge_source_ratings(news_docs, source_ratings):
+    """
+    Combine the ratings of a response with the neutral_score already stored on the group's members.
+
+    Args:
+        news_docs: Dict of {news_id: news data} of the members of the group
+        source_ratings: Ratings returned by the model, they win over the stored scores
+
+    Returns:
+        list: One {"source_medium", "rating"} per rated medium
+    """
+    merged = {}
+    for rating in source_ratings:
+        if rating.get("source_medium"):
+            merged[rating["source_medium"]] = rating
+    for data in news_docs.values():
+        if data is None:
+            continue
+        source_medium = data.get("source_medium")
+        if source_medium and source_medium not in merged and data.get("neutral_score") is not None:
+            merged[source_medium] = {"source_medium": source_medium, "rating": data["neutral_score"]}
+    return list(merged.values())
+
 def get_most_neutral_image(source_ids, source_ratings):
     """
     Selecciona la imagen de la noticia más neutral que tenga imagen.
@@ -526,14 +841,12 @@ def get_most_neutral_image(source_ids, source_ratings):
         db = initialize_firebase()
         
         # Obtener las noticias originales
-        news_refs = [db.collection('news').document(news_id) for news_id in source_ids]
-        news_docs = [ref.get() for ref in news_refs]
+        news_docs = news_cache.get_many(db, source_ids)
         
         # Extraer datos de las noticias
         news_data = []
-        for doc in news_docs:
-            if doc.exists:
-                data = doc.to_dict()
+        for data in news_docs.values():
+            if data is not None:
                 news_data.append({
                     "id": data.get("id"),
                     "source_medium": data.get("source_medium"),
@@ -579,12 +892,6 @@ def get_most_neutral_image(source_ids, source_ratings):
         import traceback
         traceback.print_exc()
         return None, None
-        
-    except Exception as e:
-        print(f"Error in get_most_neutral_image: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return None
     
 def normalize_datetime(dt):
     """Convert datetime to naive (remove timezone info) if it has timezone info"""
@@ -630,8 +937,7 @@ def get_oldest_pub_date(source_ids, db):
     """
     pub_dates = []
     cutoff_date = datetime.now() - timedelta(days=3)
-    batch = db.batch()
-    batch_count = 0
+    writer = WritePipeline(db, name="pub dates")
 
     def normalize_datetime(dt):
         """Convert datetime to naive (remove timezone info) if it has timezone info"""
@@ -669,11 +975,10 @@ def get_oldest_pub_date(source_ids, db):
         
         return dt
 
-    for news_id in source_ids:
+    pending_updates = {}
+    for news_id, data in news_cache.get_many(db, source_ids).items():
         try:
-            doc = db.collection("news").document(news_id).get()
-            if doc.exists:
-                data = doc.to_dict()
+            if data is not None:
                 pub_date = data.get("pub_date")
                 created_at = data.get("created_at")
 
@@ -716,12 +1021,8 @@ def get_oldest_pub_date(source_ids, db):
                             second=fixed_date.second,
                             microsecond=fixed_date.microsecond
                         )
-                        batch.update(doc.reference, {"pub_date": standard_fixed_date})
-                        batch_count += 1
-                        if batch_count >= 450:
-                            batch.commit()
-                            batch = db.batch()
-                            batch_count = 0
+                        writer.update(db.collection("news").document(news_id), {"pub_date": standard_fixed_date})
+                        pending_updates[news_id] = {"pub_date": standard_fixed_date}
                     except Exception as e:
                         print(f"Error updating pub_date for {news_id}: {str(e)}")
                         # Print traceback for debugging
@@ -733,13 +1034,11 @@ def get_oldest_pub_date(source_ids, db):
             traceback.print_exc()
             continue
 
-    # Commit any remaining updates
-    if batch_count > 0:
-        try:
-            batch.commit()
-        except Exception as e:
-            print(f"Error committing batch updates: {str(e)}")
-            traceback.print_exc()
+    # Commit the updates and keep the cache in sync with the ones that succeeded
+    failed_paths = writer.close().failed_paths()
+    for updated_id, fields in pending_updates.items():
+        if f"news/{updated_id}" not in failed_paths:
+            news_cache.apply(updated_id, fields)
 
     # Make sure the default is also a normalized datetime
     if not pub_dates:
@@ -760,22 +1059,18 @@ def delete_old_news(hours=72):
     # Get the documents
     old_news_docs = list(old_news_query.stream())
     
-    # Create a batch for deletion
-    batch = db.batch()
-    deleted_count = 0
-    
-    for doc in old_news_docs:
-        batch.delete(doc.reference)
-        deleted_count += 1
-        
-        # Firebase has a limit of 500 operations per batch
-        if deleted_count % 450 == 0:
-            batch.commit()
-            batch = db.batch()
-    
-    # Commit any remaining deletions
-    if deleted_count % 450 != 0:
-        batch.commit()
+    # Delete them through the write pipeline
+    with WritePipeline(db, name="old news") as writer:
+        for doc in old_news_docs:
+            # Deleted together so a failed sidecar delete never leaves an orphaned sidecar
+            writer.write_together([
+                ("delete", doc.reference, None),
+                *(("delete", db.collection(collection_name).document(doc.id), None)
+                  for collection_name in SIDECAR_FIELDS.values()),
+            ])
+    deleted_count = len(old_news_docs) - len({
+        path for path in writer.report.failed_paths() if path.startswith('news/')
+    })
     
     print(f"Deleted {deleted_count} news items older than {hours} hours")
     return deleted_count
@@ -809,107 +1104,225 @@ def is_valid_image_url(url):
 
 def update_news_embedding(news_ids, embeddings):
     """
-    Update the embeddings list of news items in smaller batches.
+    Store the embeddings of news items in their 'news_embeddings' sidecars through the write pipeline.
     """
     db = initialize_firebase()
     if len(news_ids) != len(embeddings):
         print("Error: Mismatch between number of news IDs and embeddings.")
         return 0
 
-    updated_count = 0
-    # Firestore batch limit is 500 operations.
-    # Each update is one operation.
-    # SIGNIFICANTLY REDUCE BATCH SIZE due to large embedding data
-    batch_size = 50 # Start with a much smaller value, e.g., 50, 20, or even 10
-                    # Experiment to find what works.
-
-    for i in range(0, len(news_ids), batch_size):
-        batch = db.batch()
-        # Get the current slice of IDs and embeddings
-        current_news_ids_batch = news_ids[i:i + batch_size]
-        current_embeddings_batch = embeddings[i:i + batch_size]
-        
-        current_batch_operation_count = 0 # To track operations in this specific batch
-
-        for news_id, embedding_list in zip(current_news_ids_batch, current_embeddings_batch):
+    # Embedding arrays are indexed element by element, which makes large batches fail
+    # with "Transaction too big", so keep embedding batches small
+    with WritePipeline(db, name="embeddings", max_operations=50) as writer:
+        for news_id, embedding_list in zip(news_ids, embeddings):
             if not news_id: # Skip if news_id is None or empty
                 print(f"Warning: Skipping update for empty news_id.")
                 continue
-            try:
-                # Ensure embedding_list is not excessively large for a single document
-                # (Firestore document limit is ~1MB)
-                # If individual embeddings are too large, that's a separate issue.
-                news_ref = db.collection('news').document(str(news_id)) # Ensure news_id is a string
-                batch.update(news_ref, {'embedding': embedding_list})
-                current_batch_operation_count +=1
-            except Exception as e:
-                print(f"Error preparing update for news_id {news_id}: {e}")
-                # Optionally, decide if you want to skip this item or halt the batch
-
-        if current_batch_operation_count > 0: # Only commit if there are operations in the batch
-            try:
-                batch.commit()
-                updated_count += current_batch_operation_count 
-                print(f"Successfully committed batch of {current_batch_operation_count} embedding updates. Total updated: {updated_count}")
-            except Exception as e:
-                print(f"Error committing batch (size {current_batch_operation_count}): {e}")
-                # Handle commit error, e.g., log it, retry individual items, or raise
-                # For simplicity, we're just printing here.
-                # You might want to add more sophisticated error handling or retry logic.
-        else:
-            print("Skipping commit for an empty batch.")
-            
-    return updated_count
+            embedding_ref = db.collection(NEWS_EMBEDDINGS_COLLECTION).document(str(news_id)) # Ensure news_id is a string
+            writer.set(embedding_ref, {'embedding': embedding_list})
+
+    return writer.report.succeeded
 
-def get_group_item_count(group_id):
+def compute_centroid(embeddings):
     """
-    Get the count of news items assigned to a specific group in Firestore
-    
+    Compute the normalized mean of a list of embeddings.
+    Each embedding is normalized first so every member weighs the same.
+
+    Returns:
+        list: The centroid as a list of floats, or None if there are no valid embeddings
+    """
+    total = None
+    count = 0
+    for embedding in embeddings:
+        if not embedding:
+            continue
+        norm = sum(value * value for value in embedding) ** 0.5
+        if norm == 0:
+            continue
+        if total is None:
+            total = [0.0] * len(embedding)
+        if len(embedding) != len(total):
+            continue
+        for i, value in enumerate(embedding):
+            total[i] += value / norm
+        count += 1
+
+    if not count:
+        return None
+
+    centroid = [value / count for value in total]
+    norm = sum(value * value for value in centroid) ** 0.5
+    if norm == 0:
+        return None
+    return [value / norm for value in centroid]
+
+def encode_embedding(embedding) -> bytes:
+    """Pack an embedding as little-endian float16 bytes (2 bytes per dimension)"""
+    return struct.pack(f"<{len(embedding)}e", *embedding)
+
+def decode_embedding(data) -> list:
+    """Unpack an embedding packed with encode_embedding"""
+    return list(struct.unpack(f"<{len(data) // 2}e", data))
+
+def build_group_summary(group, member_embeddings):
+    """
+    Build the 'group_summaries' sidecar of a group from the embeddings of its members.
+    Member embeddings are stored as compact float16 bytes keyed by news ID so grouping
+    can rebuild the group without reading the full news documents.
+
     Args:
-        group_id: The group ID to count items for
-        
+        group: The group ID
+        member_embeddings: Dict of {news_id: embedding} for the news currently in the group
+
     Returns:
-        int: The number of news items in the specified group
+        dict: The summary document, or None if no member has a valid embedding
+    """
+    centroid = compute_centroid(member_embeddings.values())
+    if centroid is None:
+        return None
+
+    return {
+        "group": group,
+        "centroid": centroid,
+        "member_count": len(member_embeddings),
+        "member_embeddings": {
+            news_id: encode_embedding(embedding)
+            for news_id, embedding in member_embeddings.items()
+            if embedding and len(embedding) == len(centroid)
+        },
+        "updated_at": datetime.now(),
+    }
+
+def write_group_with_summary(db, neutral_news_ref, neutral_news_data, group, member_embeddings, update=False):
+    """
+    Write a neutral_news document together with its group summary in a single batch,
+    so member_count and centroid on neutral_news never disagree with the sidecar.
+
+    Args:
+        db: Firestore database instance
+        neutral_news_ref: Reference to the neutral_news document
+        neutral_news_data: Fields to write on the neutral_news document
+        group: The group ID
+        member_embeddings: Dict of {news_id: embedding} for the news currently in the group
+        update: Update the neutral_news document instead of overwriting it
+    """
+    summary = build_group_summary(group, member_embeddings)
+    neutral_news_data["member_count"] = len(member_embeddings)
+    if summary:
+        neutral_news_data["centroid"] = summary["centroid"]
+    else:
+        print(f"⚠️ No embeddings available to summarize group {group}")
+
+    operations = [("update" if update else "set", neutral_news_ref, neutral_news_data)]
+    if summary:
+        operations.append(("set", db.collection('group_summaries').document(str(group)), summary))
+
+    with WritePipeline(db, name=f"neutral group {group}") as writer:
+        writer.write_together(operations)
+    if writer.report.failures:
+        raise RuntimeError(f"Could not write neutral_news for group {group}: {writer.report.failures[0].error}")
+
+def remove_group_members(group, source_ids):
+    """
+    Remove sources from a group and keep its member_count, centroid and summary in sync.
+    The neutral_news document and its 'group_summaries' sidecar are updated in one transaction.
+
+    Args:
+        group: The group ID
+        source_ids: IDs of the news to remove from the group
+
+    Returns:
+        bool: True if the transaction committed
     """
     try:
         db = initialize_firebase()
-        news_ref = db.collection('news')
-        
-        # Query for documents with this group ID and count them
-        query = news_ref.where('group', '==', group_id)
-        count = len(list(query.stream()))
-        
-        return count
+        group = int(float(group))
+        removed = set(source_ids)
+        neutral_news_ref = db.collection('neutral_news').document(str(group))
+        summary_ref = db.collection('group_summaries').document(str(group))
+
+        def remove_in_transaction(transaction):
+            neutral_snapshot = neutral_news_ref.get(transaction=transaction)
+            summary_snapshot = summary_ref.get(transaction=transaction)
+            if not neutral_snapshot.exists:
+                return
+
+            remaining_ids = [
+                source_id for source_id in neutral_snapshot.to_dict().get("source_ids", [])
+                if source_id not in removed
+            ]
+            neutral_news_data = {
+                "source_ids": remaining_ids,
+                "member_count": len(remaining_ids),
+            }
+
+            if summary_snapshot.exists:
+                members = summary_snapshot.to_dict().get("member_embeddings", {})
+                remaining = {
+                    news_id: decode_embedding(data)
+                    for news_id, data in members.items()
+                    if news_id not in removed
+                }
+                summary = build_group_summary(group, remaining)
+                if summary:
+                    summary["member_count"] = len(remaining_ids)
+                    neutral_news_data["centroid"] = summary["centroid"]
+                    transaction.set(summary_ref, summary)
+                else:
+                    transaction.delete(summary_ref)
+
+            transaction.update(neutral_news_ref, neutral_news_data)
+
+        run_transaction(db, remove_in_transaction)
+        return True
     except Exception as e:
-        print(f"Error counting items in group {group_id}: {str(e)}")
-        return 0
+        print(f"Error removing sources from group {group}: {str(e)}")
+        traceback.print_exc()
+        return False
 
-def get_group_items(group_id):
+def get_group_summaries(group_ids, include_members=False) -> dict:
     """
-    Get all news items assigned to a specific group from Firestore
-    
+    Get the persisted centroid and member count of the given groups
+
     Args:
-        group_id: The group ID to get items for
-        
+        group_ids: Iterable of group IDs
+        include_members: Also return the member embeddings of each group
+
     Returns:
-        list: List of dictionaries containing news items
+        dict: {group_id: {"centroid": list, "member_count": int, "updated_at": datetime}} for the groups
+              that have a summary. With include_members, each summary also has "members": {news_id: embedding}
     """
+    group_ids = {int(float(group_id)) for group_id in group_ids if group_id is not None}
+    if not group_ids:
+        return {}
+
     try:
         db = initialize_firebase()
-        news_ref = db.collection('news')
-        
-        # Query for documents with this group ID
-        query = news_ref.where('group', '==', group_id)
-        docs = list(query.stream())
-        
-        # Convert to list of dictionaries with embeddings
-        items = []
-        for doc in docs:
-            item = doc.to_dict()
-            item['id'] = doc.id
-            items.append(item)
-            
-        return items
+        refs = [db.collection('group_summaries').document(str(group_id)) for group_id in group_ids]
+        field_paths = ["group", "centroid", "member_count", "updated_at"]
+        if include_members:
+            field_paths.append("member_embeddings")
+
+        summaries = {}
+        for doc in db.get_all(refs, field_paths=field_paths):
+            if not doc.exists:
+                continue
+            data = doc.to_dict()
+            if data.get("centroid") and data.get("group") is not None:
+                summary = {
+                    "centroid": data["centroid"],
+                    "member_count": data.get("member_count", 0),
+                    "updated_at": data.get("updated_at"),
+                }
+                if include_members:
+                    summary["members"] = {
+                        news_id: decode_embedding(embedding)
+                        for news_id, embedding in data.get("member_embeddings", {}).items()
+                    }
+                summaries[int(data["group"])] = summary
+
+        print(f"Loaded {len(summaries)} group summaries for {len(group_ids)} groups")
+        return summaries
     except Exception as e:
-        print(f"Error retrieving items in group {group_id}: {str(e)}")
-        return []
\ No newline at end of file
+        print(f"Error retrieving group summaries: {str(e)}")
+        return {}
@@ -0,0 +1,279 @@
+import os
+import time
+import hashlib
+import tempfile
+import traceback
+import numpy as np
+
+INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(tempfile.gettempdir(), "neutral_news_index"))
+INDEX_MAX_AGE_HOURS = 24  # Indexes older than this are rebuilt from Firestore
+
+class VectorIndex:
+    """
+    Approximate nearest-neighbour index (IVF) over normalized embeddings.
+
+    Vectors are bucketed by their nearest coarse centroid and a search only scans
+    the n_probe closest buckets. Below exact_threshold vectors the index is searched
+    exhaustively, which is both exact and faster for small collections.
+    Supports incremental add/remove and persistence to a local .npz file.
+    Each entry carries a weight (how many vectors it summarizes), e.g. the member
+    count of a group centroid.
+    """
+
+    def __init__(self, dim, n_probe=8, exact_threshold=2048, seed=42):
+        self.dim = dim
+        self.n_probe = n_probe
+        self.exact_threshold = exact_threshold
+        self.seed = seed
+        self.keys = []
+        self.key_to_row = {}
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.added_at = np.zeros(0, dtype=np.float64)
+        self.weights = np.zeros(0, dtype=np.float64)
+        self.coarse_centroids = None
+        self.list_ids = np.zeros(0, dtype=np.int32)
+        self.trained_size = 0
+        self.built_at = time.time()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return str(key) in self.key_to_row
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1e-10
+        return vectors / norms
+
+    def add(self, keys, vectors, weights=None):
+        """Add or replace vectors. Existing keys are overwritten."""
+        keys = [str(key) for key in keys]
+        if not keys:
+            return
+        vectors = self._normalize(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+
+        self.remove([key for key in keys if key in self.key_to_row])
+
+        start = len(self.keys)
+        self.keys.extend(keys)
+        for offset, key in enumerate(keys):
+            self.key_to_row[key] = start + offset
+        self.vectors = np.vstack([self.vectors, vectors])
+        self.added_at = np.concatenate([self.added_at, np.full(len(keys), time.time())])
+        weights = np.ones(len(keys)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.weights = np.concatenate([self.weights, weights])
+        self.list_ids = np.concatenate([self.list_ids, self._assign_lists(vectors)])
+
+        # Retrain the coarse quantizer once the index has doubled since the last training
+        if len(self.keys) > self.exact_threshold and len(self.keys) >= 2 * max(self.trained_size, 1):
+            self.train()
+
+    def remove(self, keys):
+        """Remove vectors by key. Unknown keys are ignored."""
+        rows = [self.key_to_row[str(key)] for key in keys if str(key) in self.key_to_row]
+        if not rows:
+            return
+        keep = np.ones(len(self.keys), dtype=bool)
+        keep[rows] = False
+        self.keys = [key for key, kept in zip(self.keys, keep) if kept]
+        self.key_to_row = {key: row for row, key in enumerate(self.keys)}
+        self.vectors = self.vectors[keep]
+        self.added_at = self.added_at[keep]
+        self.weights = self.weights[keep]
+        self.list_ids = self.list_ids[keep]
+
+    def weight(self, key):
+        """Return the weight of an entry, or 0 if the key is unknown."""
+        row = self.key_to_row.get(str(key))
+        return 0 if row is None else self.weights[row]
+
+    def added(self, key):
+        """Return when an entry was added or last replaced (epoch seconds), or None if the key is unknown."""
+        row = self.key_to_row.get(str(key))
+        return None if row is None else self.added_at[row]
+
+    def get(self, key):
+        """Return the stored normalized vector for a key, or None."""
+        row = self.key_to_row.get(str(key))
+        return None if row is None else self.vectors[row]
+
+    def train(self, iterations=10):
+        """Fit the coarse quantizer with spherical k-means and reassign every vector."""
+        n = len(self.keys)
+        if n <= self.exact_threshold:
+            self.coarse_centroids = None
+            self.list_ids = np.zeros(n, dtype=np.int32)
+            return
+
+        n_lists = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(self.seed)
+        centroids = self.vectors[rng.choice(n, size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = (self.vectors @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, self.vectors)
+            counts = np.bincount(assignments, minlength=n_lists)
+            empty = counts == 0
+            sums[empty] = centroids[empty]  # Keep empty lists where they were
+            centroids = self._normalize(sums)
+
+        self.coarse_centroids = centroids
+        self.list_ids = self._assign_lists(self.vectors)
+        self.trained_size = n
+
+    def _assign_lists(self, vectors):
+        if self.coarse_centroids is None:
+            return np.zeros(len(vectors), dtype=np.int32)
+        return (vectors @ self.coarse_centroids.T).argmax(axis=1).astype(np.int32)
+
+    def _candidate_rows(self, query):
+        if self.coarse_centroids is None:
+            return None
+        n_probe = min(self.n_probe, len(self.coarse_centroids))
+        probes = np.argpartition(-(self.coarse_centroids @ query), n_probe - 1)[:n_probe]
+        return np.flatnonzero(np.isin(self.list_ids, probes))
+
+    def search(self, queries, k=5):
+        """
+        Find the k most similar stored vectors for each query.
+        Returns tuple of (keys, similarities): a list of key lists and a list of
+        similarity arrays, both sorted by decreasing similarity.
+        """
+        queries = self._normalize(queries)
+        result_keys, result_sims = [], []
+        if not self.keys:
+            return [[] for _ in queries], [np.zeros(0) for _ in queries]
+
+        exhaustive = self.coarse_centroids is None
+        all_sims = queries @ self.vectors.T if exhaustive else None
+        for i, query in enumerate(queries):
+            if exhaustive:
+                rows = np.arange(len(self.keys))
+                sims = all_sims[i]
+            else:
+                rows = self._candidate_rows(query)
+                sims = self.vectors[rows] @ query
+            top_k = min(k, len(rows))
+            if top_k == 0:
+                result_keys.append([])
+                result_sims.append(np.zeros(0))
+                continue
+            top = np.argpartition(-sims, top_k - 1)[:top_k]
+            top = top[np.argsort(-sims[top], kind="stable")]
+            result_keys.append([self.keys[rows[j]] for j in top])
+            result_sims.append(sims[top])
+        return result_keys, result_sims
+
+    def kneighbors_graph(self, n_neighbors):
+        """
+        Sparse cosine-distance kNN graph over the stored vectors, in row order.
+        Each row includes the item itself at distance 0, like sklearn's kneighbors_graph(X).
+        """
+        from scipy.sparse import csr_matrix
+
+        n = len(self.keys)
+        n_neighbors = min(n_neighbors, n)
+        neighbor_keys, neighbor_sims = self.search(self.vectors, k=n_neighbors)
+        indptr, indices, distances = [0], [], []
+        for row, (keys, sims) in enumerate(zip(neighbor_keys, neighbor_sims)):
+            # Entries stay sorted by distance within each row, as DBSCAN expects
+            for key, sim in zip(keys, sims):
+                col = self.key_to_row[key]
+                indices.append(col)
+                distances.append(0.0 if col == row else max(0.0, 1.0 - float(sim)))
+            indptr.append(len(indices))
+        return csr_matrix((distances, indices, indptr), shape=(n, n))
+
+    def save(self, path):
+        """Persist the index atomically to a local .npz file."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            keys=np.array(self.keys, dtype=str),
+            vectors=self.vectors,
+            added_at=self.added_at,
+            weights=self.weights,
+            coarse_centroids=self.coarse_centroids if self.coarse_centroids is not None else np.zeros((0, self.dim), dtype=np.float32),
+            list_ids=self.list_ids,
+            meta=np.array([self.dim, self.n_probe, self.exact_threshold, self.trained_size, self.built_at], dtype=np.float64),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load an index saved with save(). Returns None if the file is missing or unreadable."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                dim, n_probe, exact_threshold, trained_size, built_at = data["meta"].tolist()
+                index = cls(int(dim), n_probe=int(n_probe), exact_threshold=int(exact_threshold))
+                index.keys = data["keys"].tolist()
+                index.key_to_row = {key: row for row, key in enumerate(index.keys)}
+                index.vectors = data["vectors"].astype(np.float32)
+                index.added_at = data["added_at"]
+                index.weights = data["weights"]
+                index.list_ids = data["list_ids"].astype(np.int32)
+                index.coarse_centroids = data["coarse_centroids"] if len(data["coarse_centroids"]) else None
+                index.trained_size = int(trained_size)
+                index.built_at = built_at
+            return index
+        except Exception as e:
+            print(f"⚠️ Could not load vector index from {path}: {str(e)}")
+            traceback.print_exc()
+            return None
+
+def index_scope():
+    """
+    Identify the database the persisted indexes are built from, so an index saved
+    for one project or local backend is never loaded against another.
+    """
+    backend = os.getenv("STORAGE_BACKEND", "firestore").lower()
+    if backend == "firestore":
+        source = os.getenv("FIRESTORE_EMULATOR_HOST") or os.getenv("GOOGLE_CLOUD_PROJECT") or os.getenv("GCLOUD_PROJECT") or "default"
+    elif backend == "sqlite":
+        source = os.path.abspath(os.getenv("SQLITE_STORAGE_PATH", "neutral_news_local.db"))
+    else:
+        # The in-memory backend only lives as long as the process
+        source = f"pid-{os.getpid()}"
+    return f"{backend}-{hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]}"
+
+def index_path(name):
+    """Local file path of a named persisted index, under the directory of the current database."""
+    return os.path.join(INDEX_DIR, index_scope(), f"{name}.npz")
+
+def load_index(name, dim):
+    """
+    Load a persisted index by name.
+    Returns None when it is missing, has another dimension or is older than
+    INDEX_MAX_AGE_HOURS, so the caller rebuilds it from Firestore.
+    """
+    index = VectorIndex.load(index_path(name))
+    if index is None:
+        print(f"ℹ️ No persisted '{name}' index found. It will be rebuilt from Firestore.")
+        return None
+    if index.dim != dim:
+        print(f"ℹ️ Persisted '{name}' index has dimension {index.dim}, expected {dim}. Rebuilding.")
+        return None
+    if time.time() - index.built_at > INDEX_MAX_AGE_HOURS * 3600:
+        print(f"ℹ️ Persisted '{name}' index is older than {INDEX_MAX_AGE_HOURS} hours. Rebuilding.")
+        return None
+    print(f"ℹ️ Loaded '{name}' index with {len(index)} vectors")
+    return index
+
+def save_index(name, index):
+    """Persist a named index, logging instead of failing the run on errors."""
+    try:
+        index.save(index_path(name))
+        return True
+    except Exception as e:
+        print(f"⚠️ Could not save '{name}' index: {str(e)}")
+        return False
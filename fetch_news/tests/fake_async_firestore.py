@@ -0,0 +1,88 @@
+import asyncio
+import operator
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+}
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+class FakeDocumentReference:
+    def __init__(self, db, collection_name, doc_id):
+        self.db = db
+        self.collection_name = collection_name
+        self.id = doc_id
+        self.path = f"{collection_name}/{doc_id}"
+
+class FakeQuery:
+    def __init__(self, db, collection_name, filters=(), fields=None):
+        self.db = db
+        self.collection_name = collection_name
+        self.filters = list(filters)
+        self.fields = fields
+
+    def where(self, field, op, value):
+        return FakeQuery(self.db, self.collection_name, self.filters + [(field, op, value)], self.fields)
+
+    def select(self, fields):
+        return FakeQuery(self.db, self.collection_name, self.filters, list(fields))
+
+    def document(self, doc_id):
+        return FakeDocumentReference(self.db, self.collection_name, doc_id)
+
+    async def stream(self):
+        self.db.check_loop()
+        self.db.queries += 1
+        for doc_id, data in list(self.db.data.get(self.collection_name, {}).items()):
+            if all(field in data and OPERATORS[op](data[field], value) for field, op, value in self.filters):
+                if self.fields is not None:
+                    data = {field: data[field] for field in self.fields if field in data}
+                yield FakeSnapshot(doc_id, data)
+
+class FakeAsyncFirestore:
+    """In-memory stand-in for firestore.AsyncClient covering what AsyncStorage uses"""
+
+    def __init__(self, data=None):
+        self.data = data or {}
+        self.queries = 0
+
+    def collection(self, name):
+        return FakeQuery(self, name)
+
+    def check_loop(self):
+        pass
+
+    async def get_all(self, refs, field_paths=None):
+        self.check_loop()
+        for ref in refs:
+            data = self.data.get(ref.collection_name, {}).get(ref.id)
+            if data is not None and field_paths is not None:
+                data = {field: data[field] for field in field_paths if field in data}
+            yield FakeSnapshot(ref.id, data)
+
+class LoopBoundFakeAsyncFirestore(FakeAsyncFirestore):
+    """Fake whose channel is bound to the first event loop it is used on, like grpc.aio"""
+
+    def __init__(self, data=None):
+        super().__init__(data)
+        self.loop = None
+
+    def check_loop(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif self.loop is not loop:
+            raise RuntimeError("Event loop is closed")
@@ -0,0 +1,47 @@
+import asyncio
+from functions.fetch_news.src.async_storage import run_async
+from functions.fetch_news.tests.fake_async_firestore import FakeAsyncFirestore, LoopBoundFakeAsyncFirestore
+
+def make_db():
+    news = {f"n{i}": {"group": i % 35, "title": f"Title {i}", "embedding": [0.1] * 3} for i in range(70)}
+    news["other"] = {"group": 99, "title": "Other", "source_medium": "medium"}
+    return FakeAsyncFirestore({
+        "news": news,
+        "neutral_news": {"1": {"group": 1, "source_ids": ["n1", "n36"]}},
+    })
+
+def test_get_news_by_groups_runs_batched_in_queries():
+    db = make_db()
+
+    result = run_async(lambda storage: storage.get_news_by_groups(range(35), ["title"]), db=db)
+
+    # 35 groups need two 'in' queries and only the projected fields come back
+    assert db.queries == 2
+    assert len(result) == 35
+    assert sorted(news["id"] for news in result[1]) == ["n1", "n36"]
+    assert set(result[1][0]) == {"group", "title", "id"}
+
+def test_get_documents_and_neutral_news():
+    db = make_db()
+
+    async def operation(storage):
+        return await asyncio.gather(
+            storage.get_documents("news", ["n1", "missing"]),
+            storage.get_neutral_news_by_groups([1, 2]),
+        )
+
+    documents, neutral_news = run_async(operation, max_concurrency=1, db=db)
+
+    assert documents["n1"]["title"] == "Title 1"
+    assert documents["missing"] is None
+    assert neutral_news == {1: {"group": 1, "source_ids": ["n1", "n36"]}}
+
+def test_run_async_reuses_a_loop_bound_client():
+    db = LoopBoundFakeAsyncFirestore({"news": {"n1": {"title": "Title 1"}}})
+
+    # The cached AsyncClient is bound to the loop of its first call, later calls must run on it too
+    first = run_async(lambda storage: storage.get_documents("news", ["n1"]), db=db)
+    second = run_async(lambda storage: storage.query("news", []), db=db)
+
+    assert first["n1"]["title"] == "Title 1"
+    assert second == [{"title": "Title 1", "id": "n1"}]
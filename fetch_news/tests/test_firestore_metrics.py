@@ -0,0 +1,59 @@
+from functions.fetch_news.src.firestore_metrics import FirestoreMetrics, instrument, metrics
+from functions.fetch_news.src.local_backends import InMemoryFirestore
+from functions.fetch_news.src.write_pipeline import WritePipeline
+
+def load_news(db):
+    return list(db.collection('news').where('group', '==', 1).stream())
+
+def store_news(db):
+    with WritePipeline(db, name="news", max_operations=2) as writer:
+        for i in range(3):
+            writer.set(db.collection('news').document(str(i)), {"group": 1, "title": f"t{i}"})
+
+def test_metrics_by_call_site_and_stage():
+    # WritePipeline attributes its batches through the shared registry
+    registry = metrics
+    registry.reset()
+    db = instrument(InMemoryFirestore())
+
+    with registry.stage("store"):
+        store_news(db)
+    with registry.stage("load"):
+        docs = load_news(db)
+        db.collection('news').document('missing').get()
+
+    assert len(docs) == 3
+    by_call_site = registry.totals(by="call_site")
+    # Batches committed on the pipeline threads are attributed to the code that buffered them
+    assert by_call_site["test_firestore_metrics.py:store_news"].writes == 3
+    assert by_call_site["test_firestore_metrics.py:store_news"].bytes_written > 0
+    assert by_call_site["test_firestore_metrics.py:load_news"].queries == 1
+    assert by_call_site["test_firestore_metrics.py:load_news"].reads == 3
+
+    by_stage = registry.totals(by="stage")
+    assert by_stage["store"].writes == 3
+    assert by_stage["load"].reads == 4
+
+    report = registry.report("test_run")
+    assert report["total"]["reads"] == 4
+    assert report["total"]["writes"] == 3
+    assert report["total"]["estimated_cost_usd"] > 0
+
+def test_metrics_count_empty_queries_and_transactions():
+    registry = FirestoreMetrics()
+    db = instrument(InMemoryFirestore(), registry)
+    counter_ref = db.collection('counters').document('group_ids')
+
+    def reserve(transaction):
+        snapshot = counter_ref.get(transaction=transaction)
+        transaction.set(counter_ref, {"next_id": 10})
+        return snapshot.exists
+
+    assert db.run_in_transaction(reserve) is False
+    assert list(db.collection('news').where('group', '==', 1).stream()) == []
+
+    total = registry.totals()
+    # An empty query is billed one read
+    assert total.reads == 2
+    assert total.queries == 1
+    assert total.writes == 1
@@ -2,7 +2,10 @@ import pytest
 from unittest.mock import patch, MagicMock
 import pandas as pd
 import numpy as np
-from functions.fetch_news.src.grouping import group_news, get_news_not_embedded, extract_titles_and_descriptions
+from datetime import datetime, timedelta
+from functions.fetch_news.src.grouping import group_news, get_news_not_embedded, extract_titles_and_descriptions, assign_to_existing_groups, assign_group_ids, load_group_centroid_index, process_results, GroupIdAllocator
+from functions.fetch_news.src.vector_index import VectorIndex
+from functions.fetch_news.src.local_backends import InMemoryFirestore
 
 @patch("functions.fetch_news.src.grouping.get_sentence_transformer_model")
 @patch("functions.fetch_news.src.grouping.update_news_embedding")
@@ -66,3 +69,112 @@ def test_extract_titles_and_descriptions():
     assert isinstance(descriptions, pd.Series)
     assert titles.tolist() == ["Title 1", "Title 2", "Title 3"]
     assert descriptions.tolist() == ["Description 1", "Fallback Description 2", ""]
+
+@patch("functions.fetch_news.src.grouping.save_index")
+@patch("functions.fetch_news.src.grouping.load_index", return_value=None)
+@patch("functions.fetch_news.src.grouping.get_group_summaries")
+def test_assign_to_existing_groups(mock_get_group_summaries, mock_load_index, mock_save_index):
+    # Group 7 has a persisted centroid pointing along the first axis
+    mock_get_group_summaries.return_value = {7: {"centroid": [1.0, 0.0, 0.0], "member_count": 3}}
+
+    df = pd.DataFrame([
+        {"id": "ref", "existing_group": 7, "is_reference": True, "group": 7},
+        {"id": "close", "existing_group": None, "is_reference": False, "group": None},
+        {"id": "far", "existing_group": None, "is_reference": False, "group": None},
+    ])
+    embeddings_norm = np.array([
+        [1.0, 0.0, 0.0],
+        [0.99, 0.14, 0.0],
+        [0.0, 0.0, 1.0],
+    ])
+
+    # Call the function
+    leftovers_df, leftover_embeddings = assign_to_existing_groups(df, df.copy(), embeddings_norm)
+
+    # Assertions
+    assert df.loc[df["id"] == "close", "group"].iloc[0] == 7
+    assert pd.isna(df.loc[df["id"] == "far", "group"].iloc[0])
+    assert leftovers_df["id"].tolist() == ["far"]
+    assert leftover_embeddings.shape == (1, 3)
+
+@patch("functions.fetch_news.src.grouping.save_index")
+@patch("functions.fetch_news.src.grouping.load_index")
+@patch("functions.fetch_news.src.grouping.get_group_summaries")
+def test_load_group_centroid_index_refreshes_changed_groups(mock_get_group_summaries, mock_load_index, mock_save_index):
+    # The persisted index has groups 1 and 2 from an earlier run and group 9 that is no longer active
+    persisted = VectorIndex(dim=2)
+    persisted.add([1, 2, 9], [[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]], weights=[3, 4, 5])
+    mock_load_index.return_value = persisted
+    mock_get_group_summaries.return_value = {
+        1: {"centroid": [0.0, 1.0], "member_count": 3, "updated_at": datetime.now() - timedelta(days=1)},
+        2: {"centroid": [0.0, 1.0], "member_count": 6, "updated_at": datetime.now() - timedelta(days=1)},
+    }
+    df = pd.DataFrame([
+        {"id": "a", "existing_group": 1, "is_reference": True},
+        {"id": "b", "existing_group": 2, "is_reference": True},
+        {"id": "c", "existing_group": 3, "is_reference": True},
+    ])
+
+    # Call the function
+    index = load_group_centroid_index(df, np.array([[1.0, 0.0], [1.0, 0.0], [0.6, 0.8]]))
+
+    # Unchanged group 1 keeps its entry, group 2 gained members, group 3 has no summary yet
+    assert sorted(index.keys) == ["1", "2", "3"]
+    assert np.allclose(index.get(1), [1.0, 0.0])
+    assert np.allclose(index.get(2), [0.0, 1.0]) and index.weight(2) == 6
+    assert np.allclose(index.get(3), [0.6, 0.8]) and index.weight(3) == 1
+
+@patch("functions.fetch_news.src.grouping.reserve_group_ids", return_value=range(100, 110))
+@patch("functions.fetch_news.src.grouping.get_group_summaries")
+def test_assign_group_ids_skips_reference_path_when_references_were_not_clustered(mock_get_group_summaries, mock_reserve_group_ids):
+    # Incremental mode: the reference was matched by centroid, only new items were clustered
+    df = pd.DataFrame([
+        {"id": "ref", "existing_group": 7.0, "is_reference": True, "group": 7.0, "temp_group": np.nan},
+        {"id": "a", "existing_group": np.nan, "is_reference": False, "group": None, "temp_group": 0},
+        {"id": "b", "existing_group": np.nan, "is_reference": False, "group": None, "temp_group": 0},
+        {"id": "c", "existing_group": np.nan, "is_reference": False, "group": None, "temp_group": -1},
+    ])
+
+    # Call the function
+    assign_group_ids(df, has_reference_news=True)
+
+    # Assertions
+    mock_get_group_summaries.assert_not_called()
+    groups = df.set_index("id")["group"]
+    assert groups[["ref", "a", "b"]].tolist() == [7, 100, 100]
+    assert pd.isna(groups["c"])
+
+@patch("functions.fetch_news.src.storage.initialize_firebase")
+def test_group_id_allocator_reserves_blocks_as_needed(mock_initialize_firebase):
+    db = InMemoryFirestore({"counters": {"group_ids": {"next_id": 10}}})
+    mock_initialize_firebase.return_value = db
+    allocator = GroupIdAllocator(block_size=2)
+
+    # Call the function
+    ids = [allocator.next_id() for _ in range(5)]
+
+    # Consecutive IDs from three blocks of two, the last ID of the third block is left unused
+    assert ids == [10, 11, 12, 13, 14]
+    assert db.collection("counters").document("group_ids").get().to_dict()["next_id"] == 16
+    # Another run (or a concurrent one) continues after the reserved blocks
+    assert GroupIdAllocator(block_size=2).next_id() == 16
+
+def test_process_results_deduplicates_media_and_dissolves_small_groups():
+    df = pd.DataFrame([
+        {"id": "1", "group": 1, "title": "T1", "scraped_description": "D1", "description": "", "source_medium": "a", "is_reference": False},
+        {"id": "2", "group": 1, "title": "T2", "scraped_description": "D2", "description": "", "source_medium": "a", "is_reference": False},
+        {"id": "3", "group": 1, "title": "T3", "scraped_description": "D3", "description": "", "source_medium": "b", "is_reference": False},
+        {"id": "4", "group": 1, "title": "T4", "scraped_description": "D4", "description": "", "source_medium": "c", "is_reference": False},
+        {"id": "5", "group": 2, "title": "T5", "scraped_description": "D5", "description": "", "source_medium": "a", "is_reference": False},
+        {"id": "6", "group": None, "title": "T6", "scraped_description": "D6", "description": "", "source_medium": "d", "is_reference": False},
+    ])
+
+    # Call the function
+    result = process_results(df)
+
+    # Assertions
+    assert [item["id"] for item in result] == ["1", "3", "4", "5", "2", "6"]
+    groups = {item["id"]: item["group"] for item in result}
+    assert groups["1"] == groups["3"] == groups["4"] == 1
+    assert groups["5"] is None  # Single item groups are dissolved
+    assert groups["2"] == 1  # Duplicate medium keeps its group but is emitted last
@@ -0,0 +1,31 @@
+from unittest.mock import patch
+from functions.fetch_news.src.local_backends import InMemoryFirestore
+from functions.fetch_news.src.llm_cache import ResponseCache, LLM_CACHE_COLLECTION
+
+def test_key_ignores_whitespace_but_not_content():
+    key = ResponseCache.key("gpt-4o-mini", "  Eres un analista\n  imparcial ", "Fuente 1: A\nTitular: T\n\n")
+
+    assert key == ResponseCache.key("gpt-4o-mini", "Eres un analista imparcial", "Fuente 1: A Titular: T")
+    assert key != ResponseCache.key("gpt-4o", "Eres un analista imparcial", "Fuente 1: A Titular: T")
+    assert key != ResponseCache.key("gpt-4o-mini", "Eres un analista imparcial", "Fuente 1: B Titular: T")
+
+@patch("functions.fetch_news.src.llm_cache.initialize_firebase")
+def test_cache_round_trip_and_stats(mock_initialize_firebase):
+    db = InMemoryFirestore()
+    mock_initialize_firebase.return_value = db
+    cache = ResponseCache()
+    key = cache.key("gpt-4o-mini", "system", "sources")
+
+    assert cache.get(key) is None
+    cache.put(key, "gpt-4o-mini", {"neutral_title": "T", "source_ratings": [{"source_medium": "A", "rating": 80}]}, 1200)
+
+    # A fresh cache (another run) finds the entry in Firestore, then in memory
+    cache = ResponseCache()
+    first = cache.get(key)
+    first["source_ratings"].append({"source_medium": "B", "rating": 10})
+    second = cache.get(key)
+
+    assert second == {"neutral_title": "T", "source_ratings": [{"source_medium": "A", "rating": 80}]}
+    assert (cache.hits, cache.misses, cache.tokens_saved) == (2, 0, 2400)
+    assert db.counter.reads == 2  # The miss and the first hit, the second hit came from memory
+    assert db.collection(LLM_CACHE_COLLECTION).document(key).get().to_dict()["total_tokens"] == 1200
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import pytest
+from functions.fetch_news.src.llm_engine import NeutralizationEngine, AdaptiveConcurrency
+from functions.fetch_news.src.rate_limiter import RateLimiter
+
+class FakeCompletions:
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = []
+
+    async def create(self, model, messages, **kwargs):
+        self.calls.append(kwargs)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        message = type("Message", (), {"content": json.dumps({"neutral_title": messages[-1]["content"]})})
+        return type("Response", (), {"choices": [type("Choice", (), {"message": message})]})
+
+class FakeAsyncOpenAI:
+    def __init__(self, delay=0.01):
+        self.chat = type("Chat", (), {"completions": FakeCompletions(delay)})
+
+def test_engine_bounds_requests_in_flight():
+    client = FakeAsyncOpenAI()
+
+    async def run():
+        async with NeutralizationEngine(client=client, max_concurrency=3, limiter=RateLimiter()) as engine:
+            responses = await asyncio.gather(*(engine.complete("system", f"group {i}") for i in range(10)))
+            return engine, responses
+
+    engine, responses = asyncio.run(run())
+
+    completions = client.chat.completions
+    assert engine.requests == 10
+    assert completions.max_in_flight == 3
+    assert json.loads(responses[4].choices[0].message.content)["neutral_title"] == "group 4"
+    # Every request carries its own timeout
+    assert all(call["timeout"] == engine.request_timeout for call in completions.calls)
+
+def test_engine_times_out_slow_requests():
+    client = FakeAsyncOpenAI(delay=1)
+
+    async def run():
+        async with NeutralizationEngine(client=client, request_timeout=0.01, limiter=RateLimiter()) as engine:
+            await engine.complete("system", "group")
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+
+class RateLimitError(Exception):
+    status_code = 429
+    response = type("Response", (), {"headers": {"retry-after": "7"}})
+
+class ThrottledCompletions:
+    async def create(self, model, messages, **kwargs):
+        raise RateLimitError("Error code: 429 - rate_limit_exceeded")
+
+def test_engine_pauses_the_limiter_on_429():
+    client = type("Client", (), {"chat": type("Chat", (), {"completions": ThrottledCompletions()})})()
+    limiter = RateLimiter()
+
+    async def run():
+        async with NeutralizationEngine(client=client, limiter=limiter) as engine:
+            await engine.complete("system", "group")
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(run())
+    assert limiter.throttled == 1
+    assert limiter.reserve(10).wait == pytest.approx(7, abs=0.1)
+
+def test_adaptive_concurrency_increases_additively_and_cuts_multiplicatively():
+    async def run():
+        concurrency = AdaptiveConcurrency(initial=4, maximum=8)
+        # A round of healthy responses adds about one slot
+        for _ in range(4):
+            await concurrency.release(await concurrency.acquire(), "success")
+        grown = concurrency.limit
+
+        # Overloads of requests sent in the same round cut the limit only once
+        slots = [await concurrency.acquire() for _ in range(4)]
+        for started in slots:
+            await concurrency.release(started, "overload")
+        return grown, concurrency
+
+    grown, concurrency = asyncio.run(run())
+
+    assert 4.9 < grown < 5.1
+    assert concurrency.limit == pytest.approx(grown / 2)
+    assert concurrency.decreases == 1
+    assert concurrency.in_flight == 0
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from datetime import datetime
+from functions.fetch_news.src.local_backends import InMemoryFirestore, SQLiteFirestore, AsyncLocalFirestore
+from functions.fetch_news.src.write_pipeline import WritePipeline
+from functions.fetch_news.src.async_storage import AsyncStorage
+
+@pytest.fixture(params=["memory", "sqlite"])
+def db(request):
+    return InMemoryFirestore() if request.param == "memory" else SQLiteFirestore(":memory:")
+
+def test_local_backend_documents_and_counters(db):
+    ref = db.collection('news').document('1')
+    ref.set({"title": "A", "pub_date": datetime(2025, 1, 1), "embedding": b"\x00\x01"})
+    ref.set({"group": 3}, merge=True)
+    ref.update({"neutral_score": 80})
+
+    snapshot = ref.get()
+    assert snapshot.exists
+    assert snapshot.to_dict() == {
+        "title": "A", "pub_date": datetime(2025, 1, 1), "embedding": b"\x00\x01", "group": 3, "neutral_score": 80,
+    }
+    assert not db.collection('news').document('2').get().exists
+
+    ref.delete()
+    assert not ref.get().exists
+    assert db.counter.as_dict() == {"reads": 3, "writes": 3, "deletes": 1, "queries": 0}
+
+def test_local_backend_queries(db):
+    for i in range(6):
+        db.collection('news').document(str(i)).set({"group": i % 3, "title": f"t{i}", "link": f"l{i}"})
+    db.counter.reset()
+
+    in_query = db.collection('news').where('group', 'in', [0, 1]).select(['link']).stream()
+    assert sorted(doc.to_dict()["link"] for doc in in_query) == ["l0", "l1", "l3", "l4"]
+
+    top = list(db.collection('news').order_by('group', direction="DESCENDING").limit(1).stream())
+    assert top[0].to_dict()["group"] == 2
+
+    first_page = list(db.collection('news').order_by('__name__').limit(4).stream())
+    second_page = list(db.collection('news').order_by('__name__').limit(4).start_after(first_page[-1]).stream())
+    assert [doc.id for doc in second_page] == ["4", "5"]
+    assert db.counter.queries == 4
+    assert db.counter.reads == 4 + 1 + 4 + 2
+
+def test_local_backend_batches_and_transactions(db):
+    with WritePipeline(db, name="news", max_operations=2) as writer:
+        for i in range(5):
+            writer.set(db.collection('news').document(str(i)), {"title": str(i)})
+    assert writer.report.succeeded == 5
+    assert db.count_documents('news') == 5
+
+    counter_ref = db.collection('counters').document('group_ids')
+
+    def reserve(transaction):
+        snapshot = counter_ref.get(transaction=transaction)
+        next_id = snapshot.to_dict()["next_id"] if snapshot.exists else 1
+        transaction.set(counter_ref, {"next_id": next_id + 10})
+        return next_id
+
+    assert db.run_in_transaction(reserve) == 1
+    assert db.run_in_transaction(reserve) == 11
+
+    # A failing update leaves the whole batch unapplied
+    batch = db.batch()
+    batch.set(db.collection('news').document('new'), {"title": "new"})
+    batch.update(db.collection('news').document('missing'), {"title": "x"})
+    with pytest.raises(KeyError):
+        batch.commit()
+    assert not db.collection('news').document('new').get().exists
+
+def test_async_local_backend_with_async_storage():
+    db = InMemoryFirestore({"news": {"1": {"group": 1, "title": "A"}, "2": {"group": 2, "title": "B"}}})
+
+    async def run():
+        async with AsyncStorage(db=AsyncLocalFirestore(db)) as storage:
+            return await storage.get_news_by_groups([1, 2], ["title"])
+
+    news_by_group = asyncio.run(run())
+    assert [news["title"] for news in news_by_group[1]] == ["A"]
+    assert [news["title"] for news in news_by_group[2]] == ["B"]
@@ -0,0 +1,53 @@
+from functions.fetch_news.src.prompt_builder import (
+    allocate_budget,
+    build_sources_text,
+    clean_paragraphs,
+    lead_text,
+)
+from functions.fetch_news.src.rate_limiter import estimate_tokens
+
+def test_clean_paragraphs_drops_boilerplate_fragments_and_repeats():
+    text = (
+        "El Gobierno aprobó hoy la reforma tras meses de negociación.\n\n"
+        "Por Redacción\n"
+        "Lee también: otras noticias de la jornada parlamentaria\n"
+        "La oposición anunció que recurrirá la norma ante el Constitucional.\n"
+        "El Gobierno aprobó hoy la reforma tras meses de negociación.\n"
+        "Suscríbete a nuestra newsletter para recibir las noticias del día"
+    )
+
+    assert clean_paragraphs(text) == [
+        "El Gobierno aprobó hoy la reforma tras meses de negociación.",
+        "La oposición anunció que recurrirá la norma ante el Constitucional.",
+    ]
+
+def test_lead_text_keeps_whole_sentences():
+    paragraphs = ["Primera frase del párrafo inicial. Segunda frase bastante más larga que la primera.", "Otro párrafo."]
+
+    assert lead_text(paragraphs, 100) == "\n".join(paragraphs)
+    assert lead_text(paragraphs, 10) == "Primera frase del párrafo inicial."
+
+def test_allocate_budget_is_max_min_fair():
+    allocation = allocate_budget({"a": 100, "b": 1000, "c": 5000}, 3000)
+
+    # The small source gets all it needs, the others share what is left
+    assert allocation == {"a": 100, "b": 1000, "c": 1900}
+
+def test_build_sources_text_fits_the_budget_and_keeps_titles():
+    sources = [
+        {"source_medium": f"Medio {i}", "title": f"Titular {i}",
+         "scraped_description": "\n".join(f"Párrafo {j} de la fuente {i} con bastante texto para ocupar tokens." for j in range(200))}
+        for i in range(10)
+    ]
+    sources.append({"source_medium": "Breve", "title": "Titular breve", "scraped_description": "Una noticia corta con pocas palabras."})
+
+    sources_text, stats = build_sources_text(sources, token_budget=4000)
+
+    assert estimate_tokens(sources_text) <= 4000
+    assert stats["trimmed"] == 10
+    assert all(f"Titular {i}" in sources_text for i in range(10))
+    assert "Una noticia corta con pocas palabras." in sources_text
+    # Lead paragraphs are kept first
+    assert "Párrafo 0 de la fuente 3" in sources_text
+    assert "Párrafo 199 de la fuente 3" not in sources_text
+    assert sources[0]["scraped_description"].count("\n") == 199
@@ -0,0 +1,40 @@
+import pytest
+from functions.fetch_news.src.rate_limiter import RateLimiter, parse_reset
+
+def test_reservations_wait_behind_each_other():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+
+    first = limiter.reserve(6000)
+    second = limiter.reserve(3000)
+    third = limiter.reserve(10)
+
+    # The first takes the whole token budget, the next ones wait for it to refill at 100 tokens/s
+    assert first.wait == 0
+    assert second.wait == pytest.approx(30, abs=0.1)
+    assert third.wait == pytest.approx(30.1, abs=0.1)
+
+def test_reconcile_uses_actual_usage_and_headers():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+
+    reservation = limiter.reserve(6000)
+    limiter.reconcile(reservation, used_tokens=1000, headers={
+        "x-ratelimit-limit-tokens": "12000",
+        "x-ratelimit-remaining-requests": "10",
+    })
+
+    # 5000 unused tokens are given back and the provider's limits are adopted
+    assert limiter.tokens_per_minute == 12000
+    assert limiter.tokens_available == pytest.approx(5000, abs=10)
+    assert limiter.requests_available == 10
+    assert limiter.reserve(5000).wait == 0
+
+def test_penalize_pauses_for_the_requested_time():
+    limiter = RateLimiter()
+
+    limiter.penalize({"x-ratelimit-reset-requests": "1s", "x-ratelimit-reset-tokens": "6m0s"})
+
+    assert limiter.reserve(10).wait == pytest.approx(360, abs=0.1)
+    assert limiter.throttled == 1
+    assert parse_reset("20ms") == pytest.approx(0.02)
+    assert parse_reset("2") == 2
+    assert parse_reset("soon") is None
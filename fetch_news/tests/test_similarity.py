@@ -0,0 +1,32 @@
+import pytest
+import numpy as np
+from functions.fetch_news.src.similarity import normalize_rows, mean_pairwise_similarity, cluster_similarity_stats
+
+def test_mean_pairwise_similarity_matches_pairwise_loop():
+    rng = np.random.default_rng(0)
+    embeddings = normalize_rows(rng.normal(size=(12, 16)))
+
+    # Reference pairwise loop
+    similarities = [np.dot(embeddings[i], embeddings[j]) for i in range(12) for j in range(i + 1, 12)]
+
+    # Call the function
+    result = mean_pairwise_similarity(embeddings)
+
+    # Assertions
+    assert result == pytest.approx(np.mean(similarities))
+    assert mean_pairwise_similarity(embeddings[:1]) is None
+
+def test_cluster_similarity_stats():
+    embeddings = normalize_rows([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+    labels = np.array([3, 3, 8])
+
+    # Call the function
+    stats = cluster_similarity_stats(embeddings, labels)
+
+    # Assertions
+    assert stats["labels"].tolist() == [3, 8]
+    assert stats["sizes"].tolist() == [2, 1]
+    assert stats["mean_similarity"][0] == pytest.approx(1.0)
+    assert np.isnan(stats["mean_similarity"][1])
+    assert stats["centroid_distances"][0, 1] == pytest.approx(1.0)
+    assert np.allclose(stats["member_distances"], 0.0)
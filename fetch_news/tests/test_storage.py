@@ -10,8 +10,19 @@ from functions.fetch_news.src.storage import (
     store_neutral_news,
     update_existing_neutral_news,
     get_most_neutral_image,
-    delete_old_news
+    merge_source_ratings,
+    reserve_group_ids,
+    delete_old_news,
+    build_group_summary,
+    decode_embedding,
+    write_group_with_summary,
+    DocumentCache,
+    split_news_document,
+    get_news_sidecar_fields
 )
+from functions.fetch_news.src.async_storage import run_async
+from functions.fetch_news.src.local_backends import InMemoryFirestore
+from functions.fetch_news.tests.fake_async_firestore import FakeAsyncFirestore
 
 @patch("functions.fetch_news.src.storage.initialize_firebase")
 def test_store_news_in_firestore(mock_initialize_firebase):
@@ -111,4 +122,98 @@ def test_delete_old_news(mock_initialize_firebase):
     # Assertions
     assert result == 10
     mock_batch.delete.assert_called()
-    mock_batch.commit.assert_called()
\ No newline at end of file
+    mock_batch.commit.assert_called()
+
+def test_build_group_summary():
+    summary = build_group_summary(7, {"a": [1.0, 0.0], "b": [0.0, 1.0], "c": None})
+
+    assert summary["group"] == 7
+    assert summary["member_count"] == 3
+    assert summary["centroid"] == pytest.approx([2 ** -0.5, 2 ** -0.5])
+    assert set(summary["member_embeddings"]) == {"a", "b"}
+    assert decode_embedding(summary["member_embeddings"]["a"]) == [1.0, 0.0]
+
+def test_write_group_with_summary():
+    mock_db = MagicMock()
+    mock_batch = MagicMock()
+    mock_db.batch.return_value = mock_batch
+    neutral_news_ref = MagicMock()
+    neutral_news_data = {"group": 7}
+
+    write_group_with_summary(mock_db, neutral_news_ref, neutral_news_data, 7, {"a": [1.0, 0.0], "b": [1.0, 0.0]})
+
+    # The neutral_news document and its summary are committed together
+    assert mock_batch.set.call_count == 2
+    mock_batch.commit.assert_called_once()
+    assert neutral_news_data["member_count"] == 2
+    assert neutral_news_data["centroid"] == pytest.approx([1.0, 0.0])
+
+def test_document_cache_reads_each_document_once():
+    mock_db = MagicMock()
+    mock_db.get_all.return_value = [
+        MagicMock(id="1", exists=True, to_dict=lambda: {"group": 1}),
+        MagicMock(id="2", exists=False),
+    ]
+    cache = DocumentCache("news")
+
+    assert cache.get_many(mock_db, ["1", "2"]) == {"1": {"group": 1}, "2": None}
+    cache.apply("1", {"group": 5})
+    assert cache.get(mock_db, "1") == {"group": 5}
+    assert cache.get(mock_db, "2") is None
+
+    # Only the first call reached Firestore
+    mock_db.get_all.assert_called_once()
+    assert (cache.hits, cache.misses) == (2, 2)
+
+def test_split_news_document():
+    news_doc, sidecars = split_news_document({"id": "1", "title": "T", "scraped_description": "Body", "embedding": None})
+
+    assert news_doc == {"id": "1", "title": "T"}
+    assert sidecars == {"news_content": {"scraped_description": "Body"}}
+
+def test_get_news_sidecar_fields_falls_back_to_inline_fields():
+    db = FakeAsyncFirestore({
+        "news": {"1": {"title": "Migrated"}, "2": {"title": "Legacy", "scraped_description": "Inline body"}},
+        "news_content": {"1": {"scraped_description": "Sidecar body"}},
+    })
+
+    with patch("functions.fetch_news.src.storage.run_async", lambda operation: run_async(operation, db=db)):
+        result = get_news_sidecar_fields(["1", "2", "3"], ["scraped_description"])
+
+    assert result == {
+        "1": {"scraped_description": "Sidecar body"},
+        "2": {"scraped_description": "Inline body"},
+        "3": {"scraped_description": None},
+    }
+
+def test_merge_source_ratings_keeps_scores_of_members_not_rated():
+    news_docs = {
+        "1": {"source_medium": "A", "neutral_score": 70},
+        "2": {"source_medium": "B", "neutral_score": 40},
+        "3": {"source_medium": "C", "neutral_score": None},
+        "4": None,
+    }
+
+    merged = merge_source_ratings(news_docs, [{"source_medium": "B", "rating": 90}, {"source_medium": "C", "rating": 60}])
+
+    assert sorted(merged, key=lambda rating: rating["source_medium"]) == [
+        {"source_medium": "A", "rating": 70},
+        {"source_medium": "B", "rating": 90},
+        {"source_medium": "C", "rating": 60},
+    ]
+
+@patch("functions.fetch_news.src.storage.initialize_firebase")
+def test_reserve_group_ids_seeds_and_advances_the_counter(mock_initialize_firebase):
+    db = InMemoryFirestore({
+        "news": {"1": {"group": 12}, "2": {"group": None}},
+        "neutral_news": {"40": {"group": 40}},
+    })
+    mock_initialize_firebase.return_value = db
+
+    # The first reservation seeds the counter after the highest group in use
+    first = reserve_group_ids(3)
+    second = reserve_group_ids(2)
+
+    assert list(first) == [41, 42, 43]
+    assert list(second) == [44, 45]
+    assert db.collection("counters").document("group_ids").get().to_dict()["next_id"] == 46
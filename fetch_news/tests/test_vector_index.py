@@ -0,0 +1,61 @@
+import pytest
+import numpy as np
+from functions.fetch_news.src.vector_index import VectorIndex, index_path
+
+def test_vector_index_search_and_remove():
+    # Three orthogonal vectors
+    index = VectorIndex(dim=3)
+    index.add(["a", "b", "c"], np.eye(3))
+
+    # Call the function
+    keys, similarities = index.search([0.9, 0.1, 0.0], k=2)
+
+    # Assertions
+    assert keys[0] == ["a", "b"]
+    assert similarities[0][0] > similarities[0][1]
+
+    index.remove(["a"])
+    keys, _ = index.search([0.9, 0.1, 0.0], k=1)
+    assert keys[0] == ["b"]
+    assert len(index) == 2
+
+def test_vector_index_ivf_save_and_load(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(300, 8))
+    index = VectorIndex(dim=8, exact_threshold=100)
+    index.add(range(300), vectors)
+
+    # Call the function
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = VectorIndex.load(path)
+
+    # Assertions
+    assert loaded.coarse_centroids is not None
+    assert len(loaded) == 300
+    keys, similarities = loaded.search(vectors[42], k=1)
+    assert keys[0] == ["42"]
+    assert similarities[0][0] == pytest.approx(1.0, abs=1e-5)
+
+def test_vector_index_kneighbors_graph():
+    index = VectorIndex(dim=2)
+    index.add(range(3), [[1.0, 0.0], [1.0, 0.1], [0.0, 1.0]])
+
+    # Call the function
+    graph = index.kneighbors_graph(2)
+
+    # Assertions
+    assert graph.shape == (3, 3)
+    assert graph[0, 0] == 0
+    assert graph[0, 1] > 0
+
+def test_index_path_depends_on_the_database(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "firestore")
+    monkeypatch.setenv("GOOGLE_CLOUD_PROJECT", "project-a")
+    project_a = index_path("group_centroids")
+    monkeypatch.setenv("GOOGLE_CLOUD_PROJECT", "project-b")
+    project_b = index_path("group_centroids")
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+
+    assert len({project_a, project_b, index_path("group_centroids")}) == 3
+    assert project_a.endswith("group_centroids.npz")
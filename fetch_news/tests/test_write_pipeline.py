@@ -0,0 +1,78 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from google.api_core import exceptions as google_exceptions
+from functions.fetch_news.src.write_pipeline import WritePipeline, estimate_size
+
+def make_ref(path):
+    ref = MagicMock()
+    ref.path = path
+    return ref
+
+def test_write_pipeline_splits_batches_by_operations():
+    mock_db = MagicMock()
+
+    with WritePipeline(mock_db, max_operations=2) as writer:
+        for i in range(5):
+            writer.set(make_ref(f"news/{i}"), {"title": str(i)})
+
+    assert writer.report.succeeded == 5
+    assert writer.report.batches == 3
+    assert mock_db.batch.return_value.commit.call_count == 3
+
+def test_write_pipeline_splits_batches_by_size():
+    mock_db = MagicMock()
+    large = {"embedding": [0.1] * 1000}  # ~8 KB estimated
+
+    with WritePipeline(mock_db, max_bytes=20000) as writer:
+        for i in range(5):
+            writer.update(make_ref(f"news/{i}"), large)
+
+    assert writer.report.succeeded == 5
+    assert writer.report.batches == 3
+
+@patch("functions.fetch_news.src.write_pipeline.time.sleep")
+def test_write_pipeline_retries_and_reports_failures(mock_sleep):
+    mock_db = MagicMock()
+    bad_ref = make_ref("news/bad")
+    batches = []
+
+    def new_batch():
+        batch = MagicMock()
+        operations = []
+        batch.delete.side_effect = operations.append
+        def commit():
+            if len(batches) == 1:
+                raise google_exceptions.ServiceUnavailable("try again")
+            if bad_ref in operations:
+                raise google_exceptions.InvalidArgument("bad document")
+        batch.commit.side_effect = commit
+        batches.append(batch)
+        return batch
+
+    mock_db.batch.side_effect = new_batch
+
+    with WritePipeline(mock_db, max_workers=1) as writer:
+        writer.delete(make_ref("news/1"))
+        writer.delete(bad_ref)
+        writer.delete(make_ref("news/2"))
+
+    # One transient error retried, then the bad write is isolated from the good ones
+    assert writer.report.retries == 1
+    assert writer.report.succeeded == 2
+    assert writer.report.failed_paths() == {"news/bad"}
+    mock_sleep.assert_called_once()
+
+def test_write_together_keeps_operations_in_one_batch():
+    mock_db = MagicMock()
+
+    with WritePipeline(mock_db, max_operations=3) as writer:
+        writer.set(make_ref("news/1"), {})
+        writer.set(make_ref("news/2"), {})
+        writer.write_together([("set", make_ref("neutral_news/1"), {}), ("set", make_ref("group_summaries/1"), {})])
+
+    assert writer.report.batches == 2
+    with pytest.raises(ValueError):
+        WritePipeline(mock_db, max_operations=1).write_together([("delete", make_ref("a/1"), None)] * 2)
+
+def test_estimate_size():
+    assert estimate_size({"title": "abc", "score": 1.0}) == (6 + 4) + (6 + 8)
@@ -0,0 +1,79 @@
+"""
+Benchmark the vectorized similarity kernel in fetch_news/src/similarity.py against
+the nested-loop implementations previously used by _calculate_group_similarity and
+_evaluate_cluster_quality in fetch_news/src/grouping.py.
+
+Usage:
+    python tools/benchmark_similarity/benchmark_similarity.py [--repeat 5] [--dim 384]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Make the fetch_news package importable - Relative path from script location
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../fetch_news')))
+from src.similarity import normalize_rows, mean_pairwise_similarity, cluster_similarity_stats
+
+def loop_group_similarity(embeddings):
+    """Reference: pairwise loop from the former _calculate_group_similarity."""
+    similarities = []
+    for i in range(len(embeddings)):
+        for j in range(i + 1, len(embeddings)):
+            similarities.append(np.dot(embeddings[i], embeddings[j]))
+    return sum(similarities) / len(similarities) if similarities else 0.5
+
+def loop_cluster_quality(embeddings, labels):
+    """Reference: per-subtopic index rebuild and pairwise loop from the former _evaluate_cluster_quality."""
+    scores = {}
+    for subtopic in np.unique(labels):
+        cluster_indices = [i for i, label in enumerate(labels) if label == subtopic]
+        cluster_embeddings = embeddings[cluster_indices]
+        similarities = []
+        for i in range(len(cluster_embeddings)):
+            for j in range(i + 1, len(cluster_embeddings)):
+                similarities.append(np.dot(cluster_embeddings[i], cluster_embeddings[j]))
+        scores[subtopic] = sum(similarities) / len(similarities) if similarities else 0
+    return scores
+
+def best_time(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark group similarity scoring")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per measurement (best time is reported)")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'items':>6} {'clusters':>8} | {'group loop':>11} {'group kernel':>12} {'speedup':>8} | {'quality loop':>12} {'quality kernel':>14} {'speedup':>8}")
+    for n_items in (10, 25, 100, 500, 1000):
+        n_clusters = max(2, min(5, n_items // 8))
+        embeddings = normalize_rows(rng.normal(size=(n_items, args.dim)))
+        labels = rng.integers(0, n_clusters, size=n_items)
+
+        # Both implementations must agree before timing them
+        assert np.isclose(loop_group_similarity(embeddings), mean_pairwise_similarity(embeddings))
+        loop_scores = loop_cluster_quality(embeddings, labels)
+        stats = cluster_similarity_stats(embeddings, labels)
+        for label, score in zip(stats["labels"], stats["mean_similarity"]):
+            assert np.isclose(loop_scores[label], 0 if np.isnan(score) else score)
+
+        group_loop = best_time(lambda: loop_group_similarity(embeddings), args.repeat)
+        group_kernel = best_time(lambda: mean_pairwise_similarity(embeddings), args.repeat)
+        quality_loop = best_time(lambda: loop_cluster_quality(embeddings, labels), args.repeat)
+        quality_kernel = best_time(lambda: cluster_similarity_stats(embeddings, labels), args.repeat)
+
+        print(f"{n_items:>6} {n_clusters:>8} | {group_loop * 1000:>9.2f}ms {group_kernel * 1000:>10.3f}ms {group_loop / group_kernel:>7.0f}x"
+              f" | {quality_loop * 1000:>10.2f}ms {quality_kernel * 1000:>12.3f}ms {quality_loop / quality_kernel:>7.0f}x")
+
+    print("✅ Kernel results match the loop implementations")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Run fetch_news_task end to end against a local storage backend and profile it.
+
+RSS feeds are replaced by synthetic news: every story is covered by several media
+with overlapping wording, so grouping and neutralization see realistic groups.
+With --offline-llm the OpenAI client is replaced by a stub that answers instantly,
+and with --offline-embeddings the sentence transformer is replaced by a hashed
+bag-of-words encoder, so the run measures the pipeline itself.
+Document reads, writes, deletes and queries are counted by the backend and
+printed after each run.
+
+Usage:
+    python tools/local_pipeline/run_local_pipeline.py --news 2000 --offline-llm --offline-embeddings
+    python tools/local_pipeline/run_local_pipeline.py --backend sqlite --db local.db --runs 3 --profile pipeline.prof
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import hashlib
+import cProfile
+import pstats
+import numpy as np
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+# Make the fetch_news package importable - Relative path from script location
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../fetch_news')))
+
+VOCABULARY = (
+    "gobierno congreso elecciones presupuesto inflación empleo vivienda sanidad educación "
+    "tribunal sentencia huelga incendio temporal sequía energía precio gasolina banco central "
+    "europa ministro alcalde reforma pensiones impuestos turismo exportaciones tecnología "
+    "inteligencia artificial liga champions selección festival cine museo investigación vacuna"
+).split()
+
+def generate_news(n_news, n_stories, seed):
+    """Synthetic news: each story gets a set of keywords that every medium covering it reuses"""
+    from src.models import News, Media
+
+    rng = random.Random(seed)
+    media = Media.get_all()
+    stories = [rng.sample(VOCABULARY, 6) for _ in range(n_stories)]
+    now = datetime.now()
+    news_list = []
+    for i in range(n_news):
+        story = stories[rng.randrange(n_stories)]
+        medium = rng.choice(media)
+        words = story[:4] + rng.sample(VOCABULARY, 2)
+        rng.shuffle(words)
+        title = " ".join(words).capitalize()
+        description = " ".join(story + rng.sample(VOCABULARY, 8))
+        scraped_description = " ".join(rng.choice(story + VOCABULARY) for _ in range(400))
+        news_list.append(News(
+            title=title,
+            description=description,
+            scraped_description=scraped_description,
+            category="Otros",
+            image_url=f"https://example.com/{medium}/{seed}/{i}.jpg",
+            link=f"https://example.com/{medium}/{seed}/{i}",
+            pub_date=(now - timedelta(minutes=rng.randrange(24 * 60))).strftime("%a, %d %b %Y %H:%M:%S +0000"),
+            source_medium=medium,
+        ))
+    return news_list
+
+class OfflineEncoder:
+    """Stand-in for the sentence transformer: hashed bag of words, so shared wording means similar vectors"""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, convert_to_numpy=True, show_progress_bar=False):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        return vectors
+
+class OfflineCompletions:
+    """Stand-in for client.chat.completions that answers with a valid neutralization JSON"""
+
+    async def create(self, model, messages, **kwargs):
+        user_message = messages[-1]["content"]
+        media = [line.split(":", 1)[1].strip() for line in user_message.splitlines() if line.startswith("Fuente")]
+        content = json.dumps({
+            "neutral_title": "Titular neutral generado localmente",
+            "neutral_description": "Descripción neutral generada localmente.",
+            "category": "Otros",
+            "relevance": 3,
+            "source_ratings": [{"source_medium": medium, "rating": 50} for medium in media],
+        })
+        message = type("Message", (), {"content": content})
+        choice = type("Choice", (), {"message": message})
+        return type("Response", (), {"choices": [choice], "usage": None})
+
+class OfflineAsyncOpenAI:
+    def __init__(self, *args, **kwargs):
+        self.chat = type("Chat", (), {"completions": OfflineCompletions()})
+
+    async def close(self):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description='Run fetch_news_task locally and profile it')
+    parser.add_argument('--backend', choices=['memory', 'sqlite'], default='memory', help='Local storage backend (default: memory)')
+    parser.add_argument('--db', default='neutral_news_local.db', help='SQLite database file for --backend sqlite')
+    parser.add_argument('--news', type=int, default=1000, help='Synthetic news per run (default: 1000)')
+    parser.add_argument('--stories', type=int, default=0, help='Distinct stories per run (default: news / 8)')
+    parser.add_argument('--runs', type=int, default=1, help='Consecutive runs, later runs update existing groups (default: 1)')
+    parser.add_argument('--offline-llm', action='store_true', help='Replace the OpenAI client with an instant local stub')
+    parser.add_argument('--offline-embeddings', action='store_true', help='Replace the sentence transformer with a local hashed encoder')
+    parser.add_argument('--profile', default='', help='Write cProfile stats to this file')
+    parser.add_argument('--top', type=int, default=25, help='Functions shown in the profile summary (default: 25)')
+    args = parser.parse_args()
+
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["SQLITE_STORAGE_PATH"] = args.db
+    if args.offline_llm:
+        os.environ.setdefault("OPENAI_API_KEY", "offline")
+
+    from src.local_backends import get_local_backend
+    from src.functions import scheduled_tasks
+
+    db = get_local_backend(args.backend)
+    n_stories = args.stories or max(1, args.news // 8)
+    profiler = cProfile.Profile()
+
+    for run in range(args.runs):
+        # Consecutive runs share stories, so existing groups get new sources
+        news_list = generate_news(args.news, n_stories, seed=run)
+        db.counter.reset()
+        print(f"\n▶️ Run {run + 1}/{args.runs}: {len(news_list)} synthetic news about {n_stories} stories ({args.backend} backend)")
+
+        start_time = time.time()
+        with ExitStack() as stack:
+            stack.enter_context(patch.object(scheduled_tasks, "fetch_all_rss", return_value=news_list))
+            if args.offline_llm:
+                stack.enter_context(patch("src.llm_engine.create_async_openai_client", OfflineAsyncOpenAI))
+            if args.offline_embeddings:
+                stack.enter_context(patch("src.grouping.get_sentence_transformer_model", return_value=OfflineEncoder()))
+            profiler.runcall(scheduled_tasks.fetch_news_task)
+        elapsed = time.time() - start_time
+
+        counts = db.counter.as_dict()
+        print(f"\n📊 Run {run + 1} completed in {elapsed:.2f} seconds")
+        print(f"  - Document reads:   {counts['reads']}")
+        print(f"  - Document writes:  {counts['writes']}")
+        print(f"  - Document deletes: {counts['deletes']}")
+        print(f"  - Queries:          {counts['queries']}")
+        print(f"  - Stored news:      {db.count_documents('news')}")
+        print(f"  - Neutral news:     {db.count_documents('neutral_news')}")
+
+    stats = pstats.Stats(profiler).sort_stats("cumulative")
+    print(f"\n📊 Top {args.top} functions by cumulative time:")
+    stats.print_stats(args.top)
+    if args.profile:
+        stats.dump_stats(args.profile)
+        print(f"✅ Profile written to {args.profile}")
+
+if __name__ == "__main__":
+    main()
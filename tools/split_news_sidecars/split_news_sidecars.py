@@ -0,0 +1,135 @@
+import firebase_admin
+from firebase_admin import credentials, firestore
+import os
+import argparse
+import sys
+import time
+
+# Path to Firebase service account - Relative path from script location
+SERVICE_ACCOUNT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../neutralnews-ca548-firebase-adminsdk-fbsvc-b2a2b9fa03.json'))
+
+# Heavy fields moved out of the news documents, and the sidecar collection that holds each one.
+# Must match SIDECAR_FIELDS in fetch_news/src/storage.py
+SIDECAR_FIELDS = {
+    "scraped_description": "news_content",
+    "embedding": "news_embeddings",
+}
+
+PAGE_SIZE = 500  # Documents read per query page
+
+def iterate_news(db):
+    """Stream the news collection page by page, ordered by document ID"""
+    last_doc = None
+    while True:
+        query = db.collection('news').order_by('__name__').limit(PAGE_SIZE)
+        if last_doc is not None:
+            query = query.start_after(last_doc)
+        page = list(query.stream())
+        if not page:
+            return
+        yield from page
+        last_doc = page[-1]
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Move scraped_description and embedding from news documents to sidecar collections')
+    parser.add_argument('--batch', type=int, default=50, help='News documents per batch, each one is up to 3 writes (default: 50)')
+    parser.add_argument('--limit', type=int, default=0, help='Limit number of documents to migrate (0 for all)')
+    parser.add_argument('--force', action='store_true', help='Skip confirmation prompt')
+    parser.add_argument('--test', action='store_true', help='Test mode: only show what would be migrated')
+    args = parser.parse_args()
+
+    print("Connecting to Firebase...")
+
+    try:
+        cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
+        firebase_admin.initialize_app(cred)
+    except Exception as e:
+        print(f"❌ Failed to initialize Firebase: {str(e)}")
+        sys.exit(1)
+
+    db = firestore.client()
+
+    # Ask for confirmation before proceeding
+    if not args.force and not args.test:
+        confirmation = input(f"\n⚠️  WARNING: You are about to move {', '.join(SIDECAR_FIELDS)} out of every news document\n"
+                             f"into the {', '.join(SIDECAR_FIELDS.values())} collections.\n"
+                             f"Proceed? (yes/no): ")
+
+        if confirmation.lower() not in ["yes", "y"]:
+            print("Operation cancelled by user. No documents were migrated.")
+            sys.exit(0)
+
+        print("\nProceeding with migration...")
+
+    batch_size = max(1, min(args.batch, 150))  # 3 writes per document, Firestore batch limit is 500
+    scanned_count = 0
+    migrated_count = 0
+    failed_count = 0
+    pending = []
+
+    def commit(pending_docs):
+        batch = db.batch()
+        for doc_id, sidecars in pending_docs:
+            news_update = {}
+            for field, value in sidecars.items():
+                batch.set(db.collection(SIDECAR_FIELDS[field]).document(doc_id), {field: value})
+                news_update[field] = firestore.DELETE_FIELD
+            batch.update(db.collection('news').document(doc_id), news_update)
+        batch.commit()
+
+    try:
+        for doc in iterate_news(db):
+            scanned_count += 1
+            data = doc.to_dict()
+            sidecars = {field: data[field] for field in SIDECAR_FIELDS if data.get(field) is not None}
+            if not sidecars:
+                continue
+
+            if args.test:
+                print(f"  🔄 Would migrate {', '.join(sidecars)} of document {doc.id}")
+                migrated_count += 1
+            else:
+                pending.append((doc.id, sidecars))
+                if len(pending) >= batch_size:
+                    try:
+                        commit(pending)
+                        migrated_count += len(pending)
+                        print(f"  ✅ Migrated {migrated_count} documents ({scanned_count} scanned)")
+                    except Exception as e:
+                        print(f"  ❌ Error committing batch: {str(e)}")
+                        failed_count += len(pending)
+                    pending = []
+
+            # Check if we've hit the document limit
+            if args.limit > 0 and migrated_count + failed_count + len(pending) >= args.limit:
+                print(f"Reached limit of {args.limit} documents.")
+                break
+
+        if pending:
+            try:
+                commit(pending)
+                migrated_count += len(pending)
+            except Exception as e:
+                print(f"  ❌ Error committing batch: {str(e)}")
+                failed_count += len(pending)
+
+        # Final report
+        if args.test:
+            print("\n🧪 TEST MODE: No changes were made to the database.")
+            print(f"  Scanned {scanned_count} documents, would have migrated {migrated_count}.")
+        else:
+            print("\n✅ Finished migrating news documents.")
+            print(f"  Scanned {scanned_count} documents.")
+            print(f"  Successfully migrated {migrated_count} documents.")
+            print(f"  Failed to migrate {failed_count} documents.")
+
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    start_time = time.time()
+    main()
+    elapsed_time = time.time() - start_time
+    print(f"\n⏱️ Total execution time: {elapsed_time:.2f} seconds")